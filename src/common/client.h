@@ -81,6 +81,33 @@ const char *get_error_str();
  */
 int register_client(const char *proc_id);
 
+
+/*
+ * Register the process, as in register_client, with capabilities
+ * offered by client. Server accepts the ones it supports. Messages to &
+ * from this client follow the accepted ones.
+ *
+ *  Optional: Caller falls back to register_client, w/o any capability.
+ *
+ * Input:
+ *  proc_id -- As in register_client.
+ *  caps -- JSON object of capability name to value offered.
+ *      "nested_data": true
+ *          "context" of request and "action_data" of response are carried
+ *          as JSON objects instead of JSON strings. So is action data of
+ *          each action in context.
+ *      "encoding": "json" | "msgpack"
+ *          Encoding of requests, responses & heartbeats. See *_bin APIs.
+ *
+ * Output:
+ *  None
+ *
+ * Return:
+ *  JSON object of accepted capabilities; "{}" if none.
+ *  Empty string on error. Use get_last_error() for err code
+ */
+const char *register_client_ex(const char *proc_id, const char *caps);
+
 /*
  * Register the actions 
  *
@@ -99,6 +126,49 @@ int register_client(const char *proc_id);
 int register_action(const char *action);
 
 
+/*
+ * Register a list of actions in one call.
+ * Failure of an action does not fail rest.
+ *
+ *  Optional: Caller falls back to register_action per action.
+ *
+ * Expect this process ID is pre-registered.
+ *
+ * Input:
+ *  actions -- JSON array of action names.
+ *
+ * Output:
+ *  None
+ *
+ * Return:
+ *  JSON object of action name to its return code, as from register_action.
+ *      { "<action name>": <0 for success; !=0 implies error>, ... }
+ *  Empty string on error. Use get_last_error() for err code
+ */
+const char *register_actions(const char *actions);
+
+
+/*
+ * Deregister an action, registered earlier by this process.
+ * Used upon config reload to drop/reload an action, while rest of the
+ * actions of this process stay registered.
+ *
+ *  Optional: Caller falls back to deregister_client & re-register all,
+ *  if not available.
+ *
+ * Input:
+ *  action -- Name of the action.
+ *
+ * Output:
+ *  None
+ *
+ * Return:
+ *  0 for success
+ *  !=0 implies error
+ */
+int deregister_action(const char *action);
+
+
 /*
  * Deregister the action
  *
@@ -134,12 +204,32 @@ void deregister_client(const char *proc_id);
 void touch_heartbeat(const char *action, const char *instance_id);
 
 
+/*
+ * Heartbeat touch for a batch of instances in one call.
+ * Client sends all heartbeats collected during a wakeup at once.
+ *
+ *  Optional: Caller falls back to touch_heartbeat per instance.
+ *
+ * Input:
+ *  hbs - JSON array of
+ *      { "action_name": "<Name>", "instance_id": "<id>" }
+ *
+ * Output:
+ *  None
+ *
+ * Return:
+ *  0 for success
+ *  !=0 implies error
+ */
+int touch_heartbeats(const char *hbs);
+
+
 
 /*
  * Read Action request
  * Json string
  * {
- *      "request_type": "<action/shutdown/...>"
+ *      "request_type": "<action/shutdown/cancel/...>"
  *      "action_name": "<Name>",
  *      "instance_id": "<id>",
  *      "context": "<JSON string of context>",
@@ -152,6 +242,10 @@ void touch_heartbeat(const char *action, const char *instance_id);
  *  ]
  *  Order in list matches order of invocation
  *
+ *  request_type = cancel, carries action_name & instance_id alone.
+ *  It cancels the running/pending request of that instance.
+ *  Client responds with result_code for cancelled.
+ *
  * Input:
  *  timeout - Count of seconds to wait
  *      0 -- No wait
@@ -173,6 +267,7 @@ void touch_heartbeat(const char *action, const char *instance_id);
 const char *REQ_TYPE "request_type"
 const char *REQ_TYPE_ACTION "action"
 const char *REQ_TYPE_SHUTDOWN "shutdown"
+const char *REQ_TYPE_CANCEL "cancel"
 
 const char *REQ_ACTION_NAME "action_name"
 const char *REQ_INSTANCE_ID "instance_id"
@@ -187,6 +282,28 @@ const char *REQ_RESULT_STR "result_str"
 const char *read_action_request(int timeout=-1);
 
 
+/*
+ * Read a batch of action requests in one call.
+ * Saves a call per request, when engine fans out many requests at once.
+ *
+ *  Optional: Caller falls back to read_action_request, if not available.
+ *
+ * Input:
+ *  max_n - Max count of requests to return.
+ *  timeout - Wait for first request, as in read_action_request.
+ *      Rest are returned only if already available.
+ *
+ * Output:
+ *  None
+ *
+ * Return
+ *  JSON array of requests, each as returned by read_action_request.
+ *  "[]" on timeout.
+ *  Empty string on error. Use get_last_error() for err code
+ */
+const char *read_action_requests(int max_n, int timeout=-1);
+
+
 /*
  * Write Action response
  *
@@ -215,6 +332,65 @@ const char *read_action_request(int timeout=-1);
 int write_action_response(const char *res);
 
 
+/*
+ * Write a batch of action responses in one call.
+ * Client sends all responses collected during a wakeup at once.
+ *
+ *  Optional: Caller falls back to write_action_response per response.
+ *
+ * Input:
+ *  res - JSON array of responses, each as in write_action_response.
+ *
+ * Output:
+ *  None
+ *
+ * Return
+ *  0 for sucess
+ *  !=0 implies failure
+ */
+int write_action_responses(const char *res);
+
+
+/*
+ * Binary variants, used in place of JSON ones, when "encoding": "msgpack"
+ * is accepted upon register_client_ex. Implies "nested_data".
+ *
+ *  Optional: Binary encoding is not offered, unless all are available.
+ *
+ * A message is msgpack map, as its JSON object, with field names as
+ * integer tags:
+ *  1 request_type, 2 action_name, 3 instance_id, 4 anomaly_instance_id,
+ *  5 anomaly_key, 6 context, 7 timeout, 8 action_data, 9 result_code,
+ *  10 result_str
+ * Names w/o tag, e.g. action names in context, stay as strings.
+ *
+ * read_action_request_bin:
+ *  Input:
+ *      buf, buf_len - Caller provided buffer to read into.
+ *      timeout - As in read_action_request.
+ *  Return:
+ *      >0 - Count of bytes filled.
+ *       0 - Timeout
+ *      -1 - Error. Use get_last_error() for err code
+ *     <-1 - buf_len is too small; Negated count of bytes needed.
+ *           The request stays held, to be read by next call with a
+ *           buffer as large.
+ *
+ * write_action_responses_bin:
+ *  Input:
+ *      buf, len - msgpack array of responses.
+ *  Return: 0 for success; !=0 implies failure
+ *
+ * touch_heartbeats_bin:
+ *  Input:
+ *      buf, len - msgpack array of heartbeats as in touch_heartbeats.
+ *  Return: 0 for success; !=0 implies failure
+ */
+int read_action_request_bin(char *buf, int buf_len, int timeout);
+int write_action_responses_bin(const char *buf, int len);
+int touch_heartbeats_bin(const char *buf, int len);
+
+
 /*
  *  Poll for request from server/engine anjd as well
  *  listen for data from any of the fds provided
@@ -239,6 +415,60 @@ int write_action_response(const char *res);
 int poll_for_data(int *lst_fds, int cnt, int timeout);
 
 
+/*
+ *  Poll for request from server/engine and as well
+ *  listen for data from all of the fds provided.
+ *  Unlike poll_for_data, it returns the full set of ready fds,
+ *  so caller may handle all of them per wakeup.
+ *
+ *  Optional: Caller falls back to poll_for_data, if not available.
+ *
+ * Input:
+ *  lst_fds: list of fds to listen for data
+ *  cnt: Count of fds in list.
+ *  timeout_ms: Count of milliseconds to wait before calling time out.
+ *      0 - Check and return immediately
+ *     -1 - Block until data arrives on any one/more.
+ *     >0 - Count of milliseconds to wait.
+ *
+ * Output:
+ *  lst_ready: Caller provided buffer of cnt entries.
+ *      Filled with fds that have data.
+ *  server_ready: Set to 1 if message from server/engine is available, else 0.
+ *
+ * Return:
+ *  -2 - Timeout
+ *  >= 0 -- Count of fds filled in lst_ready.
+ *          0 implies only server/engine has message.
+ *  <other values> -- undefined.
+ */
+int poll_for_data_multi(int *lst_fds, int cnt, int *lst_ready, int *server_ready,
+        int timeout_ms);
+
+
+/*
+ *  Get the fd that turns readable, when request from server/engine
+ *  is pending. Lets the caller add it to its own event loop (e.g. asyncio)
+ *  instead of blocking in poll_for_data.
+ *
+ *  Upon readable, caller is expected to drain all pending requests
+ *  via read_action_request with timeout 0, until none is returned.
+ *
+ *  Optional: Caller falls back to poll_for_data, if not available.
+ *
+ * Input:
+ *  None
+ *
+ * Output:
+ *  None
+ *
+ * Return:
+ *  >= 0 -- fd to watch for read.
+ *  < 0 -- Client not registered or failure.
+ */
+int get_server_fd();
+
+
 
 #ifdef __cplusplus
 }
@@ -1,8 +1,46 @@
 #! /usr/bin/env python3
 
+import math
+import threading
+from ctypes import POINTER, byref, c_char_p, c_int, c_void_p, create_string_buffer, string_at
+
 from common import *
 import gvars
 
+# Faster JSON, if orjson is installed. Decode takes bytes as is and
+# encode returns bytes.
+try:
+    import orjson
+    _json_loads = orjson.loads
+    _json_dumps = lambda d: orjson.dumps(d, option=orjson.OPT_NON_STR_KEYS)
+except ImportError:
+    _json_loads = json.loads
+    _json_dumps = lambda d: json.dumps(d).encode("utf-8")
+
+# Binary encoding is offered only if msgpack is installed.
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Capabilities accepted by server upon register_client.
+_caps = {}
+
+# Set, if server accepts action_data of response as nested JSON object.
+# Else an object is sent JSON encoded as string.
+_nested_action_data = False
+
+# Set, if server accepts msgpack encoding.
+_binary = False
+
+# Initial size of buffer, per thread, to read binary request into.
+# Grown upon a larger request.
+READ_BUF_SIZE = 64 * 1024
+_th_local = threading.local()
+
+# Field name to tag & back, built upon first use from gvars.TAG_FIELDS.
+_tags = None
+
 # *******************************
 # c-bindings related info
 # *******************************
@@ -13,6 +51,23 @@ import gvars
 # Set Clib .so file path here
 CLIB_DLL_FILE = None
 
+# Transport to server, from global rc "clib_transport".
+# uds: Python transport (uds_client) to local engine stand-in, for dev/bench.
+CLIB_TRANSPORT_DLL = "dll"
+CLIB_TRANSPORT_UDS = "uds"
+
+# Functions of Python transport, named clib_<name>, bound to _clib_<name>.
+PY_TRANSPORT_FUNCS = [ "get_last_error", "get_last_error_str",
+        "register_client", "deregister_client", "register_action",
+        "touch_heartbeat", "read_action_request", "write_action_response",
+        "poll_for_data", "poll_for_data_multi", "get_server_fd",
+        "deregister_action", "read_action_requests", "write_action_responses",
+        "touch_heartbeats", "register_actions", "register_client_ex",
+        "read_action_request_bin", "write_action_responses_bin",
+        "touch_heartbeats_bin" ]
+
+_py_transport = False   # True, if bound to Python transport, not lib.
+
 _clib_dll = None
 _clib_get_last_error = None
 _clib_get_last_error_str = None
@@ -23,6 +78,17 @@ _clib_touch_heartbeat = None
 _clib_read_action_request = None
 _clib_write_action_response = None
 _clib_poll_for_data = None
+_clib_poll_for_data_multi = None
+_clib_get_server_fd = None
+_clib_deregister_action = None
+_clib_read_action_requests = None
+_clib_write_action_responses = None
+_clib_touch_heartbeats = None
+_clib_register_actions = None
+_clib_register_client_ex = None
+_clib_read_action_request_bin = None
+_clib_write_action_responses_bin = None
+_clib_touch_heartbeats_bin = None
 
 
 def c_lib_init() -> bool:
@@ -30,11 +96,17 @@ def c_lib_init() -> bool:
     global _clib_get_last_error, _clib_get_last_error_str, _clib_register_client
     global _clib_deregister_client, _clib_register_action, _clib_touch_heartbeat
     global _clib_read_action_request, _clib_write_action_response, _clib_poll_for_data
+    global _clib_poll_for_data_multi, _clib_get_server_fd, _clib_deregister_action
+    global _clib_read_action_requests, _clib_write_action_responses
+    global _clib_touch_heartbeats, _clib_register_actions, _clib_register_client_ex
+    global _clib_read_action_request_bin, _clib_write_action_responses_bin
+    global _clib_touch_heartbeats_bin
 
     if _clib_dll:
         return True
 
-    if not gvars.TEST_RUN:
+    transport = get_global_rc().get("clib_transport", CLIB_TRANSPORT_DLL)
+    if (not gvars.TEST_RUN) and (transport != CLIB_TRANSPORT_UDS):
         try:
             _clib_dll = ctypes.CDLL(CLIB_DLL_FILE)
         except OSError as e:
@@ -78,6 +150,71 @@ def c_lib_init() -> bool:
             _clib_poll_for_data.argtypes = [ POINTER(c_int), c_int, c_int ]
             _clib_poll_for_data.restype = c_int
 
+            # Optional; Fall back to poll_for_data, if lib lacks it.
+            if hasattr(_clib_dll, "poll_for_data_multi"):
+                _clib_poll_for_data_multi = _clib_dll.poll_for_data_multi
+                _clib_poll_for_data_multi.argtypes = [ POINTER(c_int), c_int,
+                        POINTER(c_int), POINTER(c_int), c_int ]
+                _clib_poll_for_data_multi.restype = c_int
+
+            # Optional; Fall back to register_client w/o capabilities.
+            if hasattr(_clib_dll, "register_client_ex"):
+                _clib_register_client_ex = _clib_dll.register_client_ex
+                _clib_register_client_ex.argtypes = [ c_char_p, c_char_p ]
+                _clib_register_client_ex.restype = c_char_p
+
+            # Optional; Binary encoding is not offered, if lib lacks any.
+            if (hasattr(_clib_dll, "read_action_request_bin") and
+                    hasattr(_clib_dll, "write_action_responses_bin") and
+                    hasattr(_clib_dll, "touch_heartbeats_bin")):
+                _clib_read_action_request_bin = _clib_dll.read_action_request_bin
+                _clib_read_action_request_bin.argtypes = [ c_void_p, c_int, c_int ]
+                _clib_read_action_request_bin.restype = c_int
+
+                _clib_write_action_responses_bin = _clib_dll.write_action_responses_bin
+                _clib_write_action_responses_bin.argtypes = [ c_char_p, c_int ]
+                _clib_write_action_responses_bin.restype = c_int
+
+                _clib_touch_heartbeats_bin = _clib_dll.touch_heartbeats_bin
+                _clib_touch_heartbeats_bin.argtypes = [ c_char_p, c_int ]
+                _clib_touch_heartbeats_bin.restype = c_int
+
+            # Optional; Fall back to register_action per action.
+            if hasattr(_clib_dll, "register_actions"):
+                _clib_register_actions = _clib_dll.register_actions
+                _clib_register_actions.argtypes = [ c_char_p ]
+                _clib_register_actions.restype = c_char_p
+
+            # Optional; Reload falls back to re-register all, if lib lacks it.
+            if hasattr(_clib_dll, "deregister_action"):
+                _clib_deregister_action = _clib_dll.deregister_action
+                _clib_deregister_action.argtypes = [ c_char_p ]
+                _clib_deregister_action.restype = c_int
+
+            # Optional; Fall back to read_action_request, if lib lacks it.
+            if hasattr(_clib_dll, "read_action_requests"):
+                _clib_read_action_requests = _clib_dll.read_action_requests
+                _clib_read_action_requests.argtypes = [ c_int, c_int ]
+                _clib_read_action_requests.restype = c_char_p
+
+            # Optional; Fall back to write_action_response per response.
+            if hasattr(_clib_dll, "write_action_responses"):
+                _clib_write_action_responses = _clib_dll.write_action_responses
+                _clib_write_action_responses.argtypes = [ c_char_p ]
+                _clib_write_action_responses.restype = c_int
+
+            # Optional; Fall back to touch_heartbeat per instance.
+            if hasattr(_clib_dll, "touch_heartbeats"):
+                _clib_touch_heartbeats = _clib_dll.touch_heartbeats
+                _clib_touch_heartbeats.argtypes = [ c_char_p ]
+                _clib_touch_heartbeats.restype = c_int
+
+            # Optional; Needed by asyncio runtime only.
+            if hasattr(_clib_dll, "get_server_fd"):
+                _clib_get_server_fd = _clib_dll.get_server_fd
+                _clib_get_server_fd.argtypes = []
+                _clib_get_server_fd.restype = c_int
+
             # Update values in gvars.py
             _update_globals()
 
@@ -86,7 +223,7 @@ def c_lib_init() -> bool:
                     format(CLIB_DLL_FILE, str(e)))
             _clib_dll = None
             return False
-    else:
+    elif gvars.TEST_RUN:
         import test_client
         log_debug("clib in test mode")
 
@@ -94,20 +231,33 @@ def c_lib_init() -> bool:
             log_error("Failed to init test_client.clib_init")
             return False
 
-        _clib_get_last_error = test_client.clib_get_last_error
-        _clib_get_last_error_str = test_client.clib_get_last_error_str
-        _clib_register_client = test_client.clib_register_client
-        _clib_deregister_client = test_client.clib_deregister_client
-        _clib_register_action = test_client.clib_register_action
-        _clib_touch_heartbeat = test_client.clib_touch_heartbeat
-        _clib_read_action_request = test_client.clib_read_action_request
-        _clib_write_action_response = test_client.clib_write_action_response
-        _clib_poll_for_data = test_client.clib_poll_for_data
-        _clib_dll = "Test mode"
-        
+        _bind_py_transport(test_client, "Test mode")
+    else:
+        import uds_client
+
+        path = get_global_rc().get("uds_path", uds_client.DEFAULT_UDS_PATH)
+        if not uds_client.clib_init(path):
+            log_error("Failed to init uds_client path:{}".format(path))
+            return False
+
+        _bind_py_transport(uds_client, "UDS transport")
+        log_info("clib via UDS transport path:{}".format(path))
+
     return True
 
 
+def _bind_py_transport(mod, name:str):
+    # Binds functions of Python transport, named clib_<client.h name>.
+    # Missing optional ones stay None.
+    #
+    global _clib_dll, _py_transport
+
+    for fn in PY_TRANSPORT_FUNCS:
+        globals()["_clib_" + fn] = getattr(mod, "clib_" + fn, None)
+    _py_transport = True
+    _clib_dll = name
+
+
 def validate_dll():
     if not _clib_dll:
         log_error("CLib is not loaded. Failed.")
@@ -124,27 +274,144 @@ def _print_clib_error(m:str, ret:int):
     log_error("{}: ret:{} last_error:{} ({})".format(m, ret, err, estr))
 
 
-def register_client(proc_id: str) -> bool:
+def is_binary_supported() -> bool:
+    return ((msgpack is not None) and (_clib_read_action_request_bin is not None)
+            and (_clib_write_action_responses_bin is not None)
+            and (_clib_touch_heartbeats_bin is not None))
+
+
+def _set_caps(caps: {}):
+    global _caps, _nested_action_data, _binary
+
+    _caps = caps
+    _binary = ((caps.get(gvars.CAP_ENCODING, "") == gvars.ENCODING_MSGPACK)
+            and is_binary_supported())
+    _nested_action_data = _binary or bool(caps.get(gvars.CAP_NESTED_DATA, False))
+    log_info("clib_bind: accepted capabilities {} binary:{}".format(caps, _binary))
+
+
+def _get_tags() -> ({}, {}):
+    global _tags
+
+    if _tags is None:
+        names = [ getattr(gvars, a) for a in gvars.TAG_FIELDS ]
+        _tags = ({ n: i + 1 for i, n in enumerate(names) },
+                { i + 1: n for i, n in enumerate(names) })
+    return _tags
+
+
+# Field names of a message to int tags, for binary encoding.
+# Names w/o tag are kept as is.
+#
+def tag_fields(d: {}) -> {}:
+    tags = _get_tags()[0]
+    return { tags.get(k, k): v for k, v in d.items() }
+
+
+# Reverse of tag_fields
+#
+def untag_fields(d: {}) -> {}:
+    names = _get_tags()[1]
+    return { names.get(k, k): v for k, v in d.items() }
+
+
+def _get_read_buf(size:int = READ_BUF_SIZE):
+    # Returns buffer of this thread, grown to size, if smaller.
+    buf = getattr(_th_local, "read_buf", None)
+    if (buf is None) or (len(buf) < size):
+        buf = _th_local.read_buf = create_string_buffer(size)
+    return buf
+
+
+# caps: Capabilities offered, as gvars.CAP_* to value. Server accepts the
+# ones it supports. None accepted, if client lib can't negotiate.
+#
+def register_client(proc_id: str, caps: {} = None) -> bool:
     if not validate_dll():
         return False, {}
 
+    if caps and (_clib_register_client_ex is not None):
+        ret = _clib_register_client_ex(proc_id.encode("utf-8"),
+                json.dumps(caps).encode("utf-8"))
+        if not ret:
+            log_error("register_client failed for {}".format(proc_id))
+            return False
+        _set_caps(_json_loads(ret))
+        return True
+
     ret = _clib_register_client(proc_id.encode("utf-8"))
     if ret != 0:
         log_error("register_client failed for {}".format(proc_id))
         return False
+    _set_caps({})
     return True
 
 
+def get_caps() -> {}:
+    return dict(_caps)
+
+
 def register_action(action: str) -> bool:
     if not validate_dll():
         return False, {}
 
     ret = _clib_register_action(action.encode("utf-8"))
     if ret != 0:
-        log_error("register_action failed {}".format(action))
+        log_error("register_action failed {}", action, action=action)
+        return False
+
+    log_info("clib_bind: register_action {}", action, action=action)
+    return True
+
+
+# Registers list of actions in one call.
+# Returns status by action name; True if registered.
+#
+def register_actions(actions: [str]) -> {str: bool}:
+    if not actions:
+        return {}
+
+    if not validate_dll():
+        return { a: False for a in actions }
+
+    if _clib_register_actions is None:
+        return { a: register_action(a) for a in actions }
+
+    ret = _clib_register_actions(json.dumps(actions).encode("utf-8"))
+    if not ret:
+        # NULL on failure
+        e, estr = get_last_error()
+        log_error("register_actions failed err:{} {}", e, estr)
+        return { a: False for a in actions }
+
+    codes = json.loads(ret.decode("utf-8"))
+    status = {}
+    for a in actions:
+        code = codes.get(a, -1)
+        status[a] = (code == 0)
+        if code != 0:
+            log_error("register_action failed {} err:{}", a, code, action=a)
+        else:
+            log_info("clib_bind: register_action {}", a, action=a)
+    return status
+
+
+# Returns False, if client lib does not support it or on failure.
+#
+def deregister_action(action: str) -> bool:
+    if not validate_dll():
+        return False
+
+    if _clib_deregister_action is None:
+        log_error("deregister_action not supported by clib")
+        return False
+
+    ret = _clib_deregister_action(action.encode("utf-8"))
+    if ret != 0:
+        log_error("deregister_action failed {}".format(action))
         return False
 
-    log_info("clib_bind: register_action {}".format(action))
+    log_info("clib_bind: deregister_action {}".format(action))
     return True
 
 
@@ -166,15 +433,62 @@ def touch_heartbeat(action: str, instance_id: str) -> bool:
     return True
 
 
+# Heartbeats for list of (action, instance_id) in one call.
+#
+def touch_heartbeats(lst: [(str, str)]) -> bool:
+    if not lst:
+        return True
+
+    if _binary:
+        hbs = msgpack.packb([ tag_fields({ gvars.REQ_ACTION_NAME: action,
+            gvars.REQ_INSTANCE_ID: instance_id }) for action, instance_id in lst ])
+        ret = _clib_touch_heartbeats_bin(hbs, len(hbs))
+        if ret != 0:
+            log_error("touch_heartbeats failed cnt:{}".format(len(lst)))
+            return False
+        return True
+
+    if _clib_touch_heartbeats is None:
+        ret = True
+        for action, instance_id in lst:
+            ret = touch_heartbeat(action, instance_id) and ret
+        return ret
+
+    if not validate_dll():
+        return False
+
+    hbs = json.dumps([ { gvars.REQ_ACTION_NAME: action,
+        gvars.REQ_INSTANCE_ID: instance_id } for action, instance_id in lst ])
+    ret = _clib_touch_heartbeats(hbs.encode("utf-8"))
+    if ret != 0:
+        log_error("touch_heartbeats failed cnt:{}".format(len(lst)))
+        return False
+    return True
+
+
 # CLIB globals
 def _get_str_clib_globals(name:str) -> str:
     return (c_char_p.in_dll(_clib_dll, name)).value.decode("utf-8")
 
 
+# For globals added later, which older client lib may not export.
+# Returns default, if missing.
+#
+def _get_opt_str_clib_globals(name:str, default:str) -> str:
+    if not hasattr(_clib_dll, name):
+        return default
+    return _get_str_clib_globals(name)
+
+
 def _update_globals():
+    global _tags
+
+    _tags = None
     gvars.REQ_TYPE = _get_str_clib_globals("REQ_TYPE")
     gvars.REQ_TYPE_ACTION = _get_str_clib_globals("REQ_TYPE_ACTION")
     gvars.REQ_TYPE_SHUTDOWN = _get_str_clib_globals("REQ_TYPE_SHUTDOWN")
+    gvars.REQ_TYPE_CANCEL = _get_opt_str_clib_globals("REQ_TYPE_CANCEL",
+            gvars.REQ_TYPE_CANCEL)
 
     gvars.REQ_ACTION_NAME = _get_str_clib_globals("REQ_ACTION_NAME")
     gvars.REQ_INSTANCE_ID = _get_str_clib_globals("REQ_INSTANCE_ID")
@@ -190,31 +504,151 @@ def _update_globals():
     gvars.REQ_MITIGATION_STATE_PROG = _get_str_clib_globals("REQ_MITIGATION_STATE_PROG")
     gvars.REQ_MITIGATION_STATE_DONE = _get_str_clib_globals("REQ_MITIGATION_STATE_DONE")
 
+# Returns JSON object of context or action data, which come as JSON string
+# or, with nested data accepted by server, as object already.
+#
+def decode_data(data) -> {}:
+    if isinstance(data, (str, bytes)):
+        return _json_loads(data) if data else {}
+    return data if data is not None else {}
+
+
+# Fields of request, set upon first access of any.
+_REQ_FIELDS = frozenset(["type", "action_name", "instance_id",
+    "anomaly_instance_id", "anomaly_key", "timeout"])
+
+# Request from server.
+# Holds the raw JSON bytes/str as read and parses upon first access of a
+# field. Context is decoded once upon first access and cached.
+# Either of sdata or data is given; data, if caller has it decoded already.
+#
 class ActionRequest:
-    def __init__(self, sdata: str):
-        self.str_data = sdata
-        data = json.loads(sdata)
-        self.type = data[gvars.REQ_TYPE]
-        if self.type == gvars.REQ_TYPE_ACTION:
-            self.action_name = data[gvars.REQ_ACTION_NAME]
-            self.instance_id = data[gvars.REQ_INSTANCE_ID]
-            self.anomaly_instance_id = data[gvars.REQ_ANOMALY_INSTANCE_ID]
-            self.anomaly_key = data[gvars.REQ_ANOMALY_KEY]
-            self.context = data[gvars.REQ_CONTEXT]
-            self.timeout = data[gvars.REQ_TIMEOUT]
+    __slots__ = ("_raw", "_str", "_data", "_context", "_context_data",
+            "type", "action_name", "instance_id", "anomaly_instance_id",
+            "anomaly_key", "timeout")
+
+    def __init__(self, sdata, data: {} = None):
+        self._raw = sdata       # bytes/str as read; None if data given
+        self._str = None        # JSON string, built upon first use
+        self._data = data       # Decoded dict
+        self._context = None    # Decoded context
+        self._context_data = None
+                                # Decoded action data by action name
+
+
+    def __getattr__(self, name:str):
+        # Called only for a field not yet set, i.e. before parse.
+        if name not in _REQ_FIELDS:
+            raise AttributeError(name)
+        self._parse()
+        return object.__getattribute__(self, name)
+
+
+    def _get_data(self) -> {}:
+        if self._data is None:
+            self._data = _json_loads(self._raw)
+        return self._data
+
+
+    def _parse(self):
+        data = self._get_data()
+        self.type = data.get(gvars.REQ_TYPE, "")
+        self.action_name = data.get(gvars.REQ_ACTION_NAME, "")
+        self.instance_id = data.get(gvars.REQ_INSTANCE_ID, "")
+        self.anomaly_instance_id = data.get(gvars.REQ_ANOMALY_INSTANCE_ID, "")
+        self.anomaly_key = data.get(gvars.REQ_ANOMALY_KEY, "")
+        self.timeout = data.get(gvars.REQ_TIMEOUT, 0)
+
+
+    @property
+    def context(self) -> {}:
+        if self._context is None:
+            self._context = decode_data(self._get_data().get(gvars.REQ_CONTEXT, {}))
+        return self._context
+
+
+    def get_context_data(self, action_name:str) -> {}:
+        # Action data of given action in context, decoded & cached.
+        # Empty dict, if absent.
+        if self._context_data is None:
+            self._context_data = {}
+        ret = self._context_data.get(action_name, None)
+        if ret is None:
+            ret = decode_data(self.context.get(action_name, {}))
+            self._context_data[action_name] = ret
+        return ret
+
 
     def __repr__(self):
-        return self.str_data
+        if self._str is None:
+            if self._raw is None:
+                self._str = json.dumps(self._data)
+            elif isinstance(self._raw, bytes):
+                self._str = self._raw.decode("utf-8")
+            else:
+                self._str = self._raw
+        return self._str
 
     def is_shutdown(self) -> bool:
         return self.type == gvars.REQ_TYPE_SHUTDOWN
 
+    def is_cancel(self) -> bool:
+        return self.type == gvars.REQ_TYPE_CANCEL
+
+
+# Cancellation token per request.
+# Passed to plugin's request as optional second arg, if the plugin's
+# request accepts it. Plugins with two arg request are called as before.
+#
+# Cancelled by plugin proc upon request timeout, mitigation deadline expiry
+# or cancel request from engine. A plugin running long/looping request is
+# expected to check it periodically and return early upon cancel.
+# The response returned after cancel is dropped.
+#
+class RequestToken:
+    def __init__(self, deadline:float = 0):
+        self.deadline = deadline        # Epoch secs; 0 for none
+        self.reason = ""
+        self._event = threading.Event()
+
+    def cancel(self, reason:str = ""):
+        self.reason = reason
+        self._event.set()
+
+    def is_cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def remaining(self) -> float:
+        # Secs left until deadline; None if no deadline.
+        if not self.deadline:
+            return None
+        return max(0, self.deadline - time.time())
+
+    def wait(self, timeout:float) -> bool:
+        # Use in place of sleep. Returns True if cancelled.
+        return self._event.wait(timeout)
+
 
 def read_action_request(timeout:int = -1) -> (bool, ActionRequest):
     if not validate_dll():
         return False, {}
 
-    req = _clib_read_action_request(timeout).decode("utf-8")
+    if _binary:
+        buf = _get_read_buf()
+        n = _clib_read_action_request_bin(buf, len(buf), timeout)
+        if n < -1:
+            # Buffer too small. Request is held; Read again into grown one.
+            buf = _get_read_buf(-n)
+            n = _clib_read_action_request_bin(buf, len(buf), 0)
+        if n <= 0:
+            if n < 0:
+                log_error("read_action_request_bin failed ret:{}".format(n))
+            return False, None
+        return True, ActionRequest(None, untag_fields(
+            msgpack.unpackb(string_at(buf, n), strict_map_key=False)))
+
+    # Parsed from bytes as is, upon first use.
+    req = _clib_read_action_request(timeout)
 
     if not req:
         e, estr = get_last_error()
@@ -225,39 +659,94 @@ def read_action_request(timeout:int = -1) -> (bool, ActionRequest):
     return True, ActionRequest(req)
 
 
+# Returns list of up to max_n requests. Empty list on timeout / error.
+# Waits for the first only, per timeout.
+#
+def read_action_requests(max_n:int, timeout:int = 0) -> [ActionRequest]:
+    if not validate_dll():
+        return []
+
+    if _binary or (_clib_read_action_requests is None):
+        lst = []
+        while len(lst) < max_n:
+            ret, req = read_action_request(timeout if not lst else 0)
+            if not ret:
+                break
+            lst.append(req)
+        return lst
+
+    reqs = _clib_read_action_requests(max_n, timeout)
+    if not reqs:
+        e, estr = get_last_error()
+        if e:
+            log_error("read_action_requests failed")
+        return []
+
+    # Single decode for the batch.
+    return [ ActionRequest(None, d) for d in _json_loads(reqs) ]
+
+
 
+# Response to server.
+# Fields stay as set by plugin, including any update after construction,
+# and are serialized upon write. action_data is a JSON string or an object.
+#
 class ActionResponse:
+    __slots__ = ("action_name", "instance_id", "anomaly_instance_id",
+            "anomaly_key", "action_data", "result_code", "result_str")
+
     def __init__(self, action_name:str,
             instance_id:str,
             anomaly_instance_id:str,
             anomaly_key:str,
-            action_data: str,
+            action_data,
             result_code:int,
             result_str:str) :
-        self.data = json.dumps({
-                gvars.REQ_ACTION_NAME: action_name,
+        self.action_name = action_name
+        self.instance_id = instance_id
+        self.anomaly_instance_id = anomaly_instance_id
+        self.anomaly_key = anomaly_key
+        self.action_data = action_data
+        self.result_code = result_code
+        self.result_str = result_str
+
+
+    def to_dict(self, nested:bool = False) -> {}:
+        # nested: Leave action_data object as is. Else encode as string.
+        action_data = self.action_data
+        if (not nested) and (not isinstance(action_data, str)):
+            action_data = json.dumps(action_data)
+        return {
+                gvars.REQ_ACTION_NAME: self.action_name,
                 gvars.REQ_TYPE: gvars.REQ_TYPE_ACTION,
-                gvars.REQ_INSTANCE_ID: instance_id,
-                gvars.REQ_ANOMALY_INSTANCE_ID: anomaly_instance_id,
-                gvars.REQ_ANOMALY_KEY: anomaly_key,
+                gvars.REQ_INSTANCE_ID: self.instance_id,
+                gvars.REQ_ANOMALY_INSTANCE_ID: self.anomaly_instance_id,
+                gvars.REQ_ANOMALY_KEY: self.anomaly_key,
                 gvars.REQ_ACTION_DATA: action_data,
-                gvars.REQ_RESULT_CODE: result_code,
-                gvars.REQ_RESULT_STR : result_str })
+                gvars.REQ_RESULT_CODE: self.result_code,
+                gvars.REQ_RESULT_STR : self.result_str }
+
+
+    def to_bytes(self) -> bytes:
+        # Serialized as server accepts.
+        return _json_dumps(self.to_dict(_nested_action_data))
+
 
-                
     def __repr__(self) -> str:
-        return self.data 
+        return self.value()
 
     def value(self) -> str:
-        return self.data 
+        return self.to_bytes().decode("utf-8")
 
 
 def write_action_response(res: ActionResponse) -> bool:
     if not validate_dll():
         return False
 
-    ret = _clib_write_action_response(
-            res.value().encode("utf-8"))
+    if _binary:
+        return write_action_responses([ res ])
+
+    ret = _clib_write_action_response(res.to_bytes())
 
     if ret != 0:
         log_error("write_action_response failed")
@@ -270,9 +759,115 @@ def poll_for_data(lst_fds: [int], timeout:int) -> int:
     if not validate_dll():
         return False
 
-    if not gvars.TEST_RUN:
+    if not _py_transport:
         return _clib_poll_for_data((c_int*len(lst_fds))(*lst_fds), len(lst_fds), timeout)
     else:
         return _clib_poll_for_data(lst_fds, len(lst_fds), timeout)
 
 
+# True if client lib provides get_server_fd. Valid after c_lib_init.
+#
+def is_server_fd_supported() -> bool:
+    return _clib_get_server_fd is not None
+
+
+# Returns fd that turns readable when request from server is pending.
+# Returns -1, if client lib does not support it or on failure.
+#
+def get_server_fd() -> int:
+    if not validate_dll():
+        return -1
+
+    if _clib_get_server_fd is None:
+        return -1
+
+    return _clib_get_server_fd()
+
+
+# Polls for data from server and list of fds, returning all that are
+# ready in one call.
+# The fd list is marshalled into a ctypes buffer once and reused for every
+# poll until the fd set changes via set_fds.
+#
+class FdPoller:
+    def __init__(self, lst_fds: [int] = ()):
+        self.fds = []
+        self.c_fds = None
+        self.c_ready = None
+        self.c_server_ready = c_int(0)
+        self.set_fds(lst_fds)
+
+
+    def set_fds(self, lst_fds: [int]):
+        if list(lst_fds) == self.fds:
+            return
+        self.fds = list(lst_fds)
+        cnt = len(self.fds)
+        if _py_transport:
+            self.c_fds = list(self.fds)
+            self.c_ready = [0] * cnt
+        else:
+            self.c_fds = (c_int*cnt)(*self.fds)
+            self.c_ready = (c_int*cnt)()
+
+
+    def poll(self, timeout:float) -> (int, bool, [int]):
+        # timeout in seconds; <0 blocks until data.
+        # Returns
+        #   (-2, False, []) on timeout
+        #   (cnt, server_ready, [ready fds]) on data
+        #   (<other -ve>, False, []) on error
+        #
+        if not validate_dll():
+            return -3, False, []
+
+        if _clib_poll_for_data_multi is None:
+            # Fall back to single fd poll, which takes whole secs. Round up,
+            # so a sub-sec timeout (e.g. next request deadline) does not
+            # turn into a busy poll.
+            ret = poll_for_data(self.fds, int(math.ceil(timeout)))
+            if ret == -1:
+                return 0, True, []
+            if ret >= 0:
+                return 1, False, [ret]
+            return ret, False, []
+
+        timeout_ms = int(timeout * 1000) if timeout >= 0 else -1
+        if _py_transport:
+            server = self.c_server_ready
+        else:
+            server = byref(self.c_server_ready)
+
+        ret = _clib_poll_for_data_multi(self.c_fds, len(self.fds),
+                self.c_ready, server, timeout_ms)
+        if ret < 0:
+            return ret, False, []
+        return ret, bool(self.c_server_ready.value), list(self.c_ready[0:ret])
+
+
+# Writes list of responses in one call.
+#
+def write_action_responses(lst: [ActionResponse]) -> bool:
+    if not lst:
+        return True
+
+    if (not _binary) and (_clib_write_action_responses is None):
+        ret = True
+        for res in lst:
+            ret = write_action_response(res) and ret
+        return ret
+
+    if not validate_dll():
+        return False
+
+    if _binary:
+        data = msgpack.packb([ tag_fields(res.to_dict(True)) for res in lst ])
+        ret = _clib_write_action_responses_bin(data, len(data))
+    else:
+        data = b"[" + b",".join([ res.to_bytes() for res in lst ]) + b"]"
+        ret = _clib_write_action_responses(data)
+    if ret != 0:
+        log_error("write_action_responses failed cnt:{}".format(len(lst)))
+        return False
+
+    return True
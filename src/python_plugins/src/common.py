@@ -1,10 +1,14 @@
 #! /usr/bin/env python
 
+import atexit
+import collections
 import ctypes
 import json
 import os
+import select
 import sys
 import syslog
+import threading
 import time
 from threading import current_thread
 from typing import NamedTuple
@@ -58,24 +62,273 @@ def set_log_level(lvl:int):
     ct_log_level = lvl
 
 
-def _log_write(lvl: int, msg:str):
-    if lvl <= ct_log_level:
-        syslog.syslog(lvl, msg)
-        print("{}:{}:{}: {}".format(current_thread().name, _lvl_to_str[lvl], 
-            time.time(), msg))
+# Async logging
+#
+# By default a log line is written to syslog & stdout on the calling thread.
+# Upon log_async_init, lines are queued instead & written by a background
+# writer thread, so a slow syslog or stdout never stalls the main loop or
+# plugin threads.
+#
+# Queue is a deque, bounded by count. A line is dropped, when full, and
+# counted. Writer reports the count of drops as it catches up.
+# Appending to a deque takes no lock, hence safe from signal handlers too.
+# Writer is woken via a pipe upon first line into an empty queue and as well
+# polls every LOG_WAKE_TIMEOUT secs.
+#
+# Callers pass format args separately, as log_info("x:{} y:{}", x, y).
+# The msg is formatted only if the level is enabled. It is formatted on the
+# calling thread, as args may change after the call.
+#
+LOG_QUEUE_SIZE = 10000
+LOG_WAKE_TIMEOUT = 0.5
+
+# Secs to wait for writer to drain upon exit
+LOG_EXIT_TIMEOUT = 2
+
+_log_queue = None
+_log_queue_size = LOG_QUEUE_SIZE
+_log_wake_wr = -1
+_log_writer_th = None
+_log_stats = { "written": 0, "dropped": 0 }
+
+
+def _log_out(lvl: int, th_name: str, tstamp: float, msg: str):
+    syslog.syslog(lvl, msg)
+    print("{}:{}:{}: {}".format(th_name, _lvl_to_str[lvl], tstamp, msg))
+
+
+def _log_writer(q: collections.deque, rd: int):
+    reported = 0
+    while True:
+        while q:
+            rec = q.popleft()
+            if rec is None:
+                os.close(rd)
+                return
+            _log_out(*rec)
+            _log_stats["written"] += 1
+
+        dropped = _log_stats["dropped"]
+        if dropped != reported:
+            _log_out(syslog.LOG_WARNING, current_thread().name, time.time(),
+                    "log: dropped {} messages as queue is full".format(
+                        dropped - reported))
+            reported = dropped
+
+        r, _, _ = select.select([rd], [], [], LOG_WAKE_TIMEOUT)
+        if r:
+            os.read(rd, 4096)
+
+
+# Starts the writer thread. Lines logged from here on are queued.
+# No-op, if already started.
+#
+def log_async_init(queue_size: int = LOG_QUEUE_SIZE):
+    global _log_queue, _log_queue_size, _log_wake_wr, _log_writer_th
+
+    if _log_queue is not None:
+        return
+
+    rd, wr = os.pipe()
+    os.set_blocking(wr, False)
+    q = collections.deque()
+    _log_queue_size = queue_size
+    _log_wake_wr = wr
+    _log_writer_th = threading.Thread(target=_log_writer, args=(q, rd),
+            name="log_writer", daemon=True)
+    _log_writer_th.start()
+    _log_queue = q
+    atexit.register(log_async_stop)
+
+
+# Drains the queue & stops the writer. Lines logged from here on are
+# written on the calling thread.
+#
+def log_async_stop():
+    global _log_queue, _log_wake_wr, _log_writer_th
+
+    q, th, wr = _log_queue, _log_writer_th, _log_wake_wr
+    if q is None:
+        return
+    _log_queue, _log_writer_th, _log_wake_wr = None, None, -1
+
+    # Write end is left open, as a racing caller may still write to it.
+    q.append(None)
+    _log_wake(wr)
+    th.join(LOG_EXIT_TIMEOUT)
+
+
+def _log_after_fork():
+    # Writer thread does not survive fork. Child writes synchronously.
+    global _log_queue, _log_writer_th, _log_wake_wr
+
+    _log_queue, _log_writer_th, _log_wake_wr = None, None, -1
+
+
+os.register_at_fork(after_in_child=_log_after_fork)
+
+
+def _log_wake(wr: int):
+    try:
+        os.write(wr, b"w")
+    except OSError:
+        # Pipe full implies writer has wakeups pending.
+        pass
+
+
+def get_log_stats() -> {}:
+    q = _log_queue
+    return { "async": q is not None, "queued": len(q) if q is not None else 0,
+            "written": _log_stats["written"], "dropped": _log_stats["dropped"] }
+
+
+# Flight recorder
+#
+# Ring buffer in memory of recent log records, at all levels, incl. ones
+# not enabled for write. Dumped to a file upon SIGUSR2 to plugin proc, via
+# fr_dump or, if enabled, upon error (at most once per FR_ERR_DUMP_INTERVAL
+# secs). Gives debug level history, while running at LOG_ERR.
+#
+# A record is (time, thread, level, action, instance_id, msg, args). msg is
+# not formatted upon record, only upon dump. args are held as passed, hence
+# a mutable arg shows its state at dump.
+# Appending to a deque with maxlen takes no lock & drops the oldest.
+#
+# Dump is JSON lines: a header with proc, pid & reason, then a line per
+# record, oldest first.
+# Dump files rotate per name, as <path>/flight.<name>.jsonl, then .1 & so on,
+# keeping last FR_DUMP_KEEP. Hence disk use stays bounded.
+#
+FR_SIZE = 4096
+FR_ERR_DUMP_INTERVAL = 60
+FR_DUMP_KEEP = 2
+
+_fr = None
+_fr_name = ""
+_fr_path = ""
+_fr_dump_on_err = False
+_fr_last_err_dump = 0
+_fr_stats = { "recorded": 0, "dumps": 0 }
+_fr_write_lock = threading.Lock()
+
+
+# Starts recording. size 0 disables.
+# name & path: Dump files are <path>/flight.<name>.jsonl, rotated.
+# dump_on_err: Dump upon error log too.
+#
+def fr_init(name: str, path: str, size: int = FR_SIZE, dump_on_err: bool = False):
+    global _fr, _fr_name, _fr_path, _fr_dump_on_err
+
+    _fr_name = name
+    _fr_path = path
+    _fr_dump_on_err = dump_on_err
+    _fr = collections.deque(maxlen=size) if size > 0 else None
+
+
+def _fr_format(rec: tuple) -> {}:
+    tstamp, th_name, lvl, action, instance_id, msg, args = rec
+    try:
+        text = msg.format(*args) if args else msg
+    except Exception as e:
+        text = "{} args:{} format failed e={}".format(msg, repr(args), str(e))
+    return { "time": tstamp, "thread": th_name, "level": _lvl_to_str[lvl],
+            "action": action, "instance_id": instance_id, "msg": text }
+
+
+def _fr_write(fname: str, hdr: {}, records: [tuple]):
+    # Serialized, as dumps in background may overlap.
+    with _fr_write_lock:
+        try:
+            for i in range(FR_DUMP_KEEP - 1, 0, -1):
+                prev = fname if i == 1 else "{}.{}".format(fname, i - 1)
+                if os.path.exists(prev):
+                    os.replace(prev, "{}.{}".format(fname, i))
+            with open(fname, "w") as s:
+                s.write(json.dumps(hdr) + "\n")
+                for rec in records:
+                    s.write(json.dumps(_fr_format(rec)) + "\n")
+        except OSError as e:
+            log_error("flight recorder: Failed to write {}: {}", fname, str(e))
+
+
+# Dumps the records to file, written in background, unless wait.
+# Returns file name or "" if recorder is not enabled.
+#
+def fr_dump(reason: str, wait: bool = False) -> str:
+    q = _fr
+    if q is None:
+        return ""
+
+    records = list(q)
+    tnow = time.time()
+    _fr_stats["dumps"] += 1
+    hdr = { "proc": _fr_name, "pid": os.getpid(), "reason": reason, "time": tnow,
+            "records": len(records),
+            "overwritten": max(0, _fr_stats["recorded"] - len(records)) }
+    fname = os.path.join(_fr_path, "flight.{}.jsonl".format(_fr_name))
+
+    if wait:
+        _fr_write(fname, hdr, records)
+    else:
+        threading.Thread(target=_fr_write, args=(fname, hdr, records),
+                name="fr_dump", daemon=True).start()
+    return fname
 
 
-def log_error(msg:str):
-    _log_write(syslog.LOG_ERR, msg)
+def get_fr_stats() -> {}:
+    q = _fr
+    return { "enabled": q is not None, "held": len(q) if q is not None else 0,
+            "recorded": _fr_stats["recorded"], "dumps": _fr_stats["dumps"] }
 
-def log_info(msg:str):
-    _log_write(syslog.LOG_INFO, msg)
 
-def log_warning(msg:str):
-    _log_write(syslog.LOG_WARNING, msg)
+def _log_write(lvl: int, msg:str, args: tuple = (), action: str = "",
+        instance_id: str = ""):
+    global _fr_last_err_dump
 
-def log_debug(msg:str):
-    _log_write(syslog.LOG_DEBUG, msg)
+    fr = _fr
+    if fr is not None:
+        tnow = time.time()
+        fr.append((tnow, current_thread().name, lvl, action, instance_id,
+            msg, args))
+        _fr_stats["recorded"] += 1
+        if _fr_dump_on_err and (lvl <= syslog.LOG_ERR) and (
+                (tnow - _fr_last_err_dump) >= FR_ERR_DUMP_INTERVAL):
+            _fr_last_err_dump = tnow
+            fr_dump("error")
+
+    if lvl > ct_log_level:
+        return
+
+    if args:
+        msg = msg.format(*args)
+
+    q = _log_queue
+    if q is None:
+        _log_out(lvl, current_thread().name, time.time(), msg)
+        return
+
+    if len(q) >= _log_queue_size:
+        _log_stats["dropped"] += 1
+        return
+
+    q.append((lvl, current_thread().name, time.time(), msg))
+    if len(q) == 1:
+        _log_wake(_log_wake_wr)
+
+
+# action & instance_id are optional; Recorded in flight recorder as fields.
+#
+def log_error(msg:str, *args, action:str = "", instance_id:str = ""):
+    _log_write(syslog.LOG_ERR, msg, args, action, instance_id)
+
+def log_info(msg:str, *args, action:str = "", instance_id:str = ""):
+    _log_write(syslog.LOG_INFO, msg, args, action, instance_id)
+
+def log_warning(msg:str, *args, action:str = "", instance_id:str = ""):
+    _log_write(syslog.LOG_WARNING, msg, args, action, instance_id)
+
+def log_debug(msg:str, *args, action:str = "", instance_id:str = ""):
+    _log_write(syslog.LOG_DEBUG, msg, args, action, instance_id)
 
 
 # *******************************
@@ -178,6 +431,20 @@ def get_actions_binding_conf_file(static = False):
     return fl
 
 
+def get_action_globals_file(static = False):
+    # Optional file. Return path for static/running path
+    cfg_path = get_config_path(static)
+    if not cfg_path:
+        return ""
+    name = get_global_rc().get("action_globals_name", "")
+    if not name:
+        return ""
+    fl = os.path.join(cfg_path, name)
+    if not os.path.exists(fl):
+        return ""
+    return fl
+
+
 def get_plugins_data_file(static = False):
     # Return path for static/running path
     cfg_path = get_config_path(static)
@@ -225,6 +492,13 @@ def get_actions_binding_conf(action_name:str) -> {}:
     return d
 
 
+def get_action_globals() -> {}:
+    # LOM_ACTION_GLOBALS with defaults for missing attributes.
+    ret = dict(gvars.GLOBALS_DEFAULTS)
+    ret.update(_get_data(get_action_globals_file()))
+    return ret
+
+
 def get_plugin_data(action_name:str) -> {}:
     d = _get_data(get_plugins_data_file())
     if action_name:
@@ -12,8 +12,27 @@
 REQ_REGISTER_CLIENT = "register_client"
 REQ_DEREGISTER_CLIENT = "deregister_client"
 REQ_REGISTER_ACTION = "register_action"
+REQ_DEREGISTER_ACTION = "deregister_action"
 REQ_HEARTBEAT = "heartbeat"
 REQ_ACTION_REQUEST = "action_request"
+REQ_CLIENT_CAPS = "client_caps"
+
+# Capabilities offered by client upon register_client_ex.
+# Used only if accepted by server.
+CAP_NESTED_DATA = "nested_data"     # Request context & response action_data
+                                    # as JSON objects, instead of JSON strings
+CAP_ENCODING = "encoding"           # Encoding of messages; One of ENCODING_*
+
+ENCODING_JSON = "json"              # JSON text. Default.
+ENCODING_MSGPACK = "msgpack"        # msgpack, with field names as int tags.
+                                    # Implies nested data.
+
+# Field names sent as integer tags with binary encoding.
+# Tag is 1 + index of the attribute name here, hence stays the same even
+# as values are refreshed from lib. Append only.
+TAG_FIELDS = [ "REQ_TYPE", "REQ_ACTION_NAME", "REQ_INSTANCE_ID",
+        "REQ_ANOMALY_INSTANCE_ID", "REQ_ANOMALY_KEY", "REQ_CONTEXT",
+        "REQ_TIMEOUT", "REQ_ACTION_DATA", "REQ_RESULT_CODE", "REQ_RESULT_STR" ]
 
 # Expected attribute names from CDLL for Action req/resp
 # These can be refreshed from loaded DLL
@@ -22,6 +41,7 @@ REQ_ACTION_REQUEST = "action_request"
 REQ_TYPE = "request_type"
 REQ_TYPE_ACTION = "action"
 REQ_TYPE_SHUTDOWN = "shutdown"
+REQ_TYPE_CANCEL = "cancel"
 
 REQ_CLIENT_NAME = "client_name"
 REQ_ACTION_NAME = "action_name"
@@ -32,11 +52,41 @@ REQ_CONTEXT = "context"
 REQ_TIMEOUT = "timeout"
 REQ_HEARTBEAT_INTERVAL = "heartbeat_interval"
 REQ_PAUSE = "action_pause"
+REQ_QUEUE_DEPTH = "request_queue_depth"
+REQ_QUEUE_COALESCE = "request_coalesce"
+REQ_MAX_CONCURRENCY = "max_concurrency"
+REQ_MAX_DETACHED = "max_detached"
+REQ_ISOLATION = "isolation"
+REQ_CANCEL_GRACE = "cancel_grace"
+REQ_LAZY_LOAD = "lazy_load"
+
+# Values for REQ_ISOLATION
+ISOLATION_THREAD = "thread"         # Runs in plugin proc. Default.
+ISOLATION_PROCESS = "process"       # Runs in a dedicated worker process.
 
 REQ_ACTION_DATA = "action_data"
 REQ_RESULT_CODE = "result_code"
 REQ_RESULT_STR = "result_str"
 
+# Result codes set by plugin proc on behalf of plugin, for requests
+# that could not reach the plugin.
+REQ_RESULT_CODE_QUEUE_FULL = -100
+REQ_RESULT_CODE_COALESCED = -101
+REQ_RESULT_CODE_DUPLICATE = -102
+REQ_RESULT_CODE_TIMEOUT = -103
+REQ_RESULT_CODE_CANCELLED = -104
+REQ_RESULT_CODE_UNHEALTHY = -105
+
+# LOM_ACTION_GLOBALS attribute names & defaults per schema.
+GLOBALS_HEARTBEAT_IDLE = "heartbeat-idle"
+GLOBALS_HEARTBEAT_ACTIVE = "heartbeat-active"
+GLOBALS_MAX_MITIGATION_TIMEOUT = "max-mitigation-timeout"
+
+GLOBALS_DEFAULTS = {
+        GLOBALS_HEARTBEAT_IDLE: 10,
+        GLOBALS_HEARTBEAT_ACTIVE: 10,
+        GLOBALS_MAX_MITIGATION_TIMEOUT: 120 }
+
 REQ_MITIGATION_STATE = "state" 
 REQ_MITIGATION_STATE_INIT = "init"
 REQ_MITIGATION_STATE_PROG = "in-progress"
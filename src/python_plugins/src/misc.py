@@ -8,8 +8,11 @@ def _reset_all():
         globals()[k] = None
 """ 
 
+from enum import Enum
+import os
 
- TODO -- Vendors support
+
+# TODO -- Vendors support
 
 Vendor_subdir = "vendors"
 
@@ -29,8 +32,8 @@ class ActionTypeStr(Enum):
 # *******************************
 #
 class vendorType(Enum):
-    SONIC = "SONiC",
-    CISCO = "Cisco",
+    SONIC = "SONiC"
+    CISCO = "Cisco"
     ARISTA = "Arista"
     UNKNOWN = "Unknown"
 
@@ -40,9 +43,11 @@ def get_vendor_type() -> vendorType:
         return vendorType.SONIC
     return vendorType.UNKNOWN
 
-def get_vendor_import_path():
-    syspath.append(os.path.join(
+# Returns dir of this vendor's plugins & helpers. Dir name is lower case.
+#
+def get_vendor_import_path() -> str:
+    return os.path.join(
         os.path.dirname(os.path.abspath(__file__)),
-        Vendor_subdir, get_vendor_type().value))
+        Vendor_subdir, get_vendor_type().value.lower())
 
 
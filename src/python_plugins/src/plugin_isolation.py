@@ -0,0 +1,292 @@
+#! /usr/bin/env python3
+
+# Runs a plugin in a worker process, for actions configured with
+# "isolation": "process".
+#
+# All plugins of a proc share an interpreter. A CPU bound plugin holds the
+# GIL and delays main loop of plugin proc in serving server & other plugins.
+# An isolated plugin runs in its own interpreter, in a worker process that
+# is spawned once and reused for every request.
+#
+# ProcessPluginProxy stands in for the plugin in plugin proc, with the same
+# interface as LoMPlugin. Its request call blocks the calling thread, while
+# the plugin runs the request in worker process.
+#
+# Messages over the pipe are tuples as (<msg type>, <args>...).
+# Request is passed as its JSON string & response as dict of its fields.
+#   proxy -> worker: request, cancel, shutdown
+#   worker -> proxy: init, heartbeat, response
+#
+# One request at a time per proxy. Hence max concurrency does not apply.
+#
+
+import asyncio
+import inspect
+import multiprocessing
+import queue
+import threading
+import time
+
+import clib_bind
+import common
+from common import *
+import gvars
+import plugin_registry
+
+MSG_INIT = "init"
+MSG_REQUEST = "request"
+MSG_RESPONSE = "response"
+MSG_HEARTBEAT = "heartbeat"
+MSG_CANCEL = "cancel"
+MSG_SHUTDOWN = "shutdown"
+
+# Secs to wait for worker process to load the plugin
+WORKER_INIT_TIMEOUT = 30
+
+# Secs between checks for cancel, while waiting for response
+WORKER_POLL_TIMEOUT = 0.5
+
+# Secs a plugin gets to return after cancel. Else worker process is killed
+# and respawned upon next request. Next request of the action waits for it.
+# Overridden per action via actions config.
+WORKER_CANCEL_GRACE = 5
+
+
+class ProcessPluginProxy:
+
+    def __init__(self, name:str, plugin_file:str, config: {}, fn_hb):
+        self.name = name
+        self.plugin_file = plugin_file
+        self.config = dict(config)
+        self.config.pop(gvars.REQ_ISOLATION, None)
+                                # Worker loads it as regular plugin
+        self.cancel_grace = float(self.config.pop(gvars.REQ_CANCEL_GRACE,
+            WORKER_CANCEL_GRACE))
+                                # Secs to wait for return after cancel
+        self.fn_hb = fn_hb      # Heartbeat callback from plugin proc
+        self.lock = threading.Lock()
+                                # Held for the duration of a request
+        self.send_lock = threading.Lock()
+        self.proc = None        # Worker process
+        self.conn = None        # Our end of the pipe
+        self.valid = self._spawn()
+
+
+    def _spawn(self) -> bool:
+        # Start worker process and wait for it to load the plugin.
+        #
+        ctx = multiprocessing.get_context("spawn")
+        self.conn, child_conn = ctx.Pipe()
+        self.proc = ctx.Process(target=_worker_main,
+                name="iso_{}".format(self.name),
+                args=(child_conn, self.name, self.plugin_file, self.config,
+                    plugin_registry.get_paths(), common.GLOBAL_RC_FILE,
+                    _get_gvars(), common.ct_log_level),
+                daemon=True)
+        self.proc.start()
+        child_conn.close()
+
+        msg = None
+        try:
+            if self.conn.poll(WORKER_INIT_TIMEOUT):
+                msg = self.conn.recv()
+        except EOFError:
+            pass
+
+        if (not msg) or (msg[0] != MSG_INIT) or (not msg[1]):
+            log_error("{}: Failed to load plugin in worker process msg:{}",
+                self.name, msg, action=self.name)
+            self._stop()
+            return False
+
+        log_info("{}: Loaded plugin in worker process pid:{}",
+            self.name, self.proc.pid, action=self.name)
+        return True
+
+
+    def _stop(self):
+        if self.proc is not None:
+            if self.proc.is_alive():
+                self.proc.terminate()
+            self.proc.join(1)
+            self.proc = None
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+    def _send(self, *msg):
+        with self.send_lock:
+            if self.conn is not None:
+                self.conn.send(msg)
+
+
+    def getName(self) -> str:
+        return self.name
+
+
+    def is_valid(self) -> bool:
+        return self.valid
+
+
+    def request(self, req:clib_bind.ActionRequest,
+            token:clib_bind.RequestToken = None) -> clib_bind.ActionResponse:
+        # Called from worker thread of plugin proc. Blocks until worker
+        # process responds. Raises exception on worker failure.
+        #
+        with self.lock:
+            if (self.proc is None) or (not self.proc.is_alive()):
+                self._stop()
+                if not self._spawn():
+                    raise Exception("worker process failed to start")
+
+            deadline = token.deadline if token is not None else 0
+            self._send(MSG_REQUEST, str(req), deadline)
+
+            cancelled = 0
+            while True:
+                if token is not None and (not cancelled) and token.is_cancelled():
+                    cancelled = time.time()
+                    self._send(MSG_CANCEL, req.instance_id, token.reason)
+
+                if cancelled and ((time.time() - cancelled) > self.cancel_grace):
+                    log_error("{}: instance:{} worker process killed after cancel",
+                        self.name, req.instance_id, action=self.name,
+                        instance_id=req.instance_id)
+                    self._stop()
+                    raise Exception("worker process killed after cancel")
+
+                try:
+                    if not self.conn.poll(WORKER_POLL_TIMEOUT):
+                        continue
+                    msg = self.conn.recv()
+                except (EOFError, OSError):
+                    self._stop()
+                    raise Exception("worker process exited")
+
+                if msg[0] == MSG_HEARTBEAT:
+                    self.fn_hb(msg[1])
+                elif msg[0] == MSG_RESPONSE:
+                    _, data, err = msg
+                    if err:
+                        raise Exception(err)
+                    return _decode_response(data)
+                else:
+                    log_error("{}: Unexpected msg from worker process {}",
+                        self.name, msg, action=self.name)
+
+
+    def shutdown(self):
+        # Called from main thread. Worker calls shutdown on plugin and exits.
+        #
+        try:
+            self._send(MSG_SHUTDOWN)
+        except OSError:
+            pass
+        proc = self.proc
+        if proc is not None:
+            proc.join(WORKER_POLL_TIMEOUT)
+            if proc.is_alive():
+                proc.terminate()
+
+
+
+def _get_gvars() -> {}:
+    # gvars of plugin proc, as refreshed from client lib upon its init.
+    # Worker does not init client lib. Hence these are passed on.
+    #
+    return { k: v for k, v in vars(gvars).items() if k.isupper() }
+
+
+def _decode_response(d: {}) -> clib_bind.ActionResponse:
+    return clib_bind.ActionResponse(d[gvars.REQ_ACTION_NAME],
+            d[gvars.REQ_INSTANCE_ID], d[gvars.REQ_ANOMALY_INSTANCE_ID],
+            d[gvars.REQ_ANOMALY_KEY], d[gvars.REQ_ACTION_DATA],
+            d[gvars.REQ_RESULT_CODE], d[gvars.REQ_RESULT_STR])
+
+
+# Entry point of worker process.
+# Main thread runs requests, one at a time. A reader thread receives from
+# pipe, so cancel reaches the plugin, while it runs a request.
+#
+def _worker_main(conn, name:str, plugin_file:str, config: {}, paths: [str],
+        global_rc_file:str, gvars_data: {}, log_level:int):
+    # Lazy import, as plugin proc imports this module.
+    import plugin_proc
+
+    # Plugins read global rc, e.g. for plugins data, and gvars, as they
+    # would in plugin proc.
+    set_global_rc_file(global_rc_file)
+    for k, v in gvars_data.items():
+        setattr(gvars, k, v)
+
+    if paths:
+        plugin_registry.init_registry(paths)
+    set_log_level(log_level)
+    syslog_init(name)
+
+    send_lock = threading.Lock()
+    def send(*msg):
+        with send_lock:
+            conn.send(msg)
+
+    def touch_heartbeat(instance_id:str):
+        send(MSG_HEARTBEAT, instance_id)
+
+    plugin = plugin_proc.load_plugin(name, plugin_file, config, touch_heartbeat)
+    send(MSG_INIT, plugin is not None)
+    if plugin is None:
+        return
+
+    pass_token = plugin_proc.takes_token(plugin.request)
+    requests = queue.Queue()
+    tokens = {}
+
+    def reader():
+        while True:
+            try:
+                msg = conn.recv()
+            except (EOFError, OSError):
+                msg = (MSG_SHUTDOWN,)
+
+            if msg[0] == MSG_CANCEL:
+                token = tokens.get(msg[1], None)
+                if token is not None:
+                    token.cancel(msg[2])
+                cancel = getattr(plugin, "cancel", None)
+                if cancel is not None:
+                    cancel(msg[1])
+            elif msg[0] == MSG_SHUTDOWN:
+                plugin.shutdown()
+                for token in list(tokens.values()):
+                    token.cancel("shutdown")
+                requests.put(msg)
+                return
+            else:
+                requests.put(msg)
+
+    threading.Thread(target=reader, name="iso_reader", daemon=True).start()
+
+    while True:
+        msg = requests.get()
+        if msg[0] == MSG_SHUTDOWN:
+            break
+
+        req = clib_bind.ActionRequest(msg[1])
+        token = clib_bind.RequestToken(msg[2])
+        tokens[req.instance_id] = token
+        try:
+            if pass_token:
+                response = plugin.request(req, token)
+            else:
+                response = plugin.request(req)
+            if inspect.iscoroutine(response):
+                response = asyncio.run(response)
+            send(MSG_RESPONSE, response.to_dict(nested=True), "")
+        except Exception as e:
+            send(MSG_RESPONSE, None, "plugin request failed in worker process: {}".
+                    format(str(e)))
+        finally:
+            tokens.pop(req.instance_id, None)
+
+    log_info("{}: worker process exiting", name, action=name)
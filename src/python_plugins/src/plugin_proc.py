@@ -1,16 +1,23 @@
 #! /usr/bin/env python3
 
 import argparse
+import asyncio
+import collections
+import concurrent.futures
+import heapq
 import importlib
+import inspect
 import json
 import os
-import select
+import resource
 import signal
 import sys
 import threading
 import time
 
 import clib_bind
+import plugin_isolation
+import plugin_registry
 
 from common import *
 import gvars
@@ -26,10 +33,19 @@ _CT_DIR = os.path.dirname(os.path.abspath(__file__))
 signal_raised = False
 sigusr1_raised = False
 sigterm_raised = False
+sighup_raised = False
+sigusr2_raised = False
 shutdown_request = False
 
 this_proc_name = ""
 
+# LOM_ACTION_GLOBALS as read at start of main_run
+action_globals = {}
+
+# Epoch secs of first request seen per anomaly instance ID, for mitigation
+# sequences. In order of first seen. Used by main thread only.
+anomaly_first_seen = collections.OrderedDict()
+
 # Poll to exit for general check, including signals
 #
 POLL_TIMEOUT = 2
@@ -37,6 +53,28 @@ POLL_TIMEOUT = 2
 # heartbeat touches from plugins running requests
 ACTIVE_POLL_TIMEOUT = 1
 
+# Dir to dump flight recorder into. Overridden via global rc
+# "flight_recorder_path"; "flight_recorder_size" sets count of records held.
+# "flight_recorder_dump_on_error" enables dump upon error log too.
+DEFAULT_FLIGHT_RECORDER_PATH = "/tmp"
+
+# Count of requests an action may hold pending, while its plugin is busy
+# Overridden per action via actions config.
+DEFAULT_REQ_QUEUE_DEPTH = 4
+
+# Count of workers stuck in timed out/cancelled requests, that get replaced
+# by a new worker. Default none, so a stuck request holds its slot, requests
+# queue behind it and the plugin never sees more than max concurrency calls.
+# Overridden per action via actions config, for plugins safe to be called
+# while a stuck call runs on.
+DEFAULT_MAX_DETACHED = 0
+
+# Action config keys applied by plugin holder. Change in any other key
+# needs plugin's update_config hook, else plugin is reloaded.
+HOLDER_CONFIG_KEYS = { gvars.REQ_QUEUE_DEPTH, gvars.REQ_QUEUE_COALESCE,
+        gvars.REQ_MAX_CONCURRENCY, gvars.REQ_MAX_DETACHED, gvars.REQ_PAUSE,
+        gvars.REQ_HEARTBEAT_INTERVAL }
+
 # NOTE:
 # The APIs that talk to server are not thread friendly (may likely
 # use ZMQ). 
@@ -53,11 +91,17 @@ ACTIVE_POLL_TIMEOUT = 1
 # Requirement: Need to react instantaneously for any data from any source.
 #
 # Current solution:
-#   Every plugin is provided an end of a pipem where other end is with main thred.
-#   Main thread has list of pipe fds as one per plugin.
+#   Every plugin is provided an event channel, which holds records posted by
+#   plugin threads and a wake fd, whose other end is with main thread.
+#   By default, every plugin gets its own channel. Hence main thread has list
+#   of wake fds as one per plugin.
+#   Optionally via global rc "shared_event_channel", all plugins share a single
+#   channel. Hence main thread polls on the wake fd + server only, irrespective
+#   of count of plugins, and drains events from all plugins in bulk.
 #
-#   Every time a plugin's threads return from request, it writes something into
-#   its end, just to alert the main thread.
+#   Every time a plugin's threads return from request or touch heartbeat, it
+#   posts a record into its channel and signals wake fd, just to alert the main
+#   thread. Signal is skipped if the channel is signalled and not yet drained.
 #
 #   Main thread calls zmq_poll internally  with all fds maintained in main thread
 #   Zmq_poll returns for data in ZMQ (from server) or in any of the fds (plugins)
@@ -69,15 +113,52 @@ ACTIVE_POLL_TIMEOUT = 1
 #   This will interrupt zmq_recv which will return with EINTR
 #   Generally, prefer not using signals. Hence keep it as fallback.
 #
+# asyncio runtime:
+#   Selected via -r asyncio arg or global rc "plugin_proc_runtime": "asyncio".
+#   Saves a thread per blocking request, so a proc can host many detectors.
+#   All runs in single event loop in main thread.
+#   The server fd (get_server_fd) is watched as reader by the loop. Upon
+#   readable all pending requests are read and dispatched.
+#   Plugins may implement request as coroutine (async def), which is run as
+#   a task in the loop. Synchronous plugins run in a shared thread pool.
+#   Heartbeats are forwarded via timer callbacks, rate limited as above.
+#   Request deadlines are timer callbacks too.
+#   Needs the client lib to provide get_server_fd. Else falls back to above.
+#
+
+RUNTIME_THREADS = "threads"
+RUNTIME_ASYNCIO = "asyncio"
+
+# Max count of server requests read per call.
+READ_BATCH_MAX = 64
+
+# Max threads constructing plugins concurrently at startup.
+# Overridden via global rc "plugin_load_workers". 1 loads serially.
+DEFAULT_PLUGIN_LOAD_WORKERS = 1
+
+# Max threads in pool, running synchronous plugins in asyncio runtime.
+# Overridden via global rc "async_executor_workers".
+DEFAULT_ASYNC_EXECUTOR_WORKERS = 32
 
 # Register signal in global variable
-# Anything but SIGTERM is used for re-reading config
-# The handler is only registered for SIGHUP & SIGTERM
+# SIGHUP is used for re-reading config, which is applied in place
+# by main loop, for actions that changed only.
+# SIGUSR2 makes main loop dump the flight recorder.
+# Rest make main loop exit.
 #
 def signal_handler(signum, frame):
-    global signal_raised, sigterm_raised, sigusr1_raised
+    global signal_raised, sigterm_raised, sigusr1_raised, sighup_raised
+    global sigusr2_raised
+
+    log_info("signal_handler({}) called", signum)
+    if signum == signal.SIGHUP:
+        sighup_raised = True
+        return
+
+    if signum == signal.SIGUSR2:
+        sigusr2_raised = True
+        return
 
-    log_info("signal_handler({}) called".format(signum))
     signal_raised = True
     if signum == signal.SIGUSR1:
         sigusr1_raised = True
@@ -98,88 +179,416 @@ class LoMPluginHolderFailure(Exception):
         super().__init__(self.message)
 
 
+# Signalling channel from plugin threads to main thread.
+# Plugin threads post records. Main thread polls on wake fd and drains all
+# posted records at once.
+# Wake fd is an eventfd where available, else a pipe.
+# Only the first post after a drain writes to wake fd, so a burst of posts
+# costs a single write & a single wakeup.
+#
+class EventChannel:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.records = collections.deque()
+        self.signalled = False
+        self.closed = False
+        if hasattr(os, "eventfd"):
+            self.fdR = os.eventfd(0, os.EFD_NONBLOCK | os.EFD_CLOEXEC)
+            self.fdW = self.fdR
+        else:
+            self.fdR, self.fdW = os.pipe()
+            os.set_blocking(self.fdR, False)
+
+
+    def get_fd(self) -> int:
+        return self.fdR
+
+
+    def post(self, record):
+        # Called from any thread.
+        #
+        with self.lock:
+            if self.closed:
+                return
+            self.records.append(record)
+            if self.signalled:
+                return
+            self.signalled = True
+            if self.fdR == self.fdW:
+                os.eventfd_write(self.fdW, 1)
+            else:
+                os.write(self.fdW, b"H")
+
+
+    def drain(self) -> []:
+        # Called from main thread upon wake fd being readable.
+        # Returns all records posted since last drain.
+        #
+        with self.lock:
+            ret = list(self.records)
+            self.records.clear()
+            self.signalled = False
+            try:
+                if self.fdR == self.fdW:
+                    os.eventfd_read(self.fdR)
+                else:
+                    os.read(self.fdR, 100)
+            except BlockingIOError:
+                pass
+        return ret
+
+
+    def close(self):
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            os.close(self.fdR)
+            if self.fdW != self.fdR:
+                os.close(self.fdW)
+
+
+# Responses & heartbeats to server, accumulated by main thread while it
+# handles a wakeup and written in a single call each, upon flush.
+# Flushed by main loop once per wakeup. Heartbeats go first, so server sees
+# an instance's last heartbeat before its response.
+# notify, if set, is called upon first add after a flush. The asyncio
+# runtime uses it to schedule the flush.
+#
+# Main thread only.
+#
+class ServerOutbox:
+
+    def __init__(self):
+        self.responses = []
+        self.heartbeats = []    # (action name, instance ID)
+        self.notify = None
+        self.stats = { "flushes": 0, "responses": 0, "heartbeats": 0 }
+
+
+    def _added(self):
+        if (self.notify is not None) and (
+                (len(self.responses) + len(self.heartbeats)) == 1):
+            self.notify()
+
+
+    def add_response(self, res:clib_bind.ActionResponse):
+        self.responses.append(res)
+        self._added()
+
+
+    def add_heartbeat(self, action:str, instance_id:str):
+        self.heartbeats.append((action, instance_id))
+        self._added()
+
+
+    def flush(self):
+        if (not self.responses) and (not self.heartbeats):
+            return
+
+        hbs, self.heartbeats = self.heartbeats, []
+        resps, self.responses = self.responses, []
+        self.stats["flushes"] += 1
+        self.stats["heartbeats"] += len(hbs)
+        self.stats["responses"] += len(resps)
+        clib_bind.touch_heartbeats(hbs)
+        clib_bind.write_action_responses(resps)
+
+
+# Book keeping for a request instance.
+# Created by main thread upon request from server, queued for worker and
+# dropped upon writing its response to server.
+# Heartbeat touches are tracked per instance, as concurrent requests of
+# the same action run with different instance IDs.
+# Touches are forwarded to server at most once per heartbeat interval.
+#
+class RequestInstance:
+
+    def __init__(self, req:clib_bind.ActionRequest, hb_interval:float,
+            max_duration:float = 0, seq_start:float = 0):
+        self.req = req
+        self.instance_id = req.instance_id
+        self.queued = time.time()   # Timestamp of request queued.
+        self.start = 0              # Timestamp of request start.
+        self.end = 0                # Timestamp of request end.
+        self.response = None        # Response returned by plugin
+        self.hb_interval = hb_interval
+                                    # Min secs between forwarded touches
+        self.touch = 0              # Last touch from plugin while running request
+        self.touch_fwd = 0          # Last touch picked for forwarding
+        self.touch_sent = 0         # Last touch that is sent
+                                    # touch stores epoch seconds
+        self.deadline = 0           # Epoch secs by which to respond. 0 for none.
+        self.cancelled = False      # Set upon timeout/cancel. Response is dropped.
+        self.done = False           # Set upon response written to server.
+        if req.timeout and (req.timeout > 0):
+            self.deadline = self.queued + req.timeout
+        if max_duration > 0:
+            # Mitigation deadline may come sooner. It runs from start of
+            # the sequence, if given.
+            tmax = (seq_start or self.queued) + max_duration
+            if (not self.deadline) or (tmax < self.deadline):
+                self.deadline = tmax
+        self.token = clib_bind.RequestToken(self.deadline)
+                                    # Passed to plugin, if it accepts.
+        self.hb_scheduled = False   # Forward of a suppressed touch is scheduled
+                                    # upon interval expiry.
+        self.timer = None           # asyncio runtime: Deadline timer handle
+        self.call = None            # asyncio runtime: Pool future of
+                                    # synchronous call in progress
+
+
+# Loads plugin module and constructs the plugin, passing heartbeat callback.
+# Returns plugin object or None on failure.
+# Shared by all runtimes.
+#
+# Records secs taken to import & construct in timing, if given.
+#
+def load_plugin(name:str, plugin_file:str, config: {}, fn_hb, timing: {} = None):
+    if timing is None:
+        timing = {}
+
+    if config.get(gvars.REQ_ISOLATION, gvars.ISOLATION_THREAD) == gvars.ISOLATION_PROCESS:
+        # Stand in, which runs the plugin in a worker process.
+        tstart = time.time()
+        plugin = plugin_isolation.ProcessPluginProxy(name, plugin_file, config, fn_hb)
+        timing["construct"] = time.time() - tstart
+        return plugin if plugin.is_valid() else None
+
+    if plugin_file.endswith(".py"):
+        module_name = os.path.basename(plugin_file[0:-3])
+    else:
+        module_name = os.path.basename(plugin_file)
+
+    try:
+        tstart = time.time()
+        # Straight from indexed file. Import by name, if not indexed.
+        registry = plugin_registry.get_registry()
+        module = registry.load_module(module_name) if registry is not None else None
+        if module is None:
+            module = importlib.import_module(module_name)
+        timing["import"] = time.time() - tstart
+
+        tstart = time.time()
+        plugin = getattr(module, "LoMPlugin")(config, fn_hb)
+        timing["construct"] = time.time() - tstart
+        if name != plugin.getName():
+            log_error("Action name mismatch in plugin_procs_actions.conf.json")
+            return None
+
+        if not plugin.is_valid():
+            log_error("Failed to init plugin {}".format(plugin))
+            return None
+
+    except Exception as e:
+        log_error("Failed to create plugin {} e={}".format(plugin_file, str(e)))
+        return None
+
+    return plugin
+
+
 # Handles a plugin.
 # A plugin is per action.
 # Mostly managed by main thread.
-# Asynchronous request alone is handled in a dedicated thread.
-# Hence each instance of a class may have a thread running if request is called
-# and yet to complete.
-# The request-thread indicates its completion via pipe fd.
-# Main thread createa a pipe per LoM instance.
-# Main thread listens/read on read-end of pipe, the request thread writes
-# when attached plugins return from request call and this thread exits.
-# Hence when main thread receives signal via pipe, the request thread will not 
-# be alive.
+# Asynchronous request alone is handled in dedicated worker thread(s).
+# Worker threads are created upon request and live as long as the holder.
+# They block on a request queue, which main thread feeds.
+# By default, a plugin runs one request at a time via single worker.
+# An action may declare max concurrency via config, which allows as many
+# workers to run requests concurrently, each with its own instance ID.
+# Such plugins are expected to be thread safe, e.g. stateless safety checks.
 #
-# Request thread periodically call heartbeat touch 
+# The queue is bounded per action config. Requests beyond the bound are
+# failed with explicit response. Optionally a pending request is replaced
+# by a newer one for the same anomaly key, when configured to coalesce.
+# A worker indicates completion of each request via event channel.
+# Main thread creates a channel per LoM instance or one shared by all.
+# Main thread listens/read on wake fd of channel, the worker thread posts
+# this holder into channel, when attached plugins return from request call.
+# Hence when main thread drains this holder from channel, the response is
+# ready and worker is back to waiting on queue.
+#
+# Requests with timeout are tracked by main thread for deadline. Requests in
+# a mitigation sequence are also bound by max-mitigation-timeout from globals,
+# which runs from the first request seen for its anomaly instance.
+# Upon expiry or cancel request from engine, a pending request is dropped
+# from queue; A running request is cancelled via its token and its worker
+# is detached. A detached worker keeps its slot until it returns and pending
+# requests queue behind it, unless action opts in via max_detached, which is
+# the count of detached workers replaced by a new worker to serve the queue.
+# Once replacements are exhausted and every slot is held by a detached
+# worker, the holder is unhealthy: Pending & new requests are failed, until
+# a stuck worker returns.
+# In either case, failure response is written to server and any late
+# response from plugin is dropped.
+#
+# Plugin's request is called with cancellation token as second arg, if it
+# accepts. Else called with request alone as before.
+#
+# Plugin is loaded upon holder creation, which may run in a thread pool at
+# startup. Main thread registers actions of all holders after, in one call.
+# An action that fails to load or register is skipped; Rest run.
+# An action configured with lazy_load defers loading the plugin until its
+# first request, which loads it in worker thread.
+#
+# Request thread periodically call heartbeat touch with its instance ID.
 # Main thread scan for touch and send the same to server.
+# Touches are coalesced per instance. Request thread signals main thread only
+# when the touch is due for forwarding as per heartbeat interval, which is
+# from action config, else heartbeat-idle/heartbeat-active from action globals.
+# Rest are suppressed. Upon first suppressed touch, main thread schedules a
+# timer upon interval expiry, which forwards the latest touch. Hence a touch
+# is never held back beyond the interval.
+#
+# Responses & heartbeats are written to server via outbox, flushed by main
+# loop once per wakeup.
 #
 #
 class LoMPluginHolder:
 
     def __init__(self, name:str, plugin_file:str, config: {}):
-       
-        if plugin_file.endswith(".py"):
-            module_name = os.path.basename(plugin_file[0:-3])
-        else:
-            module_name = os.path.basename(plugin_file)
-
 
         self.plugin = None      # Loaded plugin object
-        self.fdR = None         # Pipe read-end to receive signal from request called thread
-        self.fdW = None         # Pipe write-end written by req thread when plugin
-                                # returns from request call.
-        self.thr = None         # Thread object. Exists only when a req is outstanding
-                                # until the main thread receives signal from the thread
-                                # Main thread call join and reset to None
-                                # Response returned by plugin for the request
-        self.response:ActionResponse = None
-                                # Arrives via the req thread.
-        self.last_request = {}  # Last request sent to plugin
-        self.req_start = 0      # Timestamp of request start.
-        self.req_end = 0        # Timestamp of request end.
-        self.name = ""          # Name of the action handled by this plugin
-        self.touch = None       # Last touch from plugin while running request
-        self.touchSent = None   # Last touch that is sent
-                                # touch stores epoch seconds
-        self.action_pause = config.get(gvars.REQ_PAUSE, None)
-
-        try:
-            module = importlib.import_module(module_name)
-            plugin = getattr(module, "LoMPlugin")(config, self.do_touch_heartbeat)
-            if name != plugin.getName():
-                log_error("Action name mismatch in plugin_procs_actions.conf.json")
-                return
+        self.channel = None     # Event channel to signal main thread when plugin
+                                # returns from request call or touch heartbeat.
+        self.outbox = None      # Outbox of main loop. Written directly, if none.
+        self.workers = []       # Worker threads. Created upon request until
+                                # max concurrency and stays until shutdown.
+        self.detached = 0       # Count of workers stuck in timed out request
+        self.pass_token = False # True if plugin request accepts token
+        self.lock = threading.Condition()
+                                # Guards pending, completed & stats.
+                                # Workers wait on it.
+        self.pending = collections.deque()
+                                # Request instances queued for worker
+        self.completed = collections.deque()
+                                # Request instances with response
+                                # Added by worker; Drained by main thread.
+        self.hb_trailing = collections.deque()
+                                # Request instances with suppressed touch,
+                                # to schedule forward. Drained by main thread.
+        self.instances = {}     # All pending & running request instances
+                                # by instance ID. Updated by main thread only.
+        self.stopping = False   # Set upon shutdown to terminate worker
+        self.name = name        # Name of the action handled by this plugin
+        self.plugin_file = plugin_file
+        self.lazy = config.get(gvars.REQ_LAZY_LOAD, False)
+                                # Load plugin upon first request
+        self.load_lock = threading.Lock()
+                                # Guards lazy loading from workers
+        self.timing = { "import": 0.0, "construct": 0.0, "register": 0.0 }
+                                # Secs taken at startup phases
+        self.config = config    # Action config, as loaded. Diffed on reload.
+        self._apply_config(config)
+        self.stats = {
+                # Updated by worker thread
+                "requests": 0,
+                "queue_wait": 0.0,      # Total secs requests waited in queue
+                "queue_wait_max": 0.0,
+                "exec_time": 0.0,       # Total secs spent in plugin.request
+                "exec_time_max": 0.0,
+                "running_max": 0,       # Max count of concurrently running
+                "hb_touches": 0,        # Heartbeat touches from plugin
+                "hb_suppressed": 0,     # Touches coalesced w/o forwarding
+                # Updated by main thread
+                "enqueued": 0,
+                "coalesced": 0,         # Pending requests replaced by newer
+                "overflow": 0,          # Requests failed for queue full
+                "duplicate": 0,         # Requests failed for active instance ID
+                "hb_forwarded": 0,      # Heartbeats sent to server
+                "timeout": 0,           # Requests failed for timeout
+                "cancelled": 0,         # Requests cancelled by engine
+                "unhealthy": 0,         # Requests failed for detached cap
+                "late_response": 0,     # Responses dropped after timeout
+                "queue_depth_max": 0 }
+        self.running = 0        # Count of requests running in plugin
+
+        if not self.lazy:
+            self.load()
+        return
 
-            if not plugin.is_valid():
-                log_error("Failed to init plugin {}".format(plugin))
-                return
 
-            ret = clib_bind.register_action(name)
-            if not ret:
-                log_error("Failed to register action {} plugin:{}".format(
-                    name, plugin_file))
-                return
+    def load(self) -> bool:
+        # Thread neutral -- Called once by creator or by first request.
+        #
+        plugin = load_plugin(self.name, self.plugin_file, self.config,
+                self.do_touch_heartbeat, self.timing)
+        if plugin is None:
+            return False
+
+        self.pass_token = takes_token(plugin.request)
+        self.plugin = plugin
+        log_info("Loaded plugin {} from {} token:{}",
+            self.name, self.plugin_file, self.pass_token, action=self.name)
+        return True
 
-            self.name = name
-            self.plugin = plugin
-            log_info("Loaded plugin {} from {}".format(name, plugin_file))
 
-        except Exception as e:
-            log_error("Failed to create plugin {} e={}".format(plugin_file, str(e)))
+    def _ensure_loaded(self):
+        # Called from worker, before calling lazy loaded plugin.
+        #
+        with self.load_lock:
+            if (self.plugin is None) and (not self.load()):
+                raise LoMPluginHolderFailure("Failed to load plugin {}".format(
+                    self.plugin_file))
 
-        return
 
     def __del__(self):
         self.plugin = None
         return
 
 
+    def _apply_config(self, config: {}):
+        self.queue_depth = int(config.get(gvars.REQ_QUEUE_DEPTH, DEFAULT_REQ_QUEUE_DEPTH))
+                                # Max count of requests pending in queue
+        self.coalesce = config.get(gvars.REQ_QUEUE_COALESCE, False)
+                                # Replace pending request of same anomaly key
+        self.max_concurrency = max(1, int(config.get(gvars.REQ_MAX_CONCURRENCY, 1)))
+                                # Max count of requests run concurrently
+        self.max_detached = max(0, int(config.get(gvars.REQ_MAX_DETACHED,
+            DEFAULT_MAX_DETACHED)))
+                                # Max count of detached workers replaced
+        self.action_pause = config.get(gvars.REQ_PAUSE, None)
+        self.hb_interval = config.get(gvars.REQ_HEARTBEAT_INTERVAL, 0)
+                                # > 0 overrides interval from globals
+
+
+    def update_config(self, config: {}) -> bool:
+        # Called from main thread upon reload, with changed action config.
+        # Applies holder settings in place and pushes the delta to plugin
+        # via its optional update_config hook. Removed keys map to None.
+        # Returns False, if plugin needs to be reloaded for the change.
+        #
+        if (config.get(gvars.REQ_ISOLATION, gvars.ISOLATION_THREAD) !=
+                self.config.get(gvars.REQ_ISOLATION, gvars.ISOLATION_THREAD)):
+            return False
+
+        delta = { k: v for k, v in config.items() if self.config.get(k, None) != v }
+        delta.update({ k: None for k in self.config if k not in config })
+
+        hook = getattr(self.plugin, "update_config", None)
+        if hook is not None:
+            try:
+                if not hook(delta):
+                    return False
+            except Exception as e:
+                log_error("{}: update_config failed e={}".format(self.name, str(e)))
+                return False
+        elif not set(delta.keys()).issubset(HOLDER_CONFIG_KEYS):
+            return False
+
+        with self.lock:
+            self._apply_config(config)
+        self.config = config
+        log_info("{}: Updated config delta:{}".format(self.name, delta))
+        return True
+
+
     def is_valid(self):
-        # If valid, the plugin object exists
+        # If valid, the plugin object exists or is to be loaded lazily.
         # Thread neutral -- Anyone may call
         #
-        return self.plugin
+        return (self.plugin is not None) or self.lazy
 
 
     def do_touch_heartbeat(self, instance_id:str):
@@ -190,193 +599,890 @@ class LoMPluginHolder:
         # 
         # Hence called from request thread.
         #
-        self.touch = int(time.time())
-        self.instance_id = instance_id
-        self._raise_signal()
+        inst = self.instances.get(instance_id, None)
+        if inst is None:
+            log_error("{}: heartbeat for unknown instance:{}",
+                self.name, instance_id, action=self.name, instance_id=instance_id)
+            return
+
+        tnow = time.time()
+        signal = False
+        with self.lock:
+            inst.touch = tnow
+            self.stats["hb_touches"] += 1
+            if (tnow - inst.touch_fwd) >= inst.hb_interval:
+                inst.touch_fwd = tnow
+                signal = True
+            else:
+                self.stats["hb_suppressed"] += 1
+                if not inst.hb_scheduled:
+                    # Main thread schedules forward upon interval expiry.
+                    inst.hb_scheduled = True
+                    self.hb_trailing.append(inst)
+                    signal = True
+
+        if signal:
+            self._raise_signal()
+
+
+    def _is_mitigation_seq(self, req:clib_bind.ActionRequest) -> bool:
+        # Requests in mitigation sequence are for an anomaly detected by
+        # another instance.
+        #
+        return bool(req.anomaly_instance_id and
+                (req.anomaly_instance_id != req.instance_id))
+
+
+    def _get_hb_interval(self, req:clib_bind.ActionRequest) -> float:
+        # Action config overrides.
+        # Else active interval for requests in mitigation sequence. Else idle.
+        #
+        if self.hb_interval > 0:
+            return self.hb_interval
+        if self._is_mitigation_seq(req):
+            return action_globals.get(gvars.GLOBALS_HEARTBEAT_ACTIVE, 0)
+        return action_globals.get(gvars.GLOBALS_HEARTBEAT_IDLE, 0)
+
+
+    def _get_max_duration(self, req:clib_bind.ActionRequest) -> float:
+        if self._is_mitigation_seq(req):
+            return action_globals.get(gvars.GLOBALS_MAX_MITIGATION_TIMEOUT, 0)
+        return 0
+
+
+    def _get_seq_start(self, req:clib_bind.ActionRequest, max_duration:float) -> float:
+        # Called from main thread.
+        # Returns epoch secs the mitigation sequence of this request started,
+        # so max-mitigation-timeout bounds the whole sequence, not each request.
+        # Request does not carry detection time. Hence first request seen for
+        # the anomaly instance in this proc stands in.
+        #
+        if max_duration <= 0:
+            return 0
+
+        tnow = time.time()
+
+        # Entries are kept for twice the timeout, so a late request of an
+        # expired sequence still fails, instead of starting afresh.
+        while anomaly_first_seen:
+            key, tstart = next(iter(anomaly_first_seen.items()))
+            if (tnow - tstart) <= (2 * max_duration):
+                break
+            anomaly_first_seen.pop(key)
 
+        return anomaly_first_seen.setdefault(req.anomaly_instance_id, tnow)
 
-    def send_heartbeat(self) -> bool:
-        if self.touchSent != self.touch:
-            self.touchSent = self.touch
-            clib_bind.touch_heartbeat(self.name, self.instance_id)
-            log_info("plugin_proc:{} plugin:{} Sent heartbeat".
-                    format(this_proc_name, self.name))
+
+    def send_heartbeat(self):
+        # Called from main thread.
+        # Send heartbeat for every instance with touch due since last send.
+        #
+        for inst in list(self.instances.values()):
+            if inst.touch_sent != inst.touch_fwd:
+                inst.touch_sent = inst.touch_fwd
+                self.stats["hb_forwarded"] += 1
+                self._write_heartbeat(inst.instance_id)
+                log_info("plugin_proc:{} plugin:{} instance:{} Sent heartbeat",
+                        this_proc_name, self.name, inst.instance_id,
+                        action=self.name, instance_id=inst.instance_id)
     
 
-    def set_pipe(self, fdR:int, fdW:int):
+    def pop_trailing_heartbeats(self) -> [RequestInstance]:
+        # Called from main thread. Returns instances with suppressed touch,
+        # to forward via _fire_heartbeat upon their interval expiry.
+        #
+        with self.lock:
+            ret = list(self.hb_trailing)
+            self.hb_trailing.clear()
+        return ret
+
+
+    def _fire_heartbeat(self, inst:RequestInstance):
+        # Called from main thread upon interval expiry since last forward.
+        # Forwards the latest touch.
+        #
+        with self.lock:
+            inst.hb_scheduled = False
+            inst.touch_fwd = inst.touch
+
+        if not inst.done:
+            self.send_heartbeat()
+
+
+    def set_channel(self, channel:EventChannel, outbox:ServerOutbox = None):
         # Called by main thread as part of initializing this instance
         # for future signalling, when request will be called on plugin.
         #
         # This is called only from main thread.
         #
-        if self.fdW != None:
-            raise LoMPluginHolderFailure("Internal: Duplicate set_pipe")
+        if self.channel != None:
+            raise LoMPluginHolderFailure("Internal: Duplicate set_channel")
 
-        self.fdW = fdW      # Write end of os.pipe
-        self.fdR = fdR      # Read  end of os.pipe
+        self.channel = channel
+        self.outbox = outbox
         return
 
 
+    def _write_response(self, res:clib_bind.ActionResponse):
+        # Called from main thread.
+        #
+        if self.outbox is not None:
+            self.outbox.add_response(res)
+        else:
+            clib_bind.write_action_response(res)
+
+
+    def _write_heartbeat(self, instance_id:str):
+        # Called from main thread.
+        #
+        if self.outbox is not None:
+            self.outbox.add_heartbeat(self.name, instance_id)
+        else:
+            clib_bind.touch_heartbeat(self.name, instance_id)
+
+
     def _raise_signal(self):
         # Called from request thread upon plugin returning from request or heartbeat
         # call to indicate to main thread.
         #
-        os.write(self.fdW, b"Hello")
+        self.channel.post(self)
         return
 
 
-    def _drain_signal(self):
-        # reset the signal, if any
-        # Check before making blocking read, as it might have
-        # already got cleared. Read w/o data will block.
+    def _call_plugin(self, inst:RequestInstance):
+        # Returns whatever plugin request returns. A coroutine for
+        # async plugins.
         #
-        r, _, _ = select.select([self.fdR], [], [], 0)
-        if self.fdR in r:
-            os.read(self.fdR, 100)
+        if self.plugin is None:
+            self._ensure_loaded()
+        if self.pass_token:
+            return self.plugin.request(inst.req, inst.token)
+        return self.plugin.request(inst.req)
 
 
-    def _run_request(self):
-        # Starting method of the request thread.
-        # Running in a dedicated thread. So make a blocking call.
+    def _failed_plugin_response(self, req:clib_bind.ActionRequest,
+            e:Exception) -> clib_bind.ActionResponse:
+        log_error("{}: request failed e={}", self.name, str(e),
+                action=self.name, instance_id=req.instance_id)
+        return clib_bind.ActionResponse(self.name, req.instance_id,
+                req.anomaly_instance_id, req.anomaly_key, "", -1,
+                "plugin request failed: {}".format(str(e)))
+
+
+    def _run_request(self, inst:RequestInstance):
+        # Called in worker thread. So make a blocking call.
         #
-        self.response = self.plugin.request(self.last_request)
-        self.req_end = time.time()
+        inst.start = time.time()
+        try:
+            response = self._call_plugin(inst)
+            if inspect.iscoroutine(response):
+                # Async plugin in threaded runtime. Run it to completion
+                # in this worker.
+                response = asyncio.run(response)
+        except Exception as e:
+            response = self._failed_plugin_response(inst.req, e)
 
-        log_info("{}: Completed request".format(self.name))
+        self._complete_request(inst, response)
 
         # Raise signal as last step.
         self._raise_signal()     # Inform the completion
+        return
+
 
-        # request thread terminates upon return.
+    def _complete_request(self, inst:RequestInstance,
+            response:clib_bind.ActionResponse):
+        # Record response & stats and queue it for handle_response.
+        #
+        inst.response = response
+        inst.end = time.time()
+
+        wait = inst.start - inst.queued
+        taken = inst.end - inst.start
+
+        log_info("{}: Completed request instance:{} queue-wait:{} exec:{}",
+            self.name, inst.instance_id, wait, taken,
+            action=self.name, instance_id=inst.instance_id)
+
+        with self.lock:
+            self.stats["requests"] += 1
+            self.stats["queue_wait"] += wait
+            self.stats["exec_time"] += taken
+            if wait > self.stats["queue_wait_max"]:
+                self.stats["queue_wait_max"] = wait
+            if taken > self.stats["exec_time_max"]:
+                self.stats["exec_time_max"] = taken
+            self.completed.append(inst)
         return
 
 
-    def _chk_thread_done(self) -> bool:
-        # Called from main thread to check on req thread if
-        # completed or not.
-        # Return false if running
-        # Else thread is joined, cleared and any signal written
-        # is cleared
+    def _run_worker(self):
+        # Starting method of the worker thread.
+        # Blocks on pending queue and runs one request at a time.
+        # Terminates upon shutdown.
         #
-        if self.thr:
-            if self.thr.is_alive():
-                # Request thread has not completed yet.
-                taken = time.time() - self.req_start
-                log_error("{}:request running for {} > timeout{}".
-                        format(self.name, take, self.request.timeout))
-                return False
+        while True:
+            with self.lock:
+                while (not self.pending) and (not self.stopping):
+                    self.lock.wait()
+                if self.stopping:
+                    break
+                inst = self.pending.popleft()
+                self.running += 1
+                if self.running > self.stats["running_max"]:
+                    self.stats["running_max"] = self.running
+
+            self._run_request(inst)
+
+            with self.lock:
+                self.running -= 1
+                if inst.cancelled:
+                    # This worker was replaced upon timeout.
+                    self.detached -= 1
+                if (len(self.workers) - self._replaced()) > self.max_concurrency:
+                    # Surplus upon timeout or reduced concurrency.
+                    self.workers.remove(threading.current_thread())
+                    break
+
+        log_info("{}: worker thread exiting".format(self.name))
+        return
 
-            # Join to formally close
-            #
-            self.thr.join(0)
-            self.thr = None
 
-        return True
+    def _replaced(self) -> int:
+        # Count of detached workers, whose slot is taken by a replacement.
+        #
+        return min(self.detached, self.max_detached)
 
 
-    def handle_response(self):
-        tnow = time.time()
+    def is_healthy(self) -> bool:
+        # Thread neutral -- False, if replacements are exhausted and every
+        # slot is held by a detached worker. Without replacement, requests
+        # just queue for a detached worker to return.
+        #
+        if not self.max_detached:
+            return True
+        return self.detached < (self.max_concurrency + self.max_detached)
 
-        self._drain_signal()
 
-        # Called from main thread, upon receiving signal
-        # May be response or heartbeat from plugin
+    def _chk_workers(self):
+        # Called from main thread.
+        # Create a worker, if count of workers, less the replaced ones, is
+        # below max concurrency and holder is healthy.
         #
-        if not self.req_end:
-            log_info("plugin_proc:{} req_end not set".format(this_proc_name))
-            self.send_heartbeat()
-            return
+        with self.lock:
+            if (len(self.workers) - self._replaced()) >= self.max_concurrency:
+                return
+            if not self.is_healthy():
+                return
+            th = threading.Thread(target=self._run_worker,
+                    name="req_{}_{}".format(self.name, len(self.workers)),
+                    daemon=True)
+            self.workers.append(th)
+        th.start()
+
+
+    def _write_failed_response(self, req:clib_bind.ActionRequest,
+            code:int, msg:str):
+        # Called from main thread to respond on behalf of plugin for
+        # requests that never reach the plugin.
+        #
+        log_error("{}: instance:{} {}", self.name, req.instance_id, msg,
+                action=self.name, instance_id=req.instance_id)
+        self._write_response(clib_bind.ActionResponse(
+            self.name, req.instance_id, req.anomaly_instance_id,
+            req.anomaly_key, "", code, msg))
 
-        if self.response == None:
-            log_error("Internal error: Expect response")
-            return 
+
+    def handle_response(self):
+        # Called from main thread, upon draining this holder from channel
+        # May be response(s) and/or heartbeat from plugin
+        #
+        with self.lock:
+            done = list(self.completed)
+            self.completed.clear()
 
         # Write response to backend server/engine.
         #
-        clib_bind.write_action_response(self.response)
-        self.response = None
-        self.req_end = 0
+        for inst in done:
+            if inst.cancelled:
+                self.stats["late_response"] += 1
+                log_error("{}: instance:{} dropped response after timeout",
+                    self.name, inst.instance_id,
+                    action=self.name, instance_id=inst.instance_id)
+                continue
+
+            self.instances.pop(inst.instance_id, None)
+            inst.done = True
+            self._write_response(inst.response)
+
+            log_info("plugin_proc:{} plugin:{}: request taken:{} process-pause:{}",
+                this_proc_name, self.name, time.time() - inst.queued, self.action_pause,
+                action=self.name, instance_id=inst.instance_id)
+
+        # Heartbeats from instances still running
+        self.send_heartbeat()
+
+
+    def get_stats(self) -> {}:
+        # Thread neutral -- Returns a copy of counters
+        #
+        with self.lock:
+            ret = dict(self.stats)
+            ret["queue_depth"] = len(self.pending)
+            ret["running"] = self.running
+        return ret
+
+
+    def _coalesce_request(self, inst:RequestInstance):
+        # Called with lock held.
+        # Replace a pending request for same anomaly key, if any.
+        # Returns the replaced request instance or None
+        #
+        key = inst.req.anomaly_key
+        if not key:
+            return None
+
+        for i, old in enumerate(self.pending):
+            if old.req.anomaly_key == key:
+                inst.queued = old.queued
+                self.pending[i] = inst
+                return old
+        return None
+
+
+    def _cancel_request(self, inst:RequestInstance, code:int, reason:str) -> bool:
+        # Called from main thread to fail an active request instance.
+        # Returns False, if the instance is no longer active.
+        #
+        if self.instances.get(inst.instance_id, None) is not inst:
+            return False
 
-        log_info("plugin_proc:{} plugin:{}: request taken:{} process-pause:{}".format(
-            this_proc_name, self.name, time.time() - self.req_start, self.action_pause))
+        running = False
+        with self.lock:
+            if inst in self.pending:
+                self.pending.remove(inst)
+            else:
+                running = True
+                if inst in self.completed:
+                    # Completed, but not yet handled. Let it through.
+                    return False
+                self.detached += 1
+            inst.cancelled = True
+
+        self.instances.pop(inst.instance_id, None)
+        inst.done = True
+        inst.token.cancel(reason)
+
+        if running:
+            # Let plugin know via optional hook too, if it cares.
+            cancel = getattr(self.plugin, "cancel", None)
+            if cancel is not None:
+                try:
+                    cancel(inst.instance_id)
+                except Exception as e:
+                    log_error("{}: cancel failed e={}".format(self.name, str(e)))
+            if self.pending:
+                self._chk_workers()
+
+        self._write_failed_response(inst.req, code,
+                "{} running:{}".format(reason, running))
+
+        if running and (not self.is_healthy()):
+            self._fail_unhealthy()
+        return True
 
 
-    def send_request(self, req:clib_bind.ActionRequest):
+    def _fail_unhealthy(self):
+        # Called from main thread, when replacements are exhausted.
+        # Fails pending requests, as no worker is to serve them.
+        #
+        log_error("{}: unhealthy with detached workers:{}",
+                self.name, self.detached, action=self.name)
+        with self.lock:
+            pending = list(self.pending)
+        for inst in pending:
+            if self._cancel_request(inst, gvars.REQ_RESULT_CODE_UNHEALTHY,
+                    "action unhealthy detached:{}".format(self.detached)):
+                self.stats["unhealthy"] += 1
+
+
+    def timeout_request(self, inst:RequestInstance) -> bool:
+        # Called from main thread upon deadline expiry of request instance.
+        #
+        ret = self._cancel_request(inst, gvars.REQ_RESULT_CODE_TIMEOUT,
+                "request timed out after {} secs".format(
+                    max(0, int(inst.deadline - inst.queued))))
+        if ret:
+            self.stats["timeout"] += 1
+        return ret
+
+
+    def cancel_request(self, instance_id:str) -> bool:
+        # Called from main thread upon cancel request from engine.
+        #
+        inst = self.instances.get(instance_id, None)
+        if inst is None:
+            log_info("{}: cancel for inactive instance:{}",
+                self.name, instance_id, action=self.name, instance_id=instance_id)
+            return False
+
+        ret = self._cancel_request(inst, gvars.REQ_RESULT_CODE_CANCELLED,
+                "request cancelled by engine")
+        if ret:
+            self.stats["cancelled"] += 1
+        return ret
+
+
+    def send_request(self, req:clib_bind.ActionRequest) -> RequestInstance:
         # Called by main thread upon receiving request call to 
         # this plugin from the backend engine / server.
         #
-        if not self._chk_thread_done():
-            log_error("{}: request dropped as busy with previous".format(self.name))
-            return
+        # Queued for worker thread to raise request to loaded plugin
+        # as blocking. Workers are created upon request until max
+        # concurrency.
+        # Returns the queued request instance or None if failed.
+        #
+        if req.instance_id in self.instances:
+            self.stats["duplicate"] += 1
+            self._write_failed_response(req, gvars.REQ_RESULT_CODE_DUPLICATE,
+                    "request instance already active")
+            return None
+
+        if not self.is_healthy():
+            self.stats["unhealthy"] += 1
+            self._write_failed_response(req, gvars.REQ_RESULT_CODE_UNHEALTHY,
+                    "action unhealthy detached:{}".format(self.detached))
+            return None
+
+        self._chk_workers()
+
+        max_duration = self._get_max_duration(req)
+        inst = RequestInstance(req, self._get_hb_interval(req), max_duration,
+                self._get_seq_start(req, max_duration))
+        replaced = None
+        full = False
+        with self.lock:
+            if self.coalesce:
+                replaced = self._coalesce_request(inst)
+
+            if replaced is not None:
+                self.instances.pop(replaced.instance_id, None)
+                self.instances[inst.instance_id] = inst
+            elif len(self.pending) >= self.queue_depth:
+                full = True
+            else:
+                # Track before worker could see it.
+                self.instances[inst.instance_id] = inst
+                self.pending.append(inst)
+                self.stats["enqueued"] += 1
+                if len(self.pending) > self.stats["queue_depth_max"]:
+                    self.stats["queue_depth_max"] = len(self.pending)
+                self.lock.notify()
+
+        if full:
+            self.stats["overflow"] += 1
+            self._write_failed_response(req, gvars.REQ_RESULT_CODE_QUEUE_FULL,
+                    "request queue full depth:{}".format(self.queue_depth))
+            return None
+
+        if replaced is not None:
+            replaced.done = True
+            self.stats["coalesced"] += 1
+            self._write_failed_response(replaced.req, gvars.REQ_RESULT_CODE_COALESCED,
+                    "request replaced by instance:{}".format(req.instance_id))
+        else:
+            log_info("{}: request submitted instance:{}",
+                self.name, inst.instance_id,
+                action=self.name, instance_id=inst.instance_id)
+
+        return inst
+
+    
+    def remove(self, reason:str):
+        # Called from main thread upon dropping this action on reload.
+        # Fails all active requests, as no response could be sent later.
+        #
+        for inst in list(self.instances.values()):
+            if self._cancel_request(inst, gvars.REQ_RESULT_CODE_CANCELLED, reason):
+                self.stats["cancelled"] += 1
+        self.shutdown()
+
+
+    def shutdown(self):
+        if self.plugin is not None:
+            self.plugin.shutdown()
+
+        # Workers exit upon completing any running request.
+        with self.lock:
+            self.stopping = True
+            self.lock.notify_all()
+        self.workers = []
+
+        for inst in list(self.instances.values()):
+            inst.token.cancel("shutdown")
+
+
 
-        if self.response:
-            log_error("Internal error: request sent before response for last")
+# Handles a plugin in asyncio runtime.
+# Everything but synchronous plugin's request runs in the event loop.
+# Requests queue and coalesce as in threaded runtime. Only that a pending
+# request is started as a task, instead of being picked by a worker.
+# Cancelling the task stops a coroutine plugin. A synchronous call in pool
+# runs on; Its task is detached and holds its slot until the call returns,
+# as a detached worker does.
+#
+class AsyncPluginHolder(LoMPluginHolder):
+
+    def __init__(self, name:str, plugin_file:str, config: {}):
+        self.loop = None        # Event loop, running this plugin
+        self.executor = None    # Thread pool for synchronous plugin
+        self.is_coro = False    # True if plugin request is coroutine
+        self.tasks = {}         # Running request tasks by instance ID
+
+        super().__init__(name, plugin_file, config)
+
+
+    def load(self) -> bool:
+        ret = super().load()
+        if ret:
+            self.is_coro = inspect.iscoroutinefunction(self.plugin.request)
+            log_info("{}: coroutine plugin:{}", self.name, self.is_coro,
+                    action=self.name)
+        return ret
+
+
+    def set_loop(self, loop:asyncio.AbstractEventLoop,
+            executor:concurrent.futures.Executor, outbox:ServerOutbox = None):
+        # Called by main thread as part of initializing this instance.
+        #
+        if self.loop is not None:
+            raise LoMPluginHolderFailure("Internal: Duplicate set_loop")
+
+        self.loop = loop
+        self.executor = executor
+        self.outbox = outbox
+
+
+    def do_touch_heartbeat(self, instance_id:str):
+        # Call back from loaded plugin.
+        # Called from loop for coroutine plugin, else from pool thread.
+        # First touch schedules a timer to forward, which picks all
+        # touches until it fires.
+        #
+        inst = self.instances.get(instance_id, None)
+        if inst is None:
+            log_error("{}: heartbeat for unknown instance:{}",
+                self.name, instance_id, action=self.name, instance_id=instance_id)
             return
 
-        # Kick off thread to raise request to loaded plugin as blocking.
+        with self.lock:
+            inst.touch = time.time()
+            self.stats["hb_touches"] += 1
+            if inst.hb_scheduled:
+                self.stats["hb_suppressed"] += 1
+                return
+            inst.hb_scheduled = True
+
+        self.loop.call_soon_threadsafe(self._schedule_heartbeat, inst)
+
+
+    def _schedule_heartbeat(self, inst:RequestInstance):
+        # Forward no sooner than interval since last forward.
         #
-        self.req_start = time.time()
-        self.last_request = req
-        self.thr = threading.Thread(target=self._run_request,
-                name="req_{}".format(self.name))
-        self.thr.start()
+        delay = max(0, inst.touch_fwd + inst.hb_interval - time.time())
+        self.loop.call_later(delay, self._fire_heartbeat, inst)
 
-        log_info("{}: request submitted".format(self.name))
 
-        return
+    def _chk_workers(self):
+        # No workers. Start pending requests as tasks, until max concurrency.
+        # Tasks detached, less the replaced ones, count as running.
+        #
+        while self.pending and ((self.running - self._replaced()) <
+                self.max_concurrency):
+            inst = self.pending.popleft()
+            self.running += 1
+            if self.running > self.stats["running_max"]:
+                self.stats["running_max"] = self.running
+            self.tasks[inst.instance_id] = self.loop.create_task(
+                    self._run_request_async(inst))
+
+
+    async def _call_in_pool(self, inst:RequestInstance, fn, *args):
+        # Cancel of the awaiting task leaves the call running on in pool.
+        # Hence it is shielded and tracked in instance, until it returns.
+        #
+        inst.call = self.executor.submit(fn, *args)
+        return await asyncio.shield(asyncio.wrap_future(inst.call))
+
+
+    async def _run_request_async(self, inst:RequestInstance):
+        inst.start = time.time()
+        response = None
+        try:
+            if self.plugin is None:
+                # Lazy load in pool, as it may block.
+                await self._call_in_pool(inst, self._ensure_loaded)
+            if self.is_coro:
+                inst.call = None
+                response = await self._call_plugin(inst)
+            else:
+                response = await self._call_in_pool(inst, self._call_plugin, inst)
+        except asyncio.CancelledError:
+            # Cancelled upon timeout/cancel/shutdown. Response, if any,
+            # is already written on plugin's behalf.
+            pass
+        except Exception as e:
+            response = self._failed_plugin_response(inst.req, e)
+
+        self.tasks.pop(inst.instance_id, None)
+        if inst.timer is not None:
+            inst.timer.cancel()
+
+        if (not inst.cancelled) and (response is not None):
+            self._complete_request(inst, response)
+            self.handle_response()
+
+        call, inst.call = inst.call, None
+        if (call is None) or call.done() or call.cancel():
+            self._release_slot(inst)
+        else:
+            # Synchronous call runs on. Release its slot, when it returns.
+            call.add_done_callback(lambda _: self._on_call_done(inst))
+
+
+    def _on_call_done(self, inst:RequestInstance):
+        # Called from pool thread, upon return of a detached call.
+        #
+        try:
+            self.loop.call_soon_threadsafe(self._release_slot, inst)
+        except RuntimeError:
+            # Loop is closed upon shutdown/reload.
+            pass
+
+
+    def _release_slot(self, inst:RequestInstance):
+        # Called in loop, once the request no longer runs.
+        #
+        self.running -= 1
+        if inst.cancelled:
+            self.detached -= 1
+        self._chk_workers()
+
+
+    def _timeout_request_cb(self, inst:RequestInstance):
+        inst.timer = None
+        self.timeout_request(inst)
+
+
+    def _cancel_request(self, inst:RequestInstance, code:int, reason:str) -> bool:
+        ret = super()._cancel_request(inst, code, reason)
+        if ret:
+            # Stops a coroutine plugin. Synchronous plugin is told via token
+            # only and its call runs on in pool.
+            task = self.tasks.get(inst.instance_id, None)
+            if task is not None:
+                task.cancel()
+        return ret
+
+
+    def send_request(self, req:clib_bind.ActionRequest) -> RequestInstance:
+        inst = super().send_request(req)
+        if inst is not None:
+            if inst.deadline:
+                inst.timer = self.loop.call_later(inst.deadline - time.time(),
+                        self._timeout_request_cb, inst)
+            self._chk_workers()
+        return inst
+
 
-    
     def shutdown(self):
-        self.plugin.shutdown()
+        super().shutdown()
+        for task in list(self.tasks.values()):
+            task.cancel()
 
 
 
-def handle_shutdown(active_plugin_holders: {}):
-    global shutdown_request
+# Returns True if plugin's request method accepts cancellation token
+# as second positional arg.
+#
+def takes_token(fn) -> bool:
+    try:
+        params = inspect.signature(fn).parameters.values()
+    except (TypeError, ValueError):
+        return False
+
+    cnt = 0
+    for p in params:
+        if p.kind == inspect.Parameter.VAR_POSITIONAL:
+            return True
+        if p.kind in (inspect.Parameter.POSITIONAL_ONLY,
+                inspect.Parameter.POSITIONAL_OR_KEYWORD):
+            cnt += 1
+    return cnt >= 2
+
+
+
+# Deadlines of requests with timeout, in a heap ordered by expiry.
+# Used by main thread only, to wake up at next expiry.
+# Entries of completed requests are dropped lazily.
+#
+class RequestDeadlines:
+
+    def __init__(self):
+        self.heap = []
+        self.seq = 0        # Tie breaker for same deadline
+
+
+    def add(self, holder:LoMPluginHolder, inst:RequestInstance, when:float = 0):
+        # when: Epoch secs to expire at. Default is request deadline.
+        when = when or inst.deadline
+        if not when:
+            return
+        self.seq += 1
+        heapq.heappush(self.heap, (when, self.seq, holder, inst))
+
+
+    def _drop_done(self):
+        while self.heap and self.heap[0][3].done:
+            heapq.heappop(self.heap)
+
 
+    def next_timeout(self, max_timeout:float) -> float:
+        # Secs until next deadline, capped by max_timeout
+        self._drop_done()
+        if not self.heap:
+            return max_timeout
+        return max(0, min(max_timeout, self.heap[0][0] - time.time()))
+
+
+    def pop_expired(self) -> [(LoMPluginHolder, RequestInstance)]:
+        ret = []
+        tnow = time.time()
+        self._drop_done()
+        while self.heap and (self.heap[0][0] <= tnow):
+            _, _, holder, inst = heapq.heappop(self.heap)
+            if not inst.done:
+                ret.append((holder, inst))
+            self._drop_done()
+        return ret
+
+
+# Shuts down all holders, leaving proc up. Upon full reload, main runs
+# afresh with all holders loaded anew.
+#
+def shutdown_plugin_holders(active_plugin_holders: {}):
     for name, holder in active_plugin_holders.items():
         holder.shutdown()
-        log_info("Requested shutdown of action {}".format(name))
+        log_info("Requested shutdown of action {}", name, action=name)
+    return
+
+
+def handle_shutdown(active_plugin_holders: {}):
+    global shutdown_request
 
+    shutdown_plugin_holders(active_plugin_holders)
     shutdown_request = True
     return
 
 
-def handle_server_request(active_plugin_holders: {}):
+def handle_server_request(active_plugin_holders: {},
+        deadlines:RequestDeadlines = None):
+    # deadlines is None, when holders track their own.
 
-    # Loop until no more to read
+    # Loop until no more to read. Each read returns a batch.
     while True:
-        ret, req = clib_bind.read_action_request(0)
-        if not ret:
-            log_info("No request from server") 
+        reqs = clib_bind.read_action_requests(READ_BATCH_MAX, 0)
+        for req in reqs:
+            dispatch_server_request(active_plugin_holders, deadlines, req)
+
+        if len(reqs) < READ_BATCH_MAX:
             break
+    return
 
-        log_info("plugin_proc:{} server req: {}".format(this_proc_name, str(req)))
-        if req.is_shutdown():
-            handle_shutdown(active_plugin_holders)
 
-        elif req.action_name in active_plugin_holders:
-            plugin_holder = active_plugin_holders[req.action_name]
-            if plugin_holder.is_valid():
-                plugin_holder.send_request(req)
-            else:
-                log_error("{} is not in valid state to accept request".format(action_name))
+def dispatch_server_request(active_plugin_holders: {},
+        deadlines:RequestDeadlines, req:clib_bind.ActionRequest):
+    log_info("plugin_proc:{} server req type:{} action:{} instance:{}",
+        this_proc_name, req.type, req.action_name, req.instance_id,
+        action=req.action_name, instance_id=req.instance_id)
+
+    if req.is_shutdown():
+        handle_shutdown(active_plugin_holders)
+
+    elif req.is_cancel():
+        if req.action_name in active_plugin_holders:
+            active_plugin_holders[req.action_name].cancel_request(req.instance_id)
+        else:
+            log_error("cancel for action {} is not loaded".format(req.action_name))
+
+    elif req.action_name in active_plugin_holders:
+        plugin_holder = active_plugin_holders[req.action_name]
+        if plugin_holder.is_valid():
+            inst = plugin_holder.send_request(req)
+            if (inst is not None) and (deadlines is not None):
+                deadlines.add(plugin_holder, inst)
         else:
-            log_error("requested action {} is not loaded".format(action_name))
+            log_error("{} is not in valid state to accept request".format(
+                req.action_name))
+    else:
+        log_error("requested action {} is not loaded".format(req.action_name))
     return
 
 
-def handle_plugin_holder(plugin_holder: LoMPluginHolder):
+def handle_plugin_holder(plugin_holder: LoMPluginHolder,
+        hb_timers:RequestDeadlines = None):
     plugin_holder.handle_response()
+
+    # Forward suppressed touches upon interval expiry.
+    if hb_timers is not None:
+        for inst in plugin_holder.pop_trailing_heartbeats():
+            hb_timers.add(plugin_holder, inst, inst.touch_fwd + inst.hb_interval)
     return
 
 
-def main_run(proc_name: str) -> int:
-    global this_proc_name
+def register_plugin_holders(proc_name: str, holders: []) -> []:
+    # Called from main thread, as clib is not thread friendly.
+    # Registers actions of all created holders in one call.
+    # Returns the registered holders. Rest failed to load or register and
+    # are shut down & skipped.
+    #
+    valid = []
+    for holder in holders:
+        if holder.is_valid():
+            valid.append(holder)
+        else:
+            log_error("Failed to load plugin {} from {}. Skipped",
+                holder.name, holder.plugin_file, action=holder.name)
+
+    tstart = time.time()
+    status = clib_bind.register_actions([ h.name for h in valid ])
+    taken = time.time() - tstart
+
+    ret = []
+    for holder in valid:
+        if not status.get(holder.name, False):
+            log_error("Failed to register action {} plugin:{}. Skipped",
+                holder.name, holder.plugin_file, action=holder.name)
+            holder.shutdown()
+            continue
+
+        # Shared by all in the call
+        holder.timing["register"] = taken
+        log_info("plugin_proc:{}: plugin:{} lazy:{} import:{:.3f} construct:{:.3f} register:{:.3f}",
+                proc_name, holder.name, holder.lazy, holder.timing["import"],
+                holder.timing["construct"], holder.timing["register"],
+                action=holder.name)
+        ret.append(holder)
+    return ret
+
+
+def load_plugin_holders(proc_name: str, holder_class) -> {}:
+    # Registers this proc with server and loads all its plugins.
+    # Returns holders by action name or None on failure.
+    #
+    global this_proc_name, action_globals
 
     this_proc_name = proc_name
     
-    pipe_list = {}
     active_plugin_holders = {}
 
     while not is_running_config_available():
@@ -387,90 +1493,398 @@ def main_run(proc_name: str) -> int:
 
     plugins = get_proc_plugins_conf(proc_name)
     actions_conf = get_actions_conf()
+    action_globals = get_action_globals()
+
+    # Offer native nested data & binary encoding, if configured;
+    # Used only if server accepts.
+    caps = {}
+    if get_global_rc().get("nested_data", True):
+        caps[gvars.CAP_NESTED_DATA] = True
+    encoding = get_global_rc().get("encoding", gvars.ENCODING_JSON)
+    if encoding != gvars.ENCODING_JSON:
+        if (encoding == gvars.ENCODING_MSGPACK) and clib_bind.is_binary_supported():
+            caps[gvars.CAP_ENCODING] = encoding
+        else:
+            log_error("{}: encoding {} not supported. Using {}".format(
+                proc_name, encoding, gvars.ENCODING_JSON))
 
-    if not clib_bind.register_client(proc_name):
+    if not clib_bind.register_client(proc_name, caps):
         log_error("Failing to register client {} with server".format(proc_name))
-        return -1
+        return None
+
+    tstart = time.time()
+    lst_load = []
+    for name, path in plugins.items():
+        conf = actions_conf.get(name, {})
+        disabled = conf.get("disable", False)
+        if not disabled:
+            lst_load.append((name, path, conf))
+        else:
+            log_error("Skipped disabled plugin {}".format(name)) 
 
     try:
-        for name, path in plugins.items():
-            conf = actions_conf.get(name, {})
-            disabled = conf.get("disable", False)
-            if not disabled:
-                pluginHolder = LoMPluginHolder(name, path, conf)
-                if pluginHolder.is_valid():
-                    fdR, fdW = os.pipe()
-                    pluginHolder.set_pipe(fdR, fdW)
-                else:
-                    log_error("Failed to register plugin {} from {}".format(
-                        name, path))
-                    return -1
+        # Plugins are independent. Hence may construct concurrently.
+        # Registration stays with main thread.
+        workers = int(get_global_rc().get("plugin_load_workers",
+            DEFAULT_PLUGIN_LOAD_WORKERS))
+        if (workers > 1) and (len(lst_load) > 1):
+            with concurrent.futures.ThreadPoolExecutor(max_workers=workers,
+                    thread_name_prefix="load_{}".format(proc_name)) as pool:
+                holders = list(pool.map(lambda x: holder_class(*x), lst_load))
+        else:
+            holders = [ holder_class(*x) for x in lst_load ]
 
-                active_plugin_holders[name] = pluginHolder
-                pipe_list[fdR] = name
-            else:
-                log_error("Skipped disabled plugin {}".format(name)) 
+        for pluginHolder in register_plugin_holders(proc_name, holders):
+            active_plugin_holders[pluginHolder.name] = pluginHolder
     except Exception as e:
         log_error("{}: plugin failure: exception:{}".format(proc_name, str(e)))
 
-    if not pipe_list:
+    if not active_plugin_holders:
         log_error("No loaded plugin. Exiting. plugins:{}".format(plugins.keys()))
+        return None
+
+    log_info("plugin_proc:{}: All {} plugins loaded in {:.3f} secs. Into reading loop".
+            format(proc_name, len(plugins), time.time() - tstart))
+    return active_plugin_holders
+
+
+def reload_plugin_holders(proc_name: str, active_plugin_holders: {},
+        holder_class) -> ({}, {}):
+    # Called from main loop upon SIGHUP.
+    # Diffs re-read config against active holders. Only added, removed or
+    # changed actions are loaded/dropped. Rest keep running with their
+    # state, with changed config pushed via update_config.
+    # Updates active_plugin_holders in place and returns holders added &
+    # removed. Returns None on failure, which needs a full reload.
+    #
+    global action_globals
+
+    if not is_running_config_available():
+        log_error("{}: No running config to reload. Keep running as is".format(
+            proc_name))
+        return {}, {}
+
+    plugins = get_proc_plugins_conf(proc_name)
+    actions_conf = get_actions_conf()
+    action_globals = get_action_globals()
+
+    wanted = {}
+    for name, path in plugins.items():
+        conf = actions_conf.get(name, {})
+        if not conf.get("disable", False):
+            wanted[name] = (path, conf)
+
+    removed = {}
+    for name, holder in list(active_plugin_holders.items()):
+        if (name in wanted) and (wanted[name][0] == holder.plugin_file):
+            conf = wanted[name][1]
+            if (conf == holder.config) or holder.update_config(conf):
+                wanted.pop(name)
+                continue
+
+        # Dropped or changed beyond update. Loaded again below, if still wanted.
+        if not clib_bind.deregister_action(name):
+            return None
+        holder.remove("action removed upon config reload")
+        removed[name] = active_plugin_holders.pop(name)
+
+    added = {}
+    holders = [ holder_class(name, path, conf) for name, (path, conf) in wanted.items() ]
+    for holder in register_plugin_holders(proc_name, holders):
+        active_plugin_holders[holder.name] = holder
+        added[holder.name] = holder
+
+    log_info("plugin_proc:{}: Reloaded config added:{} removed:{} active:{}".format(
+        proc_name, list(added.keys()), list(removed.keys()),
+        len(active_plugin_holders)))
+    return added, removed
+
+
+# Dumps flight recorder upon SIGUSR2. Called from main loop.
+#
+def chk_flight_recorder_dump():
+    global sigusr2_raised
+
+    if sigusr2_raised:
+        sigusr2_raised = False
+        log_info("plugin_proc:{} flight recorder dumped to {}", this_proc_name,
+                fr_dump("SIGUSR2"))
+
+
+# Writes stats of this run as JSON to <run_stats_path>/<proc name>.stats.json,
+# if "run_stats_path" is set in global rc. Read by benchmarks.
+# wakeups -- Count of times main thread woke up to handle data.
+#
+def write_run_stats(proc_name: str, active_plugin_holders: {},
+        outbox: ServerOutbox, wakeups: int, secs: float):
+    path = get_global_rc().get("run_stats_path", "")
+    if not path:
+        return
+
+    stats = {
+            "proc_name": proc_name,
+            "pid": os.getpid(),
+            "secs": round(secs, 3),
+            "wakeups": wakeups,
+            "wakeups_sec": round(wakeups / secs, 1) if secs > 0 else 0,
+            "maxrss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            "outbox": outbox.stats,
+            "actions": { name: holder.get_stats()
+                for name, holder in active_plugin_holders.items() } }
+    try:
+        with open(os.path.join(path, "{}.stats.json".format(proc_name)), "w") as s:
+            s.write(json.dumps(stats, indent=4))
+    except OSError as e:
+        log_error("plugin_proc:{} Failed to write run stats: {}".format(
+            proc_name, str(e)))
+
+
+def main_run(proc_name: str) -> int:
+    global sighup_raised
+
+    channels = {}
+    outbox = ServerOutbox()
+
+    active_plugin_holders = load_plugin_holders(proc_name, LoMPluginHolder)
+    if active_plugin_holders is None:
         return -1
 
-    log_info("plugin_proc:{}: All {} plugins loaded. Into reading loop".
-            format(proc_name, len(plugins)))
+    shared_channel = None
+    if get_global_rc().get("shared_event_channel", False):
+        shared_channel = EventChannel()
 
-    while not signal_raised:
-        ret = clib_bind.poll_for_data(list(pipe_list.keys()), POLL_TIMEOUT)
+    for pluginHolder in active_plugin_holders.values():
+        channel = shared_channel if shared_channel else EventChannel()
+        pluginHolder.set_channel(channel, outbox)
+        channels[channel.get_fd()] = channel
+
+    # fd buffer is built once and reused for every poll
+    poller = clib_bind.FdPoller(list(channels.keys()))
+    deadlines = RequestDeadlines()
+    hb_timers = RequestDeadlines()
+    full_reload = False
+    wakeups = 0
+    tstart = time.time()
 
-        if ret == -1:
-            handle_server_request(active_plugin_holders)
-            if shutdown_request:
+    while not signal_raised:
+        chk_flight_recorder_dump()
+
+        if sighup_raised:
+            sighup_raised = False
+            ret = reload_plugin_holders(proc_name, active_plugin_holders,
+                    LoMPluginHolder)
+            if ret is None:
+                log_error("Failed to reload in place. Reloading all")
+                full_reload = True
                 break
-        elif ret >= 0:
-            if not ret in pipe_list:
-                log_error("INTERNAL ERROR: fd {} not in pipe list".format(ret))
-            else:
-                handle_plugin_holder(active_plugin_holders[pipe_list[ret]])
-        elif ret != -2:
+
+            added, removed = ret
+            for holder in removed.values():
+                if holder.channel is not shared_channel:
+                    channels.pop(holder.channel.get_fd(), None)
+                    holder.channel.close()
+            for holder in added.values():
+                channel = shared_channel if shared_channel else EventChannel()
+                holder.set_channel(channel, outbox)
+                channels[channel.get_fd()] = channel
+            poller.set_fds(list(channels.keys()))
+
+        # Wake up by next request deadline or heartbeat forward, if sooner.
+        ret, server_ready, ready_fds = poller.poll(
+                hb_timers.next_timeout(deadlines.next_timeout(POLL_TIMEOUT)))
+
+        if (ret < 0) and (ret != -2):
             # This is unexepected return value
             break
+        if ret != -2:
+            wakeups += 1
+
+        # Drain all that are ready, before polling again.
+        # A holder posts once per completion/heartbeat. Handle it once.
+        # Keyed by identity, as a holder removed upon reload may post late,
+        # under the same name as its replacement.
+        holders = {}
+        for fd in ready_fds:
+            if not fd in channels:
+                log_error("INTERNAL ERROR: fd {} not in channel list".format(fd))
+            else:
+                for holder in channels[fd].drain():
+                    holders[id(holder)] = holder
+
+        for holder in holders.values():
+            handle_plugin_holder(holder, hb_timers)
+
+        for holder, inst in hb_timers.pop_expired():
+            holder._fire_heartbeat(inst)
+
+        # Fail requests past deadline
+        for holder, inst in deadlines.pop_expired():
+            holder.timeout_request(inst)
+
+        if server_ready:
+            handle_server_request(active_plugin_holders, deadlines)
+
+        # All written during this wakeup go in one call each.
+        outbox.flush()
+        if shutdown_request:
+            break
 
 
     log_info("plugin_proc:{} DONE. Exiting.".format(proc_name))
-    # SIGHUP need a reload of everything.
+    outbox.flush()
+    log_info("plugin_proc:{} outbox stats:{} log stats:{}", proc_name, outbox.stats,
+            get_log_stats())
+    write_run_stats(proc_name, active_plugin_holders, outbox, wakeups,
+            time.time() - tstart)
     clib_bind.deregister_client(proc_name)
 
     if (not shutdown_request) and signal_raised:
         handle_shutdown(active_plugin_holders)
+    elif (not shutdown_request) and full_reload:
+        # Proc stays up, as main runs afresh.
+        shutdown_plugin_holders(active_plugin_holders)
+
+    for channel in channels.values():
+        channel.close()
     return 0
 
 
+def main_run_async(proc_name: str) -> int:
+    full_reload = False
+
+    active_plugin_holders = load_plugin_holders(proc_name, AsyncPluginHolder)
+    if active_plugin_holders is None:
+        return -1
 
-def main(proc_name, global_rc_file):
+    server_fd = clib_bind.get_server_fd()
+    if server_fd < 0:
+        log_error("Failed to get server fd")
+        clib_bind.deregister_client(proc_name)
+        return -1
+
+    loop = asyncio.new_event_loop()
+    executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=get_global_rc().get("async_executor_workers",
+                DEFAULT_ASYNC_EXECUTOR_WORKERS),
+            thread_name_prefix="req_{}".format(proc_name))
+
+    # Flush once per loop iteration, upon first write in the iteration.
+    outbox = ServerOutbox()
+    wakeups = 0
+    tstart = time.time()
+
+    def flush():
+        nonlocal wakeups
+        wakeups += 1
+        outbox.flush()
+
+    outbox.notify = lambda: loop.call_soon(flush)
+
+    for pluginHolder in active_plugin_holders.values():
+        pluginHolder.set_loop(loop, executor, outbox)
+
+    def on_server_readable():
+        nonlocal wakeups
+        wakeups += 1
+        handle_server_request(active_plugin_holders)
+        if shutdown_request:
+            loop.stop()
+
+    def chk_signal():
+        # Signal handler can't wake the loop. Hence check periodically.
+        global sighup_raised
+        nonlocal full_reload
+
+        chk_flight_recorder_dump()
+
+        if sighup_raised:
+            sighup_raised = False
+            ret = reload_plugin_holders(proc_name, active_plugin_holders,
+                    AsyncPluginHolder)
+            if ret is None:
+                log_error("Failed to reload in place. Reloading all")
+                full_reload = True
+            else:
+                for holder in ret[0].values():
+                    holder.set_loop(loop, executor, outbox)
+
+        if signal_raised or full_reload:
+            loop.stop()
+        else:
+            loop.call_later(POLL_TIMEOUT, chk_signal)
+
+    loop.add_reader(server_fd, on_server_readable)
+    loop.call_later(POLL_TIMEOUT, chk_signal)
+    try:
+        loop.run_forever()
+    finally:
+        loop.remove_reader(server_fd)
+
+    log_info("plugin_proc:{} DONE. Exiting.".format(proc_name))
+    outbox.notify = None
+    outbox.flush()
+    log_info("plugin_proc:{} outbox stats:{} log stats:{}", proc_name, outbox.stats,
+            get_log_stats())
+    write_run_stats(proc_name, active_plugin_holders, outbox, wakeups,
+            time.time() - tstart)
+    clib_bind.deregister_client(proc_name)
+
+    if (not shutdown_request) and signal_raised:
+        handle_shutdown(active_plugin_holders)
+    elif (not shutdown_request) and full_reload:
+        # Proc stays up, as main runs afresh.
+        shutdown_plugin_holders(active_plugin_holders)
+
+    # Let cancelled tasks unwind
+    tasks = asyncio.all_tasks(loop)
+    if tasks:
+        loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+    executor.shutdown(wait=False, cancel_futures=True)
+    loop.close()
+    return 0
+
+
+
+def main(proc_name, global_rc_file, runtime:str = ""):
     if global_rc_file:
         set_global_rc_file(global_rc_file)
 
-    # Load plugin syspaths
+    if not runtime:
+        runtime = get_global_rc().get("plugin_proc_runtime", RUNTIME_THREADS)
+
+    # Index plugin paths, to load plugins & helpers from
     syspaths = get_global_rc().get("plugin_paths", [])
-    for p in syspaths:
-        rp = os.path.join(_CT_DIR, p)
-        syspath_append(rp)
+    plugin_registry.init_registry([ os.path.join(_CT_DIR, p) for p in syspaths ])
 
     syslog_init(proc_name)
+    fr_init(proc_name, get_global_rc().get("flight_recorder_path",
+        DEFAULT_FLIGHT_RECORDER_PATH), get_global_rc().get("flight_recorder_size",
+            FR_SIZE), get_global_rc().get("flight_recorder_dump_on_error", False))
+    if get_global_rc().get("log_async", True):
+        log_async_init(get_global_rc().get("log_queue_size", LOG_QUEUE_SIZE))
 
     if threading.current_thread() is threading.main_thread():
         signal.signal(signal.SIGHUP, signal_handler)
         signal.signal(signal.SIGUSR1, signal_handler)
         signal.signal(signal.SIGTERM, signal_handler)
+        signal.signal(signal.SIGUSR2, signal_handler)
 
     if not clib_bind.c_lib_init():
         log_error("Failed to init CLIB")
         return
 
+    run = main_run
+    if runtime == RUNTIME_ASYNCIO:
+        if clib_bind.is_server_fd_supported():
+            run = main_run_async
+        else:
+            log_error("No server fd support in clib. Fall back to threads runtime")
+    elif runtime != RUNTIME_THREADS:
+        log_error("Unknown runtime {}. Using threads".format(runtime))
+
 
     while (not shutdown_request) and (not sigterm_raised):
-        if (main_run(proc_name) != 0):
+        if (run(proc_name) != 0):
             log_error("Exiting due to error")
             break
         if sigusr1_raised:
@@ -487,6 +1901,9 @@ if __name__ == "__main__":
     parser.add_argument("-t", "--test", action='store_true',
             help="Run in test mode", default=False)
     parser.add_argument("-l", "--log-level", type=int, default=3, help="set log level")
+    parser.add_argument("-r", "--runtime", default="",
+            choices=["", RUNTIME_THREADS, RUNTIME_ASYNCIO],
+            help="Runtime to run plugins. Default from global rc or threads")
     args = parser.parse_args()
 
     if args.test:
@@ -494,6 +1911,6 @@ if __name__ == "__main__":
 
     set_log_level(args.log_level)
 
-    main(args.proc_name, args.global_rc)
+    main(args.proc_name, args.global_rc, args.runtime)
 
 
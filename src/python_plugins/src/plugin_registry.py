@@ -0,0 +1,210 @@
+#! /usr/bin/env python3
+
+# Registry of plugin modules in plugin paths from global rc.
+#
+# The paths are scanned once to build an index of module name to file.
+# Plugins and the helpers they import are loaded straight from the indexed
+# file via spec_from_file_location, instead of probing every plugin path
+# as sys.path entries.
+#
+# The registry is installed as finder at the end of sys.meta_path. Hence
+# stdlib & site packages take precedence, as they did when plugin paths
+# were appended to sys.path.
+#
+# Plugin modules themselves are loaded via load_module, straight from the
+# indexed file, without walking sys.meta_path & sys.path finders ahead of
+# the registry. A plugin module that is shadowed in sys.modules by another
+# module of the same name is loaded, but not registered in sys.modules.
+#
+# Vendor dirs (vendors/<vendor>/...) are indexed for this vendor only, as
+# per misc.get_vendor_type. All are indexed, when vendor is unknown.
+# Upon name collision, the first path in configured order wins.
+#
+# A lookup that misses, rescans if mtime of any path changed, so plugins
+# added later (e.g. before SIGHUP reload) are found.
+#
+
+import importlib.util
+import os
+import sys
+import threading
+
+from common import *
+import misc
+
+_registry = None
+
+
+class PluginRegistry:
+
+    def __init__(self, paths: [str]):
+        self.paths = [ os.path.abspath(p) for p in paths ]
+        self.lock = threading.Lock()
+        self.index = {}         # module name -> file
+        self.packages = set()   # Module names that are packages
+        self.mtimes = {}        # path -> mtime at scan
+        self.load_lock = threading.RLock()
+                                # Guards loaded
+        self.loaded = {}        # module name -> module loaded via load_module
+        self._scan()
+
+
+    def _is_other_vendor(self, path:str) -> bool:
+        if misc.get_vendor_type() == misc.vendorType.UNKNOWN:
+            return False
+
+        vendors = os.path.join(os.path.dirname(os.path.abspath(misc.__file__)),
+                misc.Vendor_subdir)
+        if os.path.commonpath([vendors, path]) != vendors:
+            return False
+        vendor = misc.get_vendor_import_path()
+        return os.path.commonpath([vendor, path]) != vendor
+
+
+    def _scan(self):
+        # Called with lock held or from init.
+        #
+        index = {}
+        packages = set()
+        mtimes = {}
+        for path in self.paths:
+            if not os.path.isdir(path):
+                log_error("plugin path {} is not a dir".format(path))
+                continue
+            if self._is_other_vendor(path):
+                log_info("Skipped plugin path {} of other vendor".format(path))
+                continue
+
+            mtimes[path] = os.stat(path).st_mtime
+            for entry in sorted(os.scandir(path), key=lambda e: e.name):
+                name = ""
+                if entry.is_file() and entry.name.endswith(".py"):
+                    name = entry.name[0:-3]
+                    fl = entry.path
+                elif entry.is_dir() and os.path.exists(
+                        os.path.join(entry.path, "__init__.py")):
+                    name = entry.name
+                    fl = os.path.join(entry.path, "__init__.py")
+
+                if not name:
+                    continue
+                if name in index:
+                    log_info("plugin module {} in {} is shadowed by {}".format(
+                        name, fl, index[name]))
+                    continue
+                index[name] = fl
+                if entry.is_dir():
+                    packages.add(name)
+
+        self.index = index
+        self.packages = packages
+        self.mtimes = mtimes
+        log_info("plugin registry: indexed {} modules from {} paths".format(
+            len(index), len(mtimes)))
+
+
+    def _is_stale(self) -> bool:
+        for path, mtime in self.mtimes.items():
+            try:
+                if os.stat(path).st_mtime != mtime:
+                    return True
+            except OSError:
+                return True
+        return False
+
+
+    def find(self, module_name:str) -> str:
+        # Returns file of the module or None.
+        #
+        with self.lock:
+            fl = self.index.get(module_name, None)
+            if (fl is None) and self._is_stale():
+                self._scan()
+                fl = self.index.get(module_name, None)
+        return fl
+
+
+    def find_spec(self, fullname:str, path=None, target=None):
+        # Finder protocol of sys.meta_path. Top level modules only.
+        #
+        if (path is not None) or ("." in fullname):
+            return None
+
+        fl = self.find(fullname)
+        if fl is None:
+            return None
+
+        if fullname in self.packages:
+            return importlib.util.spec_from_file_location(fullname, fl,
+                    submodule_search_locations=[os.path.dirname(fl)])
+        return importlib.util.spec_from_file_location(fullname, fl)
+
+
+    def load_module(self, module_name:str):
+        # Thread neutral -- Returns module loaded from indexed file or None,
+        # if not indexed. Loaded once; Raises, if the module fails to load.
+        #
+        fl = self.find(module_name)
+        if fl is None:
+            return None
+
+        with self.load_lock:
+            module = self.loaded.get(module_name, None)
+            if (module is not None) and (module.__file__ == fl):
+                return module
+
+            module = sys.modules.get(module_name, None)
+            if (module is not None) and (getattr(module, "__file__", None) == fl):
+                # Imported already by name, e.g. by another plugin.
+                self.loaded[module_name] = module
+                return module
+
+            if module_name in self.packages:
+                spec = importlib.util.spec_from_file_location(module_name, fl,
+                        submodule_search_locations=[os.path.dirname(fl)])
+            else:
+                spec = importlib.util.spec_from_file_location(module_name, fl)
+            module = importlib.util.module_from_spec(spec)
+
+            register = module_name not in sys.modules
+            if register:
+                sys.modules[module_name] = module
+            try:
+                spec.loader.exec_module(module)
+            except BaseException:
+                if register:
+                    sys.modules.pop(module_name, None)
+                raise
+
+            self.loaded[module_name] = module
+        return module
+
+
+    def invalidate_caches(self):
+        # Called via importlib.invalidate_caches
+        with self.lock:
+            self._scan()
+
+
+
+# Builds the registry for given paths and installs it as finder.
+# Replaces registry from earlier call, if any.
+#
+def init_registry(paths: [str]) -> PluginRegistry:
+    global _registry
+
+    registry = PluginRegistry(paths)
+    if _registry in sys.meta_path:
+        sys.meta_path[sys.meta_path.index(_registry)] = registry
+    else:
+        sys.meta_path.append(registry)
+    _registry = registry
+    return registry
+
+
+def get_registry() -> PluginRegistry:
+    return _registry
+
+
+def get_paths() -> [str]:
+    return list(_registry.paths) if _registry is not None else []
@@ -0,0 +1,390 @@
+#! /usr/bin/env python3
+
+# Python transport for clib_bind, in place of the C client lib.
+# Speaks to local engine stand-in (tests/lib/uds_server.py) over a Unix
+# domain socket, so real plugin procs can be run & loaded on a dev box.
+# Selected via global rc "clib_transport": "uds"; socket path from "uds_path".
+#
+# Functions implement client.h, named clib_<name>, taking & returning bytes
+# as clib_bind passes in test mode.
+#
+# Frames are 4 byte big endian length + JSON object with single key, as
+# { <msg type>: <data> }. Msg types are as between test_client & test server.
+#   client -> server:
+#       register_client, register_action, deregister_action, deregister_client
+#           carry "seq" and get reply with same seq & "status".
+#       register_actions -- List of actions in "action_names", registered in
+#           one call. Reply data carries status per action.
+#       heartbeat       -- One or list of heartbeats
+#       action_request  -- One or list of responses
+#   server -> client:
+#       action_request  -- Request for an action of this client
+#       reply           -- { "seq", "status", "data" }
+#
+# Frame of action_request from server is expected as
+# b'{"action_request":' + <request JSON> + b'}', so request is queued as
+# bytes w/o decode. Others are decoded.
+#
+# A reader thread reads frames. Requests are queued with a byte written to
+# signal pipe per request, which serves as server fd. Hence it stays
+# readable until all queued requests are read.
+# Upon server closing the connection, a shutdown request is queued.
+#
+# One client per process.
+#
+
+import collections
+import select
+import socket
+import struct
+import threading
+
+from common import *
+import gvars
+
+DEFAULT_UDS_PATH = "/tmp/lom_engine.sock"
+
+MSG_REPLY = "reply"
+MSG_REGISTER_ACTIONS = "register_actions"
+ACTION_NAMES = "action_names"
+REPLY_SEQ = "seq"
+REPLY_STATUS = "status"
+REPLY_DATA = "data"
+
+# Secs to wait for reply from server
+CALL_TIMEOUT = 10
+
+_FRAME_HDR = struct.Struct("!I")
+
+_path = DEFAULT_UDS_PATH
+_sock = None
+_send_lock = threading.Lock()
+_cl_name = ""
+_error = (0, "")
+
+_requests = collections.deque()
+_sig_rd, _sig_wr = -1, -1
+
+_reply_cond = threading.Condition()
+_replies = {}
+_seq = 0
+
+
+# Framing, shared with server.
+#
+def send_frame(sock:socket.socket, data:bytes):
+    sock.sendall(_FRAME_HDR.pack(len(data)) + data)
+
+
+def _recv_exact(sock:socket.socket, n:int) -> bytes:
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            return None
+        buf += chunk
+    return bytes(buf)
+
+
+# Returns frame payload or None, if connection closed.
+#
+def recv_frame(sock:socket.socket) -> bytes:
+    hdr = _recv_exact(sock, _FRAME_HDR.size)
+    if hdr is None:
+        return None
+    return _recv_exact(sock, _FRAME_HDR.unpack(hdr)[0])
+
+
+def _set_error(code:int, msg:str) -> int:
+    global _error
+
+    _error = (code, msg)
+    if code:
+        log_error("uds_client: {}".format(msg))
+    return code
+
+
+def _send(key:str, data) -> int:
+    try:
+        with _send_lock:
+            send_frame(_sock, json.dumps({ key: data }).encode("utf-8"))
+    except (OSError, AttributeError) as e:
+        return _set_error(-1, "send {} failed: {}".format(key, str(e)))
+    return _set_error(0, "")
+
+
+# Frame for data that is JSON already, w/o decode.
+#
+def raw_frame(key:str, data:bytes) -> bytes:
+    return b'{"' + key.encode("utf-8") + b'":' + data + b'}'
+
+
+def _send_raw(key:str, data:bytes) -> int:
+    try:
+        with _send_lock:
+            send_frame(_sock, raw_frame(key, data))
+    except (OSError, AttributeError) as e:
+        return _set_error(-1, "send {} failed: {}".format(key, str(e)))
+    return _set_error(0, "")
+
+
+def _call(key:str, data: {}) -> {}:
+    # Sends & waits for reply. Returns reply or None.
+    global _seq
+
+    with _reply_cond:
+        _seq += 1
+        seq = _seq
+    data = dict(data)
+    data[REPLY_SEQ] = seq
+
+    if _send(key, data) != 0:
+        return None
+
+    with _reply_cond:
+        if not _reply_cond.wait_for(lambda: (seq in _replies) or (_sock is None),
+                CALL_TIMEOUT):
+            _set_error(-1, "{}: No reply from server".format(key))
+            return None
+        return _replies.pop(seq, None)
+
+
+def _queue_request(req: bytes):
+    _requests.append(req)
+    os.write(_sig_wr, b"r")
+
+
+def _reader(sock:socket.socket):
+    req_prefix = raw_frame(gvars.REQ_ACTION_REQUEST, b"")[0:-1]
+    while True:
+        try:
+            data = recv_frame(sock)
+        except OSError:
+            data = None
+        if data is None:
+            break
+
+        if data.startswith(req_prefix):
+            _queue_request(data[len(req_prefix):-1])
+            continue
+
+        msg = json.loads(data)
+        key, val = next(iter(msg.items()))
+        if key == gvars.REQ_ACTION_REQUEST:
+            _queue_request(json.dumps(val).encode("utf-8"))
+        elif key == MSG_REPLY:
+            with _reply_cond:
+                _replies[val[REPLY_SEQ]] = val
+                _reply_cond.notify_all()
+        else:
+            log_error("uds_client: Unexpected msg from server {}".format(key))
+
+    if sock is _sock:
+        log_error("uds_client: Server closed connection")
+        _queue_request(json.dumps({ gvars.REQ_TYPE: gvars.REQ_TYPE_SHUTDOWN }).
+                encode("utf-8"))
+    with _reply_cond:
+        _reply_cond.notify_all()
+
+
+def _connect() -> bool:
+    global _sock
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(_path)
+    except OSError as e:
+        sock.close()
+        _set_error(-1, "Failed to connect {}: {}".format(_path, str(e)))
+        return False
+
+    _sock = sock
+    threading.Thread(target=_reader, args=(sock,), name="uds_reader",
+            daemon=True).start()
+    return True
+
+
+def _close():
+    global _sock
+
+    sock, _sock = _sock, None
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        sock.close()
+
+
+def _is_initialized() -> bool:
+    return _sock is not None
+
+
+def clib_init(path:str) -> bool:
+    global _path, _sig_rd, _sig_wr
+
+    _path = path
+    if _sig_rd < 0:
+        _sig_rd, _sig_wr = os.pipe()
+    return True
+
+
+def clib_get_last_error() -> int:
+    return _error[0]
+
+
+def clib_get_last_error_str() -> str:
+    return _error[1]
+
+
+def clib_register_client_ex(cl_name: bytes, caps: bytes) -> bytes:
+    global _cl_name
+
+    if _is_initialized():
+        _set_error(-1, "Duplicate registration {}".format(cl_name))
+        return b""
+
+    if not _connect():
+        return b""
+
+    name = cl_name.decode("utf-8")
+    ret = _call(gvars.REQ_REGISTER_CLIENT, {
+        gvars.REQ_CLIENT_NAME: name,
+        gvars.REQ_CLIENT_CAPS: json.loads(caps.decode("utf-8")) })
+    if (ret is None) or ret[REPLY_STATUS]:
+        _set_error(-1, "register_client {} failed: {}".format(name, ret))
+        _close()
+        return b""
+
+    _cl_name = name
+    return json.dumps(ret.get(REPLY_DATA, {})).encode("utf-8")
+
+
+def clib_register_client(cl_name: bytes) -> int:
+    return 0 if clib_register_client_ex(cl_name, b"{}") else -1
+
+
+def clib_deregister_client(cl_name: bytes) -> int:
+    if not _is_initialized():
+        return _set_error(-1, "deregister_client: client not registered")
+
+    _call(gvars.REQ_DEREGISTER_CLIENT, { gvars.REQ_CLIENT_NAME: _cl_name })
+    _close()
+    return 0
+
+
+def _call_action(key:str, action: str) -> int:
+    if not _is_initialized():
+        return _set_error(-1, "{}: client not registered".format(key))
+
+    ret = _call(key, { gvars.REQ_CLIENT_NAME: _cl_name,
+        gvars.REQ_ACTION_NAME: action })
+    if ret is None:
+        return -1
+    return _set_error(ret[REPLY_STATUS], "" if not ret[REPLY_STATUS] else
+            "{} {} failed: {}".format(key, action, ret.get(REPLY_DATA, "")))
+
+
+def clib_register_action(action_name: bytes) -> int:
+    return _call_action(gvars.REQ_REGISTER_ACTION, action_name.decode("utf-8"))
+
+
+def clib_register_actions(actions: bytes) -> bytes:
+    if not _is_initialized():
+        _set_error(-1, "register_actions: client not registered")
+        return b""
+
+    ret = _call(MSG_REGISTER_ACTIONS, { gvars.REQ_CLIENT_NAME: _cl_name,
+        ACTION_NAMES: json.loads(actions.decode("utf-8")) })
+    if ret is None:
+        return b""
+    if ret[REPLY_STATUS]:
+        _set_error(ret[REPLY_STATUS], "register_actions failed: {}".format(
+            ret.get(REPLY_DATA, "")))
+        return b""
+    _set_error(0, "")
+    return json.dumps(ret.get(REPLY_DATA, {})).encode("utf-8")
+
+
+def clib_deregister_action(action_name: bytes) -> int:
+    return _call_action(gvars.REQ_DEREGISTER_ACTION, action_name.decode("utf-8"))
+
+
+def clib_touch_heartbeat(action_name: bytes, instance_id: bytes) -> int:
+    return _send(gvars.REQ_HEARTBEAT, {
+        gvars.REQ_CLIENT_NAME: _cl_name,
+        gvars.REQ_ACTION_NAME: action_name.decode("utf-8"),
+        gvars.REQ_INSTANCE_ID: instance_id.decode("utf-8") })
+
+
+def clib_touch_heartbeats(hbs: bytes) -> int:
+    # One frame for the batch.
+    return _send_raw(gvars.REQ_HEARTBEAT, hbs)
+
+
+def _wait_signal(timeout:float) -> bool:
+    # timeout secs; <0 blocks.
+    r, _, _ = select.select([_sig_rd], [], [], None if timeout < 0 else timeout)
+    return bool(r)
+
+
+def _pop_request() -> bytes:
+    # Called upon signal readable. Consumes one signal per request.
+    os.read(_sig_rd, 1)
+    return _requests.popleft()
+
+
+def clib_read_action_request(timeout:int) -> bytes:
+    if not _wait_signal(timeout):
+        return b""
+    return _pop_request()
+
+
+def clib_read_action_requests(max_n:int, timeout:int) -> bytes:
+    lst = []
+    while (len(lst) < max_n) and _wait_signal(timeout if not lst else 0):
+        lst.append(_pop_request())
+    return b"[" + b",".join(lst) + b"]"
+
+
+def clib_write_action_response(resp: bytes) -> int:
+    return _send_raw(gvars.REQ_ACTION_REQUEST, resp)
+
+
+def clib_write_action_responses(resps: bytes) -> int:
+    # One frame for the batch.
+    return _send_raw(gvars.REQ_ACTION_REQUEST, resps)
+
+
+def clib_poll_for_data(fds:[int], cnt:int, timeout: int) -> int:
+    r, _, _ = select.select([_sig_rd] + list(fds[0:cnt]), [], [],
+            None if timeout < 0 else timeout)
+    if not r:
+        return -2
+    if _sig_rd in r:
+        return -1
+    return r[0]
+
+
+def clib_poll_for_data_multi(fds:[int], cnt:int, ready:[int], server_ready,
+        timeout_ms: int) -> int:
+    r, _, _ = select.select([_sig_rd] + list(fds[0:cnt]), [], [],
+            None if timeout_ms < 0 else timeout_ms / 1000.0)
+    server_ready.value = 0
+    if not r:
+        return -2
+
+    n = 0
+    for fd in r:
+        if fd == _sig_rd:
+            server_ready.value = 1
+        else:
+            ready[n] = fd
+            n += 1
+    return n
+
+
+def clib_get_server_fd() -> int:
+    if not _is_initialized():
+        return -1
+    return _sig_rd
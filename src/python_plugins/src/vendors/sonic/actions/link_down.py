@@ -21,7 +21,7 @@ class LoMPlugin:
 
 
     def request(self, req: clib_bind.ActionRequest) -> clib_bind.ActionResponse:
-        link_data = json.loads(req.context.get("link_flap", "{}"))
+        link_data = req.get_context_data("link_flap")
         ifname = link_data.get("ifname", "")
         ret = 0
         ret_str = ""
@@ -25,15 +25,16 @@ class LoMPlugin:
         return True
 
 
-    def _get_resp(self, ifname, interval) -> str:
-        return json.dumps({
+    def _get_resp(self, ifname, interval) -> {}:
+        return {
             "ifname": ifname,
             "duration": interval,
             "cnt": self.flap_cnt
-            })
+            }
 
-    def request(self, req: clib_bind.ActionRequest) -> clib_bind.ActionResponse:
-        while True and (not self.shutdown_flag):
+    def request(self, req: clib_bind.ActionRequest,
+            token: clib_bind.RequestToken = None) -> clib_bind.ActionResponse:
+        while (not self.shutdown_flag) and not (token and token.is_cancelled()):
             evt = event_receive_op_t()
             ret = event_receive(self.handle, evt)
             if (ret == 0) and (evt.key == 'sonic-events-swss:if-state'):
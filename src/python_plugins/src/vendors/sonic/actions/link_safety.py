@@ -23,9 +23,7 @@ class LoMPlugin:
 
 
     def request(self, req: clib_bind.ActionRequest) -> clib_bind.ActionResponse:
-        d = json.loads(str(req))
-        ctx = d.get(REQ_CONTEXT, {})
-        link_data = json.loads(ctx.get("link_flap", "{}"))
+        link_data = req.get_context_data("link_flap")
         ifname = link_data.get("ifname", "")
         ret = 0
         ret_str = ""
@@ -0,0 +1,104 @@
+#! /usr/bin/env python3
+
+# Microbenchmark of parsing a request read from server, as main loop and a
+# plugin use it: dispatch fields, then action data of an earlier action
+# from context.
+#
+# legacy  -- Decode to str, json.loads & copy fields upon construction.
+#            Plugin json.loads(str(req)) again to reach the context.
+# lazy    -- ActionRequest parsing from bytes upon first use, with stdlib json.
+# orjson  -- Same with orjson, if installed.
+#
+# Usage: bench_action_request.py [-n <requests>] [-c <context actions>]
+#
+
+import argparse
+import json
+import os
+import sys
+import timeit
+
+_CT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(_CT_DIR, "..", "..", "src"))
+
+import gvars
+import clib_bind
+
+
+class LegacyRequest:
+    def __init__(self, sdata: str):
+        self.str_data = sdata
+        data = json.loads(sdata)
+        self.type = data[gvars.REQ_TYPE]
+        self.action_name = data[gvars.REQ_ACTION_NAME]
+        self.instance_id = data[gvars.REQ_INSTANCE_ID]
+        self.anomaly_instance_id = data[gvars.REQ_ANOMALY_INSTANCE_ID]
+        self.anomaly_key = data[gvars.REQ_ANOMALY_KEY]
+        self.context = data[gvars.REQ_CONTEXT]
+        self.timeout = data[gvars.REQ_TIMEOUT]
+
+    def __repr__(self):
+        return self.str_data
+
+
+def make_request(ctx_cnt:int) -> bytes:
+    ctx = { "action-{}".format(i): json.dumps({ "ifname": "Ethernet{}".format(i),
+        "counters": list(range(20)) }) for i in range(ctx_cnt) }
+    return json.dumps({
+        gvars.REQ_TYPE: gvars.REQ_TYPE_ACTION,
+        gvars.REQ_ACTION_NAME: "bench-action",
+        gvars.REQ_INSTANCE_ID: "id_bench_action",
+        gvars.REQ_ANOMALY_INSTANCE_ID: "id_action_0",
+        gvars.REQ_ANOMALY_KEY: "Ethernet0",
+        gvars.REQ_CONTEXT: ctx,
+        gvars.REQ_TIMEOUT: 0 }).encode("utf-8")
+
+
+def use_legacy(raw:bytes):
+    req = LegacyRequest(raw.decode("utf-8"))
+    (req.type, req.action_name, req.instance_id)
+    d = json.loads(str(req))
+    return json.loads(d[gvars.REQ_CONTEXT].get("action-0", "{}"))
+
+
+def use_lazy(raw:bytes):
+    req = clib_bind.ActionRequest(raw)
+    (req.type, req.action_name, req.instance_id)
+    return req.get_context_data("action-0")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ActionRequest parse benchmark")
+    parser.add_argument("-n", "--count", type=int, default=20000,
+            help="Count of requests parsed per run")
+    parser.add_argument("-c", "--context", type=int, nargs="+", default=[1, 10, 50],
+            help="Count of actions in context")
+    args = parser.parse_args()
+
+    fast_loads = clib_bind._json_loads
+    results = []
+    for cnt in args.context:
+        raw = make_request(cnt)
+        res = { "context_actions": cnt, "bytes": len(raw) }
+
+        res["legacy_us"] = timeit.timeit(lambda: use_legacy(raw),
+                number=args.count) * 1e6 / args.count
+
+        clib_bind._json_loads = json.loads
+        res["lazy_us"] = timeit.timeit(lambda: use_lazy(raw),
+                number=args.count) * 1e6 / args.count
+
+        if fast_loads is not json.loads:
+            clib_bind._json_loads = fast_loads
+            res["orjson_us"] = timeit.timeit(lambda: use_lazy(raw),
+                    number=args.count) * 1e6 / args.count
+
+        results.append({ k: round(v, 2) for k, v in res.items() })
+        print("  ".join([ "{}:{}".format(k, v) for k, v in results[-1].items() ]))
+
+    clib_bind._json_loads = fast_loads
+    print(json.dumps(results))
+
+
+if __name__ == "__main__":
+    main()
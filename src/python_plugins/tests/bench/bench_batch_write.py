@@ -0,0 +1,136 @@
+#! /usr/bin/env python3
+
+# Benchmark of writing responses & heartbeats to server, one call per message
+# vs batched once per main loop wakeup via ServerOutbox.
+#
+# Each simulated wakeup has every plugin complete one request, with one
+# heartbeat. A server thread drains the client to server queue.
+# Runs against test_client, hence measures the cost in plugin proc &
+# client binding, not the transport.
+#
+# Usage: bench_batch_write.py [-p 1 10 100] [-w <wakeups>]
+#
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+_CT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(_CT_DIR, "..", "..", "src"))
+sys.path.append(os.path.join(_CT_DIR, "..", "lib"))
+
+import gvars
+gvars.TEST_RUN = True
+
+import test_client
+from common import *
+import clib_bind
+import plugin_proc
+
+PROC_NAME = "proc_0"
+QUEUE_LIMIT = 100000
+
+
+def setup(tmp_dir:str, plugins_cnt:int) -> [str]:
+    rc = {
+            "config_running_path": tmp_dir,
+            "config_static_path": tmp_dir,
+            "proc_plugins_conf_name": "procs.conf.json",
+            "actions_config_name": "actions.conf.json",
+            "actions_binding_config_name": "bindings.conf.json" }
+    actions = [ "bench-action-{}".format(i) for i in range(plugins_cnt) ]
+
+    with open(os.path.join(tmp_dir, rc["proc_plugins_conf_name"]), "w") as s:
+        s.write(json.dumps({ PROC_NAME: { a: {} for a in actions } }))
+    for k in [ "actions_config_name", "actions_binding_config_name" ]:
+        with open(os.path.join(tmp_dir, rc[k]), "w") as s:
+            s.write(json.dumps({}))
+    rc_file = os.path.join(tmp_dir, "globals.rc.json")
+    with open(rc_file, "w") as s:
+        s.write(json.dumps(rc))
+
+    set_global_rc_file(rc_file)
+    clib_bind.c_lib_init()
+    # Large queue, so the writer never drops.
+    test_client.create_cache_services(1, QUEUE_LIMIT)
+
+    clib_bind.register_client(PROC_NAME)
+    for a in actions:
+        clib_bind.register_action(a)
+
+    # Drop registrations, so server counts benchmark messages only.
+    svc = test_client.cache_services[0]
+    while svc.c2s.rd_cnt < svc.c2s.wr_cnt:
+        svc.read_from_client(0)
+    return actions
+
+
+def drain(svc, stop:threading.Event, counts:{}):
+    while not stop.is_set() or (svc.c2s.rd_cnt < svc.c2s.wr_cnt):
+        ret, _ = svc.read_from_client(1)
+        if ret:
+            counts["read"] += 1
+
+
+def run_mode(actions:[str], wakeups:int, batch:bool) -> float:
+    # Returns msgs/sec
+    svc = test_client.cache_services[0]
+    stop = threading.Event()
+    counts = { "read": 0 }
+    th = threading.Thread(target=drain, args=(svc, stop, counts), daemon=True)
+    th.start()
+
+    outbox = plugin_proc.ServerOutbox()
+    res = { a: clib_bind.ActionResponse(a, "id_" + a, "id_" + a, "key",
+        json.dumps({ "foo": "bar" }), 0, "") for a in actions }
+
+    start = time.time()
+    for i in range(wakeups):
+        for a in actions:
+            if batch:
+                outbox.add_heartbeat(a, "id_" + a)
+                outbox.add_response(res[a])
+            else:
+                clib_bind.touch_heartbeat(a, "id_" + a)
+                clib_bind.write_action_response(res[a])
+        if batch:
+            outbox.flush()
+    taken = time.time() - start
+
+    stop.set()
+    th.join()
+    sent = wakeups * len(actions) * 2
+    if counts["read"] != sent:
+        log_error("Server read {} of {}".format(counts["read"], sent))
+    return sent / taken
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batched write benchmark")
+    parser.add_argument("-p", "--plugins", type=int, nargs="+",
+            default=[1, 10, 100], help="Count of plugins per run")
+    parser.add_argument("-w", "--wakeups", type=int, default=1000,
+            help="Count of main loop wakeups per run")
+    args = parser.parse_args()
+
+    set_log_level(3)
+    results = []
+    for cnt in args.plugins:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            actions = setup(tmp_dir, cnt)
+            single = run_mode(actions, args.wakeups, False)
+            batch = run_mode(actions, args.wakeups, True)
+            clib_bind.deregister_client(PROC_NAME)
+        results.append({ "plugins": cnt, "single_msgs_sec": round(single),
+            "batch_msgs_sec": round(batch), "speedup": round(batch / single, 2) })
+        print("plugins:{:4d} single:{:10.0f} msgs/s batch:{:10.0f} msgs/s x{:.2f}".
+                format(cnt, single, batch, batch / single))
+    print(json.dumps(results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+#! /usr/bin/env python3
+
+# Microbenchmark of clib_bind per message operations, across payload sizes.
+# Runs standalone; No client lib, server or test mode needed.
+#
+# clib_bind is bound to a null transport, which returns a canned request
+# and drops writes. Hence a call measures the binding only: marshalling of
+# args, encode & decode.
+#
+#   encode / decode   -- str.encode & bytes.decode of the payload, once per size
+#   request_read      -- read_action_request: construct ActionRequest & read
+#                        its dispatch fields
+#   request_context   -- Same + decode action data of an action in context
+#   response_write    -- write_action_response: serialize ActionResponse
+#   responses_write   -- write_action_responses of BATCH responses
+#   heartbeat         -- touch_heartbeat
+#   heartbeats        -- touch_heartbeats of BATCH heartbeats
+#   fds_per_call      -- ctypes fd array as built per poll_for_data call
+#   fds_reused        -- fd array reused across calls, as FdPoller
+#
+# Per encoding given: json (action data as JSON string, as legacy server),
+# nested (action data as objects) and msgpack, if installed.
+# Fd ops run per fd count instead of payload size.
+#
+# Usage: bench_clib_bind.py [-s 0 100 1000 ...] [-f 1 10 100] [-e json nested msgpack]
+#
+
+import argparse
+import ctypes
+import json
+import os
+import sys
+import timeit
+
+_CT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(_CT_DIR, "..", "..", "src"))
+
+from common import *
+import gvars
+import clib_bind
+
+# Count of messages per batched call
+BATCH = 10
+
+ENCODING_NESTED = "nested"
+
+ACTION = "bench-action"
+INSTANCE_ID = "8f3c9a1e-5b2d-4c7e-9a0f-1d2e3f4a5b6c"
+
+
+class NullTransport:
+    # Transport that answers reads with a canned request & drops writes.
+    #
+    def __init__(self):
+        self.req = b""          # JSON request
+        self.req_bin = b""      # msgpack request
+
+    def clib_get_last_error(self) -> int:
+        return 0
+
+    def clib_get_last_error_str(self) -> str:
+        return ""
+
+    def clib_read_action_request(self, timeout:int) -> bytes:
+        return self.req
+
+    def clib_read_action_request_bin(self, buf, buf_len:int, timeout:int) -> int:
+        n = len(self.req_bin)
+        if n > buf_len:
+            # As client lib: Negated size needed, for caller to grow buffer.
+            return -n
+        ctypes.memmove(buf, self.req_bin, n)
+        return n
+
+    def clib_write_action_response(self, res:bytes) -> int:
+        return 0
+
+    def clib_write_action_responses(self, res:bytes) -> int:
+        return 0
+
+    def clib_write_action_responses_bin(self, buf:bytes, n:int) -> int:
+        return 0
+
+    def clib_touch_heartbeat(self, action:bytes, instance_id:bytes) -> int:
+        return 0
+
+    def clib_touch_heartbeats(self, hbs:bytes) -> int:
+        return 0
+
+    def clib_touch_heartbeats_bin(self, buf:bytes, n:int) -> int:
+        return 0
+
+
+def action_data(size:int) -> {}:
+    return { "ifname": "Ethernet0", "data": "x" * size }
+
+
+def make_request(size:int, nested:bool) -> {}:
+    data = action_data(size)
+    return {
+            gvars.REQ_TYPE: gvars.REQ_TYPE_ACTION,
+            gvars.REQ_ACTION_NAME: ACTION,
+            gvars.REQ_INSTANCE_ID: INSTANCE_ID,
+            gvars.REQ_ANOMALY_INSTANCE_ID: INSTANCE_ID,
+            gvars.REQ_ANOMALY_KEY: "Ethernet0",
+            gvars.REQ_CONTEXT: { "anomaly-action":
+                data if nested else json.dumps(data) },
+            gvars.REQ_TIMEOUT: 0 }
+
+
+def set_encoding(transport:NullTransport, encoding:str, size:int):
+    caps = {}
+    if encoding == gvars.ENCODING_MSGPACK:
+        caps = { gvars.CAP_ENCODING: gvars.ENCODING_MSGPACK }
+        transport.req_bin = clib_bind.msgpack.packb(clib_bind.tag_fields(
+            make_request(size, True)))
+    elif encoding == ENCODING_NESTED:
+        caps = { gvars.CAP_NESTED_DATA: True }
+    transport.req = json.dumps(make_request(size, encoding != gvars.ENCODING_JSON)
+            ).encode("utf-8")
+    clib_bind._set_caps(caps)
+
+
+def measure(fn, repeat:int) -> float:
+    # Returns best ns per call
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat, number)) / number * 1e9
+
+
+def op_request_read():
+    _, req = clib_bind.read_action_request(0)
+    return (req.type, req.action_name, req.instance_id)
+
+
+def op_request_context():
+    _, req = clib_bind.read_action_request(0)
+    return (req.type, req.action_name, req.instance_id,
+            req.get_context_data("anomaly-action"))
+
+
+def str_ops(size:int) -> {}:
+    sdata = json.dumps(action_data(size))
+    bdata = sdata.encode("utf-8")
+    return {
+            "encode": lambda: sdata.encode("utf-8"),
+            "decode": lambda: bdata.decode("utf-8") }
+
+
+def payload_ops(size:int) -> {}:
+    res = clib_bind.ActionResponse(ACTION, INSTANCE_ID, INSTANCE_ID,
+            "Ethernet0", action_data(size), 0, "")
+    return {
+            "request_read": op_request_read,
+            "request_context": op_request_context,
+            "response_write": lambda: clib_bind.write_action_response(res),
+            "responses_write": lambda: clib_bind.write_action_responses([ res ] * BATCH) }
+
+
+def fd_ops(cnt:int) -> {}:
+    fds = list(range(100, 100 + cnt))
+    c_fds = (ctypes.c_int * cnt)(*fds)
+    c_ready = (ctypes.c_int * cnt)(*fds)
+    c_server = ctypes.c_int(0)
+    return {
+            "fds_per_call": lambda: (ctypes.c_int * cnt)(*fds),
+            "fds_reused": lambda: (c_fds, ctypes.byref(c_server),
+                list(c_ready[0:cnt])) }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="clib_bind microbenchmark")
+    parser.add_argument("-s", "--sizes", type=int, nargs="+",
+            default=[0, 100, 1000, 10000, 100000],
+            help="Bytes of action data per message")
+    parser.add_argument("-f", "--fds", type=int, nargs="+", default=[1, 10, 100],
+            help="Count of fds polled")
+    parser.add_argument("-e", "--encodings", nargs="+",
+            default=[gvars.ENCODING_JSON, ENCODING_NESTED, gvars.ENCODING_MSGPACK],
+            choices=[gvars.ENCODING_JSON, ENCODING_NESTED, gvars.ENCODING_MSGPACK],
+            help="Encodings to run")
+    parser.add_argument("-r", "--repeat", type=int, default=3,
+            help="Runs per op; best is reported")
+    args = parser.parse_args()
+
+    set_log_level(3)
+    transport = NullTransport()
+    clib_bind._bind_py_transport(transport, "bench null transport")
+
+    results = []
+    def report(op:str, encoding:str, size:int, cnt:int, fn):
+        ns = measure(fn, args.repeat)
+        results.append({ "op": op, "encoding": encoding, "size": size,
+            "fds": cnt, "ns_per_op": round(ns, 1) })
+        print("{:16s} {:8s} size:{:7d} fds:{:4d} {:12.1f} ns/op".format(
+            op, encoding, size, cnt, ns))
+
+    for size in args.sizes:
+        for op, fn in str_ops(size).items():
+            report(op, "", size, 0, fn)
+
+    for encoding in args.encodings:
+        if (encoding == gvars.ENCODING_MSGPACK) and (clib_bind.msgpack is None):
+            print("msgpack not installed. Skipping {}".format(encoding))
+            continue
+        for size in args.sizes:
+            set_encoding(transport, encoding, size)
+            for op, fn in payload_ops(size).items():
+                report(op, encoding, size, 0, fn)
+        set_encoding(transport, encoding, 0)
+        report("heartbeat", encoding, 0, 0,
+                lambda: clib_bind.touch_heartbeat(ACTION, INSTANCE_ID))
+        report("heartbeats", encoding, 0, 0,
+                lambda: clib_bind.touch_heartbeats([ (ACTION, INSTANCE_ID) ] * BATCH))
+
+    for cnt in args.fds:
+        for op, fn in fd_ops(cnt).items():
+            report(op, "", 0, cnt, fn)
+
+    print(json.dumps({ "orjson": clib_bind._json_loads is not json.loads,
+        "batch": BATCH, "results": results }))
+
+
+if __name__ == "__main__":
+    main()
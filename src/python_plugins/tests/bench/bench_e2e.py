@@ -0,0 +1,252 @@
+#! /usr/bin/env python3
+
+# End to end benchmark of plugin procs, run as real processes.
+#
+# Spawns N plugin procs, each with M synthetic actions (tests/plugins/
+# bench_action.py), against the local engine stand-in (tests/lib/
+# uds_server.py) over the uds_client transport. Requests are sent round
+# robin across all actions, at a given rate or as fast as in flight allows.
+#
+# Reports per run
+#   msgs/sec and p50/p99 latency from request sent to response received,
+#   as seen by the stand-in.
+#   Per proc: main loop wakeups/sec & per response, as written by the proc
+#   upon exit (global rc "run_stats_path") and RSS sampled during the run.
+#
+# Runs every combination of proc counts & rates given. Prints a line per run
+# and JSON of all runs, also written to -o file, if given.
+#
+# Usage: bench_e2e.py [-P 1 4] [-A <actions per proc>] [-n <requests>]
+#           [-c <in flight>] [-r 0 1000] [-t threads|asyncio] [-o <file>]
+#
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+
+_CT_DIR = os.path.dirname(os.path.abspath(__file__))
+_SRC_DIR = os.path.join(_CT_DIR, "..", "..", "src")
+sys.path.append(_SRC_DIR)
+sys.path.append(os.path.join(_CT_DIR, "..", "lib"))
+
+from common import *
+import gvars
+import uds_server
+
+PLUGIN_FILE = "bench_action.py"
+PLUGIN_PATH = os.path.abspath(os.path.join(_CT_DIR, "..", "plugins"))
+
+# Secs between RSS samples of procs
+RSS_SAMPLE_INTERVAL = 0.2
+
+# Secs to wait for procs to register & to exit
+REGISTER_TIMEOUT = 60
+EXIT_TIMEOUT = 30
+
+
+def proc_name(i:int) -> str:
+    return "proc_{}".format(i)
+
+
+def action_name(i:int, j:int) -> str:
+    return "bench-{}-{}".format(i, j)
+
+
+def setup(tmp_dir:str, args, procs_cnt:int) -> (str, str, [str]):
+    # Returns path of global rc, socket path & all action names.
+    rc = {
+            "config_running_path": tmp_dir,
+            "config_static_path": tmp_dir,
+            "proc_plugins_conf_name": "procs.conf.json",
+            "actions_config_name": "actions.conf.json",
+            "actions_binding_config_name": "bindings.conf.json",
+            "plugin_paths": [ PLUGIN_PATH ],
+            "plugin_proc_runtime": args.runtime,
+            "shared_event_channel": args.shared_channel,
+            "clib_transport": "uds",
+            "uds_path": os.path.join(tmp_dir, "engine.sock"),
+            "run_stats_path": tmp_dir }
+
+    procs = { proc_name(i): { action_name(i, j): PLUGIN_FILE
+        for j in range(args.actions) } for i in range(procs_cnt) }
+    actions = [ a for p in procs.values() for a in p ]
+
+    conf = {
+            "bench_work_ms": args.work_ms,
+            "bench_busy": args.busy,
+            "bench_heartbeats": args.heartbeats,
+            "bench_data_size": args.data_size,
+            gvars.REQ_MAX_CONCURRENCY: args.concurrency,
+            # Never drop for a full queue.
+            gvars.REQ_QUEUE_DEPTH: args.in_flight }
+    if args.hb_interval > 0:
+        conf[gvars.REQ_HEARTBEAT_INTERVAL] = args.hb_interval
+    actions_conf = { a: dict(conf, action_name=a) for a in actions }
+
+    for name, data in [ (rc["proc_plugins_conf_name"], procs),
+            (rc["actions_config_name"], actions_conf),
+            (rc["actions_binding_config_name"], {}) ]:
+        with open(os.path.join(tmp_dir, name), "w") as s:
+            s.write(json.dumps(data, indent=4))
+
+    rc_file = os.path.join(tmp_dir, "globals.rc.json")
+    with open(rc_file, "w") as s:
+        s.write(json.dumps(rc, indent=4))
+    return rc_file, rc["uds_path"], actions
+
+
+def read_rss_kb(pid:int) -> int:
+    try:
+        with open("/proc/{}/status".format(pid), "r") as s:
+            for ln in s:
+                if ln.startswith("VmRSS:"):
+                    return int(ln.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def sample_rss(pids: [int], stop:threading.Event, rss: {}):
+    while not stop.is_set():
+        for pid in pids:
+            kb = read_rss_kb(pid)
+            if kb:
+                rss[pid] = { "last": kb, "max": max(kb, rss.get(pid, {}).get("max", 0)) }
+        stop.wait(RSS_SAMPLE_INTERVAL)
+
+
+def read_proc_stats(tmp_dir:str, name:str) -> {}:
+    try:
+        with open(os.path.join(tmp_dir, "{}.stats.json".format(name)), "r") as s:
+            return json.loads(s.read())
+    except (OSError, ValueError) as e:
+        log_error("No run stats from {}: {}".format(name, str(e)))
+    return {}
+
+
+def run(args, procs_cnt:int, rate:float) -> {}:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        rc_file, uds_path, actions = setup(tmp_dir, args, procs_cnt)
+        server = uds_server.UdsServer(uds_path)
+        server.start()
+
+        procs = {}
+        for i in range(procs_cnt):
+            name = proc_name(i)
+            out = open(os.path.join(tmp_dir, "{}.log".format(name)), "w")
+            procs[name] = subprocess.Popen([ sys.executable, "plugin_proc.py",
+                "-p", name, "-g", rc_file, "-l", str(args.log_level) ],
+                cwd=_SRC_DIR, stdout=out, stderr=subprocess.STDOUT)
+            out.close()
+
+        ret = {}
+        stop = threading.Event()
+        rss = {}
+        try:
+            if not server.wait_actions(actions, REGISTER_TIMEOUT):
+                log_error("Actions not registered: {}".format(
+                    [ a for a in actions if a not in server.actions ]))
+                return {}
+
+            if args.warmup:
+                uds_server.drive(server, actions, args.warmup, args.in_flight)
+
+            th = threading.Thread(target=sample_rss, args=(
+                [ p.pid for p in procs.values() ], stop, rss), daemon=True)
+            th.start()
+            hbs = server.stats["heartbeats"]
+            ret = uds_server.drive(server, actions, args.count, args.in_flight,
+                    rate=rate)
+            ret["heartbeats_sec"] = round((server.stats["heartbeats"] - hbs) /
+                    ret["secs"], 1) if ret.get("secs", 0) else 0
+            stop.set()
+            th.join()
+        finally:
+            stop.set()
+            server.send_shutdown()
+            for p in procs.values():
+                try:
+                    p.wait(EXIT_TIMEOUT)
+                except subprocess.TimeoutExpired:
+                    log_error("plugin proc {} did not exit. Killing".format(p.pid))
+                    p.kill()
+                    p.wait()
+            server.stop()
+
+        ret["procs"] = []
+        for name, p in procs.items():
+            stats = read_proc_stats(tmp_dir, name)
+            responses = stats.get("outbox", {}).get("responses", 0)
+            ret["procs"].append({
+                "proc_name": name,
+                "exit_code": p.returncode,
+                "wakeups": stats.get("wakeups", 0),
+                "wakeups_sec": stats.get("wakeups_sec", 0),
+                "wakeups_per_response": round(stats.get("wakeups", 0) / responses,
+                    3) if responses else 0,
+                "rss_kb": rss.get(p.pid, {}).get("last", 0),
+                "rss_kb_max": rss.get(p.pid, {}).get("max", 0),
+                "maxrss_kb": stats.get("maxrss_kb", 0) })
+        return ret
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End to end plugin proc benchmark")
+    parser.add_argument("-P", "--procs", type=int, nargs="+", default=[1],
+            help="Count of plugin procs per run")
+    parser.add_argument("-A", "--actions", type=int, default=4,
+            help="Count of actions per proc")
+    parser.add_argument("-n", "--count", type=int, default=5000,
+            help="Count of requests per run")
+    parser.add_argument("-c", "--in-flight", type=int, default=64,
+            help="Max requests outstanding")
+    parser.add_argument("-r", "--rates", type=float, nargs="+", default=[0],
+            help="Requests/sec per run. 0 for as fast as in flight allows")
+    parser.add_argument("-w", "--warmup", type=int, default=200,
+            help="Count of requests to send before measuring")
+    parser.add_argument("-t", "--runtime", default="threads",
+            choices=["threads", "asyncio"], help="Runtime of plugin procs")
+    parser.add_argument("--shared-channel", action="store_true", default=False,
+            help="Plugins of a proc share an event channel")
+    parser.add_argument("--concurrency", type=int, default=4,
+            help="Max concurrent requests per action")
+    parser.add_argument("--work-ms", type=float, default=0,
+            help="Millisecs of work per request")
+    parser.add_argument("--busy", action="store_true", default=False,
+            help="Spin CPU for work instead of sleep")
+    parser.add_argument("--heartbeats", type=int, default=0,
+            help="Heartbeat touches per request")
+    parser.add_argument("--hb-interval", type=float, default=0,
+            help="Min secs between heartbeats forwarded. 0 for globals")
+    parser.add_argument("--data-size", type=int, default=16,
+            help="Bytes of action data per response")
+    parser.add_argument("-o", "--output", default="", help="Write JSON to file")
+    parser.add_argument("-l", "--log-level", type=int, default=3, help="set log level")
+    args = parser.parse_args()
+
+    set_log_level(args.log_level)
+    results = []
+    for procs_cnt in args.procs:
+        for rate in args.rates:
+            ret = run(args, procs_cnt, rate)
+            ret.update({ "procs_cnt": procs_cnt, "rate": rate })
+            results.append(ret)
+            print("procs:{:3d} rate:{:8.0f} {:10.1f} msgs/s p50:{:8.3f}ms p99:{:8.3f}ms wakeups/s:{} rss_kb:{}".format(
+                procs_cnt, rate, ret.get("msgs_sec", 0),
+                ret.get("latency_ms_p50", 0), ret.get("latency_ms_p99", 0),
+                [ p["wakeups_sec"] for p in ret.get("procs", []) ],
+                [ p["rss_kb_max"] for p in ret.get("procs", []) ]))
+
+    out = { "config": vars(args), "results": results }
+    if args.output:
+        with open(args.output, "w") as s:
+            s.write(json.dumps(out, indent=4))
+    print(json.dumps(out))
+
+
+if __name__ == "__main__":
+    main()
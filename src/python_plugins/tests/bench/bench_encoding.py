@@ -0,0 +1,104 @@
+#! /usr/bin/env python3
+
+# Benchmark of message encodings between client & server: bytes per message
+# and encode/decode time, for a request, a response and a batch of
+# heartbeats.
+#
+# json     -- stdlib json, field names as text. Nested data as JSON strings.
+# orjson   -- Same text, with orjson, if installed.
+# msgpack  -- Binary, field names as int tags per gvars.TAG_FIELDS and
+#             nested data as is, if msgpack is installed.
+#
+# Usage: bench_encoding.py [-n <iterations>] [-c <context actions>] [-b <hb batch>]
+#
+
+import argparse
+import json
+import os
+import sys
+import timeit
+
+_CT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(_CT_DIR, "..", "..", "src"))
+
+import gvars
+import clib_bind
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def action_data(i:int) -> {}:
+    return { "ifname": "Ethernet{}".format(i), "duration": 30, "cnt": 3 }
+
+
+def make_msgs(ctx_cnt:int, hb_cnt:int, nested:bool) -> {}:
+    enc = (lambda d: d) if nested else json.dumps
+    req = {
+        gvars.REQ_TYPE: gvars.REQ_TYPE_ACTION,
+        gvars.REQ_ACTION_NAME: "bench-action",
+        gvars.REQ_INSTANCE_ID: "id_bench_action",
+        gvars.REQ_ANOMALY_INSTANCE_ID: "id_action_0",
+        gvars.REQ_ANOMALY_KEY: "Ethernet0",
+        gvars.REQ_CONTEXT: { "action-{}".format(i): enc(action_data(i))
+            for i in range(ctx_cnt) },
+        gvars.REQ_TIMEOUT: 0 }
+    if not nested:
+        req[gvars.REQ_CONTEXT] = json.dumps(req[gvars.REQ_CONTEXT])
+
+    res = clib_bind.ActionResponse("bench-action", "id_bench_action",
+            "id_action_0", "Ethernet0", action_data(0), 0, "").to_dict(nested)
+
+    hbs = [ { gvars.REQ_ACTION_NAME: "bench-action",
+        gvars.REQ_INSTANCE_ID: "id_bench_action_{}".format(i) }
+        for i in range(hb_cnt) ]
+    return { "request": req, "response": res, "heartbeats": hbs }
+
+
+def get_codecs() -> {}:
+    def tag(m):
+        return [ clib_bind.tag_fields(d) for d in m ] if isinstance(m, list) \
+                else clib_bind.tag_fields(m)
+
+    def untag(m):
+        return [ clib_bind.untag_fields(d) for d in m ] if isinstance(m, list) \
+                else clib_bind.untag_fields(m)
+
+    codecs = { "json": (False, lambda m: json.dumps(m).encode("utf-8"), json.loads) }
+    if orjson is not None:
+        codecs["orjson"] = (False, orjson.dumps, orjson.loads)
+    if clib_bind.msgpack is not None:
+        codecs["msgpack"] = (True, lambda m: clib_bind.msgpack.packb(tag(m)),
+                lambda b: untag(clib_bind.msgpack.unpackb(b, strict_map_key=False)))
+    return codecs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Message encoding benchmark")
+    parser.add_argument("-n", "--count", type=int, default=20000,
+            help="Count of iterations per measure")
+    parser.add_argument("-c", "--context", type=int, default=3,
+            help="Count of actions in request context")
+    parser.add_argument("-b", "--batch", type=int, default=10,
+            help="Count of heartbeats in batch")
+    args = parser.parse_args()
+
+    results = []
+    for name, (nested, enc, dec) in get_codecs().items():
+        msgs = make_msgs(args.context, args.batch, nested)
+        for kind, msg in msgs.items():
+            data = enc(msg)
+            results.append({ "codec": name, "msg": kind, "bytes": len(data),
+                "encode_us": round(timeit.timeit(lambda: enc(msg),
+                    number=args.count) * 1e6 / args.count, 2),
+                "decode_us": round(timeit.timeit(lambda: dec(data),
+                    number=args.count) * 1e6 / args.count, 2) })
+            print("{codec:8s} {msg:10s} bytes:{bytes:6d} encode:{encode_us:7.2f}us "
+                    "decode:{decode_us:7.2f}us".format(**results[-1]))
+    print(json.dumps(results))
+
+
+if __name__ == "__main__":
+    main()
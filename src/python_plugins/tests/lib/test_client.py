@@ -6,7 +6,9 @@ import select
 import time
 import threading
 
+import ctypes
 import gvars
+import clib_bind
 
 from common import *
 
@@ -51,7 +53,9 @@ from common import *
 #
 th_local = threading.local()
 
-CACHE_LIMIT = 10
+# Holds what plugin procs write, while test main is held in config reload
+# for a poll timeout. Test cases run many actions concurrently.
+CACHE_LIMIT = 64
 
 shutdown = False
 
@@ -194,11 +198,14 @@ wr_fds = {}
 # The taken up service instance is saved in thread local
 # Rest of the calls from this thread uses this instance.
 #
-def create_cache_services(cnt:int):
+def create_cache_services(cnt:int, limit:int=CACHE_LIMIT):
     global cache_services
     global rd_fds, wr_fds
 
-    cache_services = [cache_service() for i in range(cnt)]
+    cache_services = [cache_service(limit) for i in range(cnt)]
+    # Drop services of earlier test case, if any.
+    rd_fds = {}
+    wr_fds = {}
 
     for i in range(cnt):
         p = cache_services[i]
@@ -274,6 +281,20 @@ def clib_register_client(cl_name: bytes) -> int:
     return 0
 
 
+# Capabilities supported by test server; Values it accepts for each.
+SERVER_CAPS = {
+        gvars.CAP_NESTED_DATA: [ True ],
+        gvars.CAP_ENCODING: [ gvars.ENCODING_JSON, gvars.ENCODING_MSGPACK ] }
+
+def clib_register_client_ex(cl_name: bytes, caps: bytes) -> bytes:
+    if clib_register_client(cl_name) != 0:
+        return b""
+
+    offered = json.loads(caps.decode("utf-8"))
+    accepted = { k: v for k, v in offered.items() if v in SERVER_CAPS.get(k, []) }
+    return json.dumps(accepted).encode("utf-8")
+
+
 def clib_deregister_client(cl_name: bytes) -> int:
     if not _is_initialized():
         report_error("deregister_client: client not registered {}".format(cl_name))
@@ -310,6 +331,37 @@ def clib_register_action(action_name: bytes) -> int:
     return 0
 
 
+# Registers each as if individually. Returns JSON object of action name
+# to its return code.
+#
+def clib_register_actions(actions: bytes) -> bytes:
+    if not _is_initialized():
+        report_error("register_actions: client not registered")
+        return b""
+
+    ret = { a: clib_register_action(a.encode("utf-8"))
+            for a in json.loads(actions.decode("utf-8")) }
+    return json.dumps(ret).encode("utf-8")
+
+
+def clib_deregister_action(action_name: bytes) -> int:
+    if not _is_initialized():
+        report_error("deregister_action: client not registered {}".format(action_name))
+        return -1
+
+    act_name = action_name.decode("utf-8")
+    if act_name not in th_local.actions:
+        report_error("deregister_action: unknown action {}".format(act_name))
+        return -2
+
+    th_local.actions.remove(act_name)
+    th_local.cache_svc.write_to_server({
+        gvars.REQ_DEREGISTER_ACTION: {
+            gvars.REQ_ACTION_NAME: act_name,
+            gvars.REQ_CLIENT_NAME: th_local.cl_name }})
+    return 0
+
+
 def clib_touch_heartbeat(action_name:bytes, instance_id: bytes) -> int:
     if not _is_initialized():
         report_error("touch_heartbeat: client not registered {}".format(action_name))
@@ -327,6 +379,27 @@ def clib_touch_heartbeat(action_name:bytes, instance_id: bytes) -> int:
             gvars.REQ_INSTANCE_ID: instance_id.decode("utf-8") }})
     return 0
 
+
+# Server sees each heartbeat of the batch, as if touched individually.
+#
+def clib_touch_heartbeats(hbs: bytes) -> int:
+    if not _is_initialized():
+        report_error("touch_heartbeats: client not registered")
+        return -1
+
+    for hb in json.loads(hbs.decode("utf-8")):
+        name = hb[gvars.REQ_ACTION_NAME]
+        if name not in th_local.actions:
+            report_error("Heartbeat from unregistered action {}".format(name))
+            return -1
+
+        th_local.cache_svc.write_to_server({
+            gvars.REQ_HEARTBEAT: {
+                gvars.REQ_CLIENT_NAME: th_local.cl_name,
+                gvars.REQ_ACTION_NAME: name,
+                gvars.REQ_INSTANCE_ID: hb[gvars.REQ_INSTANCE_ID] }})
+    return 0
+
  
 def _read_req(timeout:int = -1) -> bool:
     if th_local.req:
@@ -366,6 +439,60 @@ def clib_read_action_request(timeout:int) -> bytes:
     return req
 
 
+# Binary variants. Messages to & from server stay dicts as with JSON; Only
+# the client side is encoded, as the real lib would.
+#
+def clib_read_action_request_bin(buf, buf_len:int, timeout:int) -> int:
+    if not _is_initialized():
+        report_error("read_action_request_bin: client not registered")
+        return -1
+
+    if not _read_req(timeout):
+        return 0
+
+    data = clib_bind.msgpack.packb(clib_bind.tag_fields(
+        th_local.req[gvars.REQ_ACTION_REQUEST]))
+    if len(data) > buf_len:
+        # Request stays held for next call.
+        return -len(data)
+    th_local.req = None
+    ctypes.memmove(buf, data, len(data))
+    return len(data)
+
+
+def clib_write_action_responses_bin(data: bytes, n:int) -> int:
+    if not _is_initialized():
+        report_error("write_action_responses_bin: client not registered")
+        return -1
+
+    for resp in clib_bind.msgpack.unpackb(data[:n], strict_map_key=False):
+        th_local.cache_svc.write_to_server({
+            gvars.REQ_ACTION_REQUEST: clib_bind.untag_fields(resp) })
+    return 0
+
+
+def clib_touch_heartbeats_bin(data: bytes, n:int) -> int:
+    hbs = [ clib_bind.untag_fields(hb) for hb in
+            clib_bind.msgpack.unpackb(data[:n], strict_map_key=False) ]
+    return clib_touch_heartbeats(json.dumps(hbs).encode("utf-8"))
+
+
+def clib_read_action_requests(max_n:int, timeout:int) -> bytes:
+    if not _is_initialized():
+        report_error("read_action_requests: client not registered")
+        return b""
+
+    lst = []
+    while len(lst) < max_n:
+        # Wait for first only
+        if not _read_req(timeout if not lst else 0):
+            break
+        lst.append(th_local.req[gvars.REQ_ACTION_REQUEST])
+        th_local.req = None
+
+    return json.dumps(lst).encode("utf-8")
+
+
 def clib_write_action_response(resp: bytes) -> int:
     if not _is_initialized():
         report_error("write_action_request: client not registered")
@@ -376,6 +503,18 @@ def clib_write_action_response(resp: bytes) -> int:
     return 0
 
 
+# Server sees each response of the batch, as if written individually.
+#
+def clib_write_action_responses(resps: bytes) -> int:
+    if not _is_initialized():
+        report_error("write_action_responses: client not registered")
+        return -1
+
+    for resp in json.loads(resps.decode("utf-8")):
+        th_local.cache_svc.write_to_server({ gvars.REQ_ACTION_REQUEST: resp })
+    return 0
+
+
 def _poll(rdfds:[], timeout: int) -> [int]:
     while (not shutdown):
         poll_wait = 2
@@ -420,6 +559,55 @@ def clib_poll_for_data(fds:[int], cnt:int, timeout: int) -> int:
             return -2
 
 
+# Called by client - here the Plugin Process
+# Returns count of ready fds filled in ready, with server_ready set for
+# pending request from server.
+#
+def clib_poll_for_data_multi(fds:[int], cnt:int, ready:[int], server_ready,
+        timeout_ms: int) -> int:
+    if not _is_initialized():
+        report_error("poll_for_data_multi: client not registered")
+        return -3
+
+    recv_signal_fd = th_local.cache_svc.get_signal_rd_fd(False)
+    lst = [ recv_signal_fd ] + list(fds[0:cnt])
+    timeout = timeout_ms / 1000.0 if timeout_ms >= 0 else -1
+
+    server_ready.value = 0
+    while (not shutdown):
+        r = _poll(lst, timeout)
+        if not r:
+            return -2
+
+        n = 0
+        for fd in r:
+            if fd == recv_signal_fd:
+                # Set only if action matches calling client.
+                _read_req(0)
+                if th_local.req:
+                    server_ready.value = 1
+            else:
+                ready[n] = fd
+                n += 1
+
+        if n or server_ready.value:
+            return n
+        # Continue to poll
+    return -2
+
+
+# Called by client - here the Plugin Process
+# Signal fd carries one signal per message from server. Hence stays
+# readable until all pending requests are read.
+#
+def clib_get_server_fd() -> int:
+    if not _is_initialized():
+        report_error("get_server_fd: client not registered")
+        return -1
+
+    return th_local.cache_svc.get_signal_rd_fd(False)
+
+
 ## Server side read/write wrappers
 # NOTE: These are not clib wrappers but match implementation
 # of clib wrappers as server writes are read by clib mock and 
@@ -439,7 +627,8 @@ def server_read_request(timeout:int = -1) -> (bool, {}):
         report_error("Internal error. Expected one key. ({})".format(json.dumps(d)))
         return False, {}
     if list(d.keys())[0] not in [ gvars.REQ_REGISTER_CLIENT, gvars.REQ_DEREGISTER_CLIENT,
-            gvars.REQ_REGISTER_ACTION, gvars.REQ_HEARTBEAT, gvars.REQ_ACTION_REQUEST]:
+            gvars.REQ_REGISTER_ACTION, gvars.REQ_DEREGISTER_ACTION,
+            gvars.REQ_HEARTBEAT, gvars.REQ_ACTION_REQUEST]:
         report_error("Internal error. Unexpected request: {}".format(json.dumps(d)))
         return False, {}
 
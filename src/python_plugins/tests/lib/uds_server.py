@@ -0,0 +1,351 @@
+#! /usr/bin/env python3
+
+# Local engine stand-in over Unix domain socket, for plugin procs using the
+# uds_client transport ("clib_transport": "uds" in global rc).
+# Lets real plugin procs, as separate processes, be run & driven under load
+# on a dev box, w/o the engine & the C client lib.
+#
+# Tracks client & action registrations, routes requests to the client that
+# registered the action and collects responses & heartbeats.
+# Protocol is as described in src/uds_client.py.
+#
+# Use UdsServer from a benchmark to drive load, or run standalone to serve
+# and optionally send requests to given actions:
+#
+#   uds_server.py [-p <socket path>] [-a <action> ...] [-n <count>] [-c <in flight>]
+#       [-r <requests/sec>]
+#
+
+import argparse
+import json
+import os
+import queue
+import socket
+import sys
+import threading
+import time
+
+_CT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(_CT_DIR, "..", "..", "src"))
+
+from common import *
+import gvars
+import uds_client
+
+# Capabilities supported by this server; Values it accepts for each.
+SERVER_CAPS = {
+        gvars.CAP_NESTED_DATA: [ True ],
+        gvars.CAP_ENCODING: [ gvars.ENCODING_JSON ] }
+
+STATUS_OK = 0
+STATUS_FAILED = -1
+STATUS_DUPLICATE = -2
+
+
+class ClientConn:
+    def __init__(self, sock:socket.socket):
+        self.sock = sock
+        self.send_lock = threading.Lock()
+        self.name = ""
+        self.caps = {}
+        self.actions = set()
+
+
+    def send(self, data:bytes) -> bool:
+        try:
+            with self.send_lock:
+                uds_client.send_frame(self.sock, data)
+        except OSError as e:
+            log_error("uds_server: send to {} failed: {}".format(self.name, str(e)))
+            return False
+        return True
+
+
+class UdsServer:
+
+    def __init__(self, path:str = uds_client.DEFAULT_UDS_PATH):
+        self.path = path
+        self.sock = None
+        self.cond = threading.Condition()
+                                # Guards rest & signals registration changes
+        self.clients = {}       # Client name to conn
+        self.actions = {}       # Action name to conn
+        self.sent = {}          # Instance ID to time request sent
+        self.latencies = []     # Secs from request sent to response
+        self.responses = queue.Queue()
+                                # Responses as received
+        self.stats = { "requests": 0, "responses": 0, "heartbeats": 0,
+                "frames_in": 0 }
+        self.running = False
+
+
+    def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.bind(self.path)
+        self.sock.listen(64)
+        self.running = True
+        threading.Thread(target=self._accept_loop, name="uds_accept",
+                daemon=True).start()
+        log_info("uds_server: listening on {}".format(self.path))
+
+
+    def stop(self):
+        self.running = False
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+        with self.cond:
+            conns = list(self.clients.values())
+        for conn in conns:
+            try:
+                conn.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+    def _accept_loop(self):
+        while self.running:
+            try:
+                sock, _ = self.sock.accept()
+            except OSError:
+                break
+            threading.Thread(target=self._client_loop, args=(ClientConn(sock),),
+                    name="uds_client", daemon=True).start()
+
+
+    def _reply(self, conn:ClientConn, req: {}, status:int, data=None):
+        conn.send(json.dumps({ uds_client.MSG_REPLY: {
+            uds_client.REPLY_SEQ: req[uds_client.REPLY_SEQ],
+            uds_client.REPLY_STATUS: status,
+            uds_client.REPLY_DATA: data }}).encode("utf-8"))
+
+
+    def _client_loop(self, conn:ClientConn):
+        while True:
+            try:
+                data = uds_client.recv_frame(conn.sock)
+            except OSError:
+                data = None
+            if data is None:
+                break
+            self.stats["frames_in"] += 1
+            key, val = next(iter(json.loads(data).items()))
+            self._handle(conn, key, val)
+
+        self._drop_client(conn)
+        conn.sock.close()
+
+
+    def _drop_client(self, conn:ClientConn):
+        with self.cond:
+            for action in conn.actions:
+                self.actions.pop(action, None)
+            conn.actions = set()
+            if self.clients.get(conn.name, None) is conn:
+                self.clients.pop(conn.name)
+            self.cond.notify_all()
+
+
+    def _handle(self, conn:ClientConn, key:str, val):
+        if key == gvars.REQ_ACTION_REQUEST:
+            for resp in (val if isinstance(val, list) else [ val ]):
+                self._handle_response(resp)
+
+        elif key == gvars.REQ_HEARTBEAT:
+            self.stats["heartbeats"] += len(val) if isinstance(val, list) else 1
+
+        elif key == gvars.REQ_REGISTER_CLIENT:
+            name = val[gvars.REQ_CLIENT_NAME]
+            offered = val.get(gvars.REQ_CLIENT_CAPS, {})
+            with self.cond:
+                if name in self.clients:
+                    self._reply(conn, val, STATUS_DUPLICATE, "duplicate client")
+                    return
+                conn.name = name
+                conn.caps = { k: v for k, v in offered.items()
+                        if v in SERVER_CAPS.get(k, []) }
+                self.clients[name] = conn
+                self.cond.notify_all()
+            log_info("uds_server: registered client {} caps:{}".format(name, conn.caps))
+            self._reply(conn, val, STATUS_OK, conn.caps)
+
+        elif key == gvars.REQ_REGISTER_ACTION:
+            status = self._register_action(conn, val[gvars.REQ_ACTION_NAME])
+            self._reply(conn, val, status, "duplicate action" if status else None)
+
+        elif key == uds_client.MSG_REGISTER_ACTIONS:
+            # Status per action
+            self._reply(conn, val, STATUS_OK, { action: self._register_action(
+                conn, action) for action in val[uds_client.ACTION_NAMES] })
+
+        elif key == gvars.REQ_DEREGISTER_ACTION:
+            action = val[gvars.REQ_ACTION_NAME]
+            with self.cond:
+                if self.actions.get(action, None) is not conn:
+                    self._reply(conn, val, STATUS_FAILED, "unknown action")
+                    return
+                self.actions.pop(action)
+                conn.actions.discard(action)
+            self._reply(conn, val, STATUS_OK)
+
+        elif key == gvars.REQ_DEREGISTER_CLIENT:
+            self._drop_client(conn)
+            self._reply(conn, val, STATUS_OK)
+            log_info("uds_server: deregistered client {}".format(conn.name))
+
+        else:
+            log_error("uds_server: Unexpected msg {} from {}".format(key, conn.name))
+
+
+    def _register_action(self, conn:ClientConn, action:str) -> int:
+        with self.cond:
+            if action in self.actions:
+                return STATUS_DUPLICATE
+            self.actions[action] = conn
+            conn.actions.add(action)
+            self.cond.notify_all()
+        log_info("uds_server: registered action {} client:{}".format(
+            action, conn.name))
+        return STATUS_OK
+
+
+    def _handle_response(self, resp: {}):
+        tnow = time.time()
+        with self.cond:
+            self.stats["responses"] += 1
+            sent = self.sent.pop(resp.get(gvars.REQ_INSTANCE_ID, ""), None)
+            if sent is not None:
+                self.latencies.append(tnow - sent)
+        self.responses.put(resp)
+
+
+    def wait_actions(self, actions: [str], timeout:float) -> bool:
+        # Waits until all given actions are registered.
+        with self.cond:
+            return self.cond.wait_for(
+                    lambda: all([ a in self.actions for a in actions ]), timeout)
+
+
+    def send_request(self, action:str, instance_id:str, context: {} = None,
+            timeout:int = 0, anomaly_instance_id:str = "",
+            anomaly_key:str = "") -> bool:
+        with self.cond:
+            conn = self.actions.get(action, None)
+            if conn is None:
+                log_error("uds_server: action {} not registered".format(action))
+                return False
+            self.sent[instance_id] = time.time()
+            self.stats["requests"] += 1
+
+        context = context or {}
+        if not conn.caps.get(gvars.CAP_NESTED_DATA, False):
+            context = { k: v if isinstance(v, str) else json.dumps(v)
+                    for k, v in context.items() }
+        req = json.dumps({
+            gvars.REQ_TYPE: gvars.REQ_TYPE_ACTION,
+            gvars.REQ_ACTION_NAME: action,
+            gvars.REQ_INSTANCE_ID: instance_id,
+            gvars.REQ_ANOMALY_INSTANCE_ID: anomaly_instance_id or instance_id,
+            gvars.REQ_ANOMALY_KEY: anomaly_key,
+            gvars.REQ_CONTEXT: context,
+            gvars.REQ_TIMEOUT: timeout }).encode("utf-8")
+        return conn.send(uds_client.raw_frame(gvars.REQ_ACTION_REQUEST, req))
+
+
+    def send_shutdown(self):
+        req = json.dumps({ gvars.REQ_TYPE: gvars.REQ_TYPE_SHUTDOWN }).encode("utf-8")
+        with self.cond:
+            conns = list(self.clients.values())
+        for conn in conns:
+            conn.send(uds_client.raw_frame(gvars.REQ_ACTION_REQUEST, req))
+
+
+# Sends count requests round robin across actions, keeping up to in_flight
+# outstanding. rate > 0 paces sends at rate requests/sec, else sends as fast
+# as in_flight allows. Returns stats of the run.
+#
+def drive(server:UdsServer, actions: [str], count:int, in_flight:int,
+        resp_timeout:float = 30, rate:float = 0) -> {}:
+    server.latencies = []
+    while not server.responses.empty():
+        server.responses.get()
+
+    sent = 0
+    received = 0
+    tstart = time.time()
+    while received < count:
+        while (sent < count) and ((sent - received) < in_flight) and (
+                (rate <= 0) or (time.time() >= (tstart + sent / rate))):
+            if not server.send_request(actions[sent % len(actions)],
+                    "id_drive_{}".format(sent)):
+                return {}
+            sent += 1
+
+        # Wait for a response, but no later than next send is due.
+        wait = resp_timeout
+        if (rate > 0) and (sent < count) and ((sent - received) < in_flight):
+            wait = max(0, tstart + sent / rate - time.time())
+        try:
+            server.responses.get(timeout=wait)
+        except queue.Empty:
+            if wait < resp_timeout:
+                continue
+            log_error("uds_server: timed out waiting for responses {}/{}".format(
+                received, count))
+            break
+        received += 1
+
+    taken = time.time() - tstart
+    lat = sorted(server.latencies)
+    pct = lambda p: round(lat[min(len(lat) - 1, int(len(lat) * p))] * 1000, 3) if lat else 0
+    return { "requests": sent, "responses": received, "secs": round(taken, 3),
+            "msgs_sec": round(received / taken, 1) if taken else 0,
+            "latency_ms_p50": pct(0.5), "latency_ms_p99": pct(0.99) }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local engine stand-in over UDS")
+    parser.add_argument("-p", "--path", default=uds_client.DEFAULT_UDS_PATH,
+            help="Socket path")
+    parser.add_argument("-a", "--actions", nargs="*", default=[],
+            help="Actions to wait for & send requests to")
+    parser.add_argument("-n", "--count", type=int, default=0,
+            help="Count of requests to send. 0 to only serve")
+    parser.add_argument("-c", "--in-flight", type=int, default=1,
+            help="Max requests outstanding")
+    parser.add_argument("-r", "--rate", type=float, default=0,
+            help="Requests/sec to send at. 0 for as fast as in flight allows")
+    parser.add_argument("-w", "--wait", type=float, default=60,
+            help="Secs to wait for actions to register")
+    parser.add_argument("-l", "--log-level", type=int, default=3, help="set log level")
+    args = parser.parse_args()
+
+    set_log_level(args.log_level)
+    server = UdsServer(args.path)
+    server.start()
+    try:
+        if args.count and args.actions:
+            if not server.wait_actions(args.actions, args.wait):
+                log_error("Actions not registered: {}".format(
+                    [ a for a in args.actions if a not in server.actions ]))
+                return
+            print(json.dumps(drive(server, args.actions, args.count, args.in_flight,
+                rate=args.rate)))
+            server.send_shutdown()
+            time.sleep(1)
+        else:
+            while True:
+                time.sleep(10)
+                log_info("uds_server: stats {}".format(server.stats))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+#! /usr/bin/env python3
+
+#   Synthetic action for benchmarks (tests/bench/bench_e2e.py).
+#   Behavior per request is set via its actions config.
+#       bench_work_ms -- Millisecs of work per request. 0 to return at once.
+#       bench_busy -- true to spin the CPU for the work, else sleep.
+#       bench_heartbeats -- Count of heartbeat touches, spread over the work.
+#       bench_data_size -- Size in bytes of action data in response.
+#
+
+import time
+
+from common import *
+import clib_bind
+
+BENCH_WORK_MS = "bench_work_ms"
+BENCH_BUSY = "bench_busy"
+BENCH_HEARTBEATS = "bench_heartbeats"
+BENCH_DATA_SIZE = "bench_data_size"
+
+
+class LoMPlugin:
+
+    def __init__(self, config: {}, fn_hb):
+        self.action_name = config["action_name"]
+        self.hb_callback = fn_hb
+        self.work = config.get(BENCH_WORK_MS, 0) / 1000.0
+        self.busy = config.get(BENCH_BUSY, False)
+        self.heartbeats = config.get(BENCH_HEARTBEATS, 0)
+        self.data = { "data": "x" * config.get(BENCH_DATA_SIZE, 16) }
+        self.shutdown_done = False
+
+
+    def getName(self) -> str:
+        return self.action_name
+
+
+    def is_valid(self) -> bool:
+        return not self.shutdown_done
+
+
+    def _work(self, secs:float):
+        if secs <= 0:
+            return
+        if not self.busy:
+            time.sleep(secs)
+            return
+        tend = time.time() + secs
+        while time.time() < tend:
+            pass
+
+
+    def request(self, req: clib_bind.ActionRequest) -> clib_bind.ActionResponse:
+        steps = self.heartbeats + 1
+        for i in range(steps):
+            self._work(self.work / steps)
+            if i < self.heartbeats:
+                self.hb_callback(req.instance_id)
+
+        return clib_bind.ActionResponse(self.action_name, req.instance_id,
+                req.anomaly_instance_id, req.anomaly_key, self.data, 0, "")
+
+
+    def shutdown(self):
+        self.shutdown_done = True
@@ -22,6 +22,10 @@ import clib_bind
 #
 DEFAULT_RESP = { "foo": "bar", "IsOk": True }
 
+# Action config key. When true, pause runs on, ignoring cancel via token,
+# as a stuck plugin would.
+IGNORE_CANCEL = "test_ignore_cancel"
+
 
 class LoMPlugin:
 
@@ -44,7 +48,7 @@ class LoMPlugin:
         return self.valid and not self.shutdown_done
 
     
-    def _get_resp(self) -> (str, str):
+    def _get_resp(self) -> (str, {}):
         inst = self.plugin_instances.get(str(self.plugin_inst_index), {})
         self.plugin_inst_index += 1
         if self.plugin_inst_index >= len(self.plugin_instances):
@@ -52,10 +56,15 @@ class LoMPlugin:
 
         resp = inst.get(gvars.REQ_ACTION_DATA, DEFAULT_RESP)
         key = inst.get(gvars.REQ_ANOMALY_KEY, "")
-        return key, json.dumps(resp)
+        # Sent as object, if server accepts nested data. Else as JSON string.
+        return key, resp
 
 
-    def request(self, req: clib_bind.ActionRequest) -> clib_bind.ActionResponse:
+    def request(self, req: clib_bind.ActionRequest,
+            token: clib_bind.RequestToken = None) -> clib_bind.ActionResponse:
+        # token is optional. When accepted, plugin proc passes it and
+        # cancels it upon timeout or cancel from engine.
+        #
         key, resp = self._get_resp()
         if req.anomaly_key:
             key = req.anomaly_key
@@ -86,16 +95,37 @@ class LoMPlugin:
             pause = int(self.action_config.get(gvars.REQ_PAUSE, 3))
             hb_int = self.action_config.get(gvars.REQ_HEARTBEAT_INTERVAL, 1)
             inst_id = req.instance_id
+            if self.action_config.get(IGNORE_CANCEL, False):
+                token = None
 
             n = 0;
             while (not self.shutdown_done) and (n < pause):
-                time.sleep(hb_int)
+                if token:
+                    if token.wait(hb_int):
+                        log_info("{}: request cancelled {}".format(
+                            self.action_name, token.reason))
+                        break
+                else:
+                    time.sleep(hb_int)
                 self.hb_callback(inst_id)
                 n += hb_int
 
         return ret
 
 
+    def update_config(self, delta: {}) -> bool:
+        # Optional. Called upon config reload with changed keys only.
+        # Removed keys have None as value.
+        # Return False to get reloaded instead, losing any state.
+        #
+        for k, v in delta.items():
+            if v is None:
+                self.action_config.pop(k, None)
+            else:
+                self.action_config[k] = v
+        return True
+
+
     def shutdown(self):
         # Request from main process on a different thread.
         # Use this to release resources
@@ -5,6 +5,7 @@ import argparse
 import importlib
 import json
 import os
+import signal
 import sys
 import threading
 import time
@@ -41,6 +42,11 @@ mitigation_lock = False
 
 lst_procs = {}
 
+# Running actions config of current test case & its file. Rewritten upon
+# reload.
+running_actions_conf = {}
+running_actions_conf_file = ""
+
 def clean_dir(d):
     os.system("rm -rf {}".format(d))
     os.system("mkdir -p {}".format(d))
@@ -73,6 +79,23 @@ def write_conf(fl, d) -> {}:
     return data
 
 
+# Merges overrides per action into running actions config and raises
+# SIGHUP, as upon config update. Procs reload in place.
+#
+def reload_actions_config(overrides: {}):
+    for name, conf in overrides.items():
+        running_actions_conf.setdefault(name, {}).update(conf)
+    write_conf(running_actions_conf_file, running_actions_conf)
+
+    # Procs run in threads of this process. Hence call the handler.
+    module = importlib.import_module("plugin_proc")
+    module.signal_handler(signal.SIGHUP, None)
+
+    # Proc main loop reloads upon its next wakeup.
+    time.sleep(module.POLL_TIMEOUT + 1)
+    log_info("MAIN: Reloaded actions config {}".format(overrides))
+
+
 LockState_None = 0
 LockState_Locked = 1
 LockState_Pending = 2
@@ -98,6 +121,8 @@ class AnomalyHandler:
         self.context = {}
         self.lock_state = LockState_None
         self.lock_exp = 0
+        self.burst = {}             # Burst instance ID -> Expected result code
+        self.burst_sent = ""        # Instance ID, upon which burst was sent
         log_info("AnomalyHandler: {}: constructed".format(self.anomaly_name))
 
 
@@ -140,6 +165,10 @@ class AnomalyHandler:
         if self.test_instance_index >= len(self.test_instances):
             self.test_instance_index = 0
 
+        reload = self.test_inst.get("actions_config_reload", {})
+        if reload:
+            reload_actions_config(reload)
+
         log_info("AnomalyHandler: Raise request to Anomaly {}".
                 format(self.anomaly_name))
         self._write_request()
@@ -164,11 +193,34 @@ class AnomalyHandler:
         return 
 
 
+    def _write_burst(self):
+        # Extra requests to current action, sent back to back, while its
+        # request runs. Each expects its own result code.
+        action_name = self._get_ct_action_name()
+        for i, burst in enumerate(self._get_inst_val("burst")):
+            instance_id = "{}_burst_{}".format(self.ct_instance_id, i)
+            self.burst[instance_id] = burst.get(gvars.REQ_RESULT_CODE, 0)
+            req = { gvars.REQ_ACTION_REQUEST: {
+                gvars.REQ_TYPE: gvars.REQ_TYPE_ACTION,
+                gvars.REQ_ACTION_NAME: action_name,
+                gvars.REQ_INSTANCE_ID: instance_id,
+                gvars.REQ_ANOMALY_INSTANCE_ID: instance_id,
+                gvars.REQ_ANOMALY_KEY: burst.get(gvars.REQ_ANOMALY_KEY, ""),
+                gvars.REQ_CONTEXT: {},
+                gvars.REQ_TIMEOUT: burst.get(gvars.REQ_TIMEOUT, 0)}}
+            test_client.server_write_request(req)
+        log_info("AnomalyHandler: {}: Sent burst {}".format(
+            self.anomaly_name, list(self.burst.keys())))
+
+
     def _do_publish(self, req:{}):
         helpers.publish_event(self.anomaly_name, req)
 
 
     def process_plugin_heartbeat(self, req:{}) -> bool:
+        if self.run_complete:
+            return False
+
         action_name = self._get_ct_action_name()
         if req[gvars.REQ_ACTION_NAME] != action_name:
             return False
@@ -176,6 +228,11 @@ class AnomalyHandler:
         if req[gvars.REQ_INSTANCE_ID] != self.ct_instance_id:
             return False
 
+        if (self.burst_sent != self.ct_instance_id) and self._get_inst_val("burst"):
+            # Request is running. Hence burst is sure to find it busy.
+            self.burst_sent = self.ct_instance_id
+            self._write_burst()
+
         if not self.anomaly_published:
             data = req
         else:
@@ -188,11 +245,22 @@ class AnomalyHandler:
 
 
     def _report_error_response(self, req:{}, msg:str):
-        log_error("{}: msg:{} req:{}".format(msg,
-            self.anomaly_name, json.dumps(req)))
+        report_error("{}: msg:{} req:{}".format(self.anomaly_name,
+            msg, json.dumps(req)))
 
 
     def process_plugin_response(self, req:{}) -> bool:
+        if req[gvars.REQ_INSTANCE_ID] in self.burst:
+            val_expect = self.burst.pop(req[gvars.REQ_INSTANCE_ID])
+            if req[gvars.REQ_RESULT_CODE] != val_expect:
+                self._report_error_response(req, "burst mismatch attr:{} exp:{}".
+                        format(gvars.REQ_RESULT_CODE, val_expect))
+            return True
+
+        if self.run_complete:
+            # Tracked only for burst
+            return False
+
         action_name = self._get_ct_action_name()
         if req[gvars.REQ_ACTION_NAME] != action_name:
             return False
@@ -205,17 +273,20 @@ class AnomalyHandler:
 
         # Validate  response
         if req[gvars.REQ_ANOMALY_INSTANCE_ID] != self.anomaly_instance_id:
-            self._report_error_response("Mismatch in anomaly_instance ID{}".
+            self._report_error_response(req, "Mismatch in anomaly_instance ID{}".
                     format(self.anomaly_instance_id))
 
-        if self.anomaly_key:
-            if req[gvars.REQ_ANOMALY_KEY] != self.anomaly_key:
-                self._report_error_response("Mismatch in anomaly_key {}".
-                    format(self.anomaly_key))
-        elif not req[gvars.REQ_ANOMALY_KEY]:
-            self._report_error_response("Misssing anomaly_key")
-        else:
-            self.anomaly_key = req[gvars.REQ_ANOMALY_KEY]
+        # A failure by plugin proc on plugin's behalf carries key of request,
+        # which is empty for anomaly action. Hence check success only.
+        if req[gvars.REQ_RESULT_CODE] == 0:
+            if self.anomaly_key:
+                if req[gvars.REQ_ANOMALY_KEY] != self.anomaly_key:
+                    self._report_error_response(req, "Mismatch in anomaly_key {}".
+                        format(self.anomaly_key))
+            elif not req[gvars.REQ_ANOMALY_KEY]:
+                self._report_error_response(req, "Misssing anomaly_key")
+            else:
+                self.anomaly_key = req[gvars.REQ_ANOMALY_KEY]
 
         test_act_data = self.test_inst.get(action_name, {})
         for attr in [gvars.REQ_ACTION_DATA, gvars.REQ_RESULT_CODE,
@@ -223,7 +294,7 @@ class AnomalyHandler:
             val_expect = test_act_data.get(attr, None)
             if (val_expect != None) and (val_expect != ""):
                 if req[attr] != val_expect:
-                    _report_error_response("mismatch attr:{} exp:{}".
+                    self._report_error_response(req, "mismatch attr:{} exp:{}".
                             format(attr, val_expect))
 
         if not self.anomaly_published:
@@ -284,7 +355,8 @@ class AnomalyHandler:
                 return True
 
             # Restart the run
-            log_info("AnomalyHandler: Read response {}: {}".format(self.anomaly_name))
+            log_info("AnomalyHandler: Restart run {}: {}".format(self.anomaly_name,
+                self.test_run_index))
             self.start()
             return True
 
@@ -340,17 +412,18 @@ class AnomalyHandler:
 
 
     def done(self)->bool:
-        return self.run_complete
+        return self.run_complete and (not self.burst)
 
 def run_a_testcase(test_case:str, testcase_data:{}, default_data:{}):
-    global failed
+    global failed, running_actions_conf, running_actions_conf_file
 
     global_rc_data = {}
 
-    global_rc_data = default_data.get("global_rc", {})
+    # Copy, as test cases run in sequence & the running path is set below.
+    global_rc_data = dict(default_data.get("global_rc", {}))
     if "global_rc" in testcase_data:
         # Overwrite provided keys from testcase.
-        for k, v in test_data("global_rc").items():
+        for k, v in testcase_data["global_rc"].items():
             global_rc_data[k] = v
     
     if ((not global_rc_data) or (not testcase_data)):
@@ -370,8 +443,9 @@ def run_a_testcase(test_case:str, testcase_data:{}, default_data:{}):
     procs_conf = write_conf(os.path.join(cfg_dir, global_rc_data["proc_plugins_conf_name"]),
             testcase_data["procs_config"])
 
-    actions_conf = write_conf(os.path.join(cfg_dir, global_rc_data["actions_config_name"]),
-            testcase_data["actions_config"])
+    running_actions_conf_file = os.path.join(cfg_dir, global_rc_data["actions_config_name"])
+    actions_conf = write_conf(running_actions_conf_file, testcase_data["actions_config"])
+    running_actions_conf = actions_conf
 
     bindings_conf = write_conf(os.path.join(cfg_dir, global_rc_data["actions_binding_config_name"]),
             testcase_data["bindings_config"])
@@ -407,6 +481,10 @@ def run_a_testcase(test_case:str, testcase_data:{}, default_data:{}):
         # path can be absolute or relative to this filepath.
         syspath_append(os.path.join(_CT_DIR, path))
 
+    # Procs of all test cases run in this process and share plugin_proc
+    # module. Clear shutdown of procs from earlier test case.
+    importlib.import_module("plugin_proc").shutdown_request = False
+
     _load_procs(list(procs_conf.keys()), global_rc_file)
 
     # All procs are loaded in dedicated threads.